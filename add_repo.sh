@@ -55,7 +55,11 @@ r2e list-functions -e $EXP_NAME | head -n 10
 echo "Testing a simple query on the new repository..."
 python r2e_query_engine.py --exp_id $EXP_NAME --query "sample test query" --show-code
 
-# 5. Add to living documentation
+# 5. Compute MinHash signatures for clone detection
+echo "Computing clone detection signatures..."
+python clone_index.py --build --experiments $EXP_NAME
+
+# 6. Add to living documentation
 echo "Adding repository to living documentation..."
 python living_doc.py --document_repo --repo_url $REPO_URL --exp_id $EXP_NAME --generate_html
 
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+arXiv Cache - On-disk arXiv metadata cache shared by search and living docs
+
+Paper metadata (title, authors, abstract) is fetched once from the arXiv
+API and stored as one JSON file per paper ID (default
+~/buckets/r2e_bucket/arxiv_cache, override with R2E_ARXIV_CACHE).
+
+Within a process all lookups go through one shared cache, so concurrent
+requests for the same paper wait on a single fetch. ``prefetch`` starts
+the fetch in the background, e.g. while the catalog is loading. In
+offline mode (``offline=True`` or R2E_ARXIV_OFFLINE=1) only cached
+entries are served.
+"""
+
+import os
+import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional
+
+ARXIV_CACHE_DIR = os.environ.get(
+    "R2E_ARXIV_CACHE",
+    os.path.expanduser("~/buckets/r2e_bucket/arxiv_cache")
+)
+ARXIV_API_URL = "http://export.arxiv.org/api/query"
+
+# New-style (2401.12345v2) and old-style (cs/0101001v1) identifiers
+_ARXIV_ID = re.compile(r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(v\d+)?", re.IGNORECASE)
+
+def parse_arxiv_id(url_or_id: str) -> Optional[str]:
+    """
+    Extract the version-less paper ID from an arXiv URL or ID.
+
+    Args:
+        url_or_id: abs/pdf URL (with or without version and .pdf) or bare ID
+
+    Returns:
+        Paper ID such as "2401.12345", or None if none is found
+    """
+    text = url_or_id.strip()
+    if "arxiv.org/" in text:
+        text = re.split(r"arxiv\.org/(?:abs|pdf)/", text, maxsplit=1)[-1]
+    match = _ARXIV_ID.search(text)
+    return match.group(1) if match else None
+
+def format_arxiv_context(paper: Dict[str, Any], arxiv_url: str) -> str:
+    """Format paper metadata as prompt context."""
+    return f"""
+ARXIV PAPER CONTEXT:
+Title: {paper['title']}
+Authors: {', '.join(paper['authors'])}
+URL: {arxiv_url}
+Abstract: {paper['abstract']}
+"""
+
+class ArxivMetadataCache:
+    """arXiv metadata cached on disk, with in-process request coalescing."""
+
+    def __init__(self, cache_dir: Optional[str] = None, offline: Optional[bool] = None,
+                 timeout: float = 15.0):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding one JSON file per paper (default: ARXIV_CACHE_DIR)
+            offline: Serve only cached entries (default: R2E_ARXIV_OFFLINE)
+            timeout: Timeout in seconds for an arXiv API request
+        """
+        self.cache_dir = cache_dir or ARXIV_CACHE_DIR
+        self.offline = offline if offline is not None else os.environ.get("R2E_ARXIV_OFFLINE") == "1"
+        self.timeout = timeout
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _path(self, paper_id: str) -> str:
+        return os.path.join(self.cache_dir, paper_id.replace("/", "_") + ".json")
+
+    def _read_disk(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(paper_id), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_disk(self, paper_id: str, paper: Dict[str, Any]):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(paper_id) + f".{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(paper, f)
+            os.replace(tmp_path, self._path(paper_id))
+        except OSError as e:
+            print(f"Error writing arXiv cache: {e}")
+
+    def _fetch(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch metadata from the arXiv API."""
+        import requests
+        from bs4 import BeautifulSoup
+
+        response = requests.get(ARXIV_API_URL, params={"id_list": paper_id}, timeout=self.timeout)
+        if response.status_code != 200:
+            print(f"arXiv API returned {response.status_code} for {paper_id}")
+            return None
+
+        soup = BeautifulSoup(response.content, 'xml')
+        entry = soup.find('entry')
+        if entry is None or entry.find('summary') is None:
+            print(f"arXiv paper {paper_id} not found")
+            return None
+
+        return {
+            "id": paper_id,
+            "title": " ".join(entry.find('title').text.split()),
+            "authors": [author.find('name').text for author in entry.find_all('author')],
+            "abstract": " ".join(entry.find('summary').text.split()),
+        }
+
+    def _load(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        """Disk, then network; runs once per paper ID at a time."""
+        paper = self._read_disk(paper_id)
+        if paper is None and not self.offline:
+            try:
+                paper = self._fetch(paper_id)
+            except Exception as e:
+                print(f"Error fetching arXiv paper: {e}")
+                paper = None
+            if paper is not None:
+                self._write_disk(paper_id, paper)
+        elif paper is None:
+            print(f"arXiv paper {paper_id} is not cached (offline mode)")
+
+        with self._lock:
+            if paper is not None:
+                self._memory[paper_id] = paper
+            self._inflight.pop(paper_id, None)
+        return paper
+
+    def _future(self, paper_id: str, background: bool) -> Future:
+        """Return the in-flight lookup for ``paper_id``, starting one if needed."""
+        with self._lock:
+            if paper_id in self._memory:
+                future = Future()
+                future.set_result(self._memory[paper_id])
+                return future
+            if paper_id in self._inflight:
+                return self._inflight[paper_id]
+
+            if background:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="arxiv")
+                future = self._executor.submit(self._load, paper_id)
+            else:
+                future = Future()
+            self._inflight[paper_id] = future
+
+        if not background:
+            # This caller does the lookup; concurrent callers wait on the same future
+            future.set_result(self._load(paper_id))
+        return future
+
+    def get(self, url_or_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up paper metadata.
+
+        Args:
+            url_or_id: arXiv URL or paper ID
+
+        Returns:
+            Dict with id, title, authors and abstract, or None if unavailable
+        """
+        paper_id = parse_arxiv_id(url_or_id)
+        if paper_id is None:
+            print(f"Invalid arXiv URL format: {url_or_id}")
+            return None
+        return self._future(paper_id, background=False).result()
+
+    def prefetch(self, url_or_id: str):
+        """Start looking up a paper in the background."""
+        paper_id = parse_arxiv_id(url_or_id)
+        if paper_id is not None:
+            self._future(paper_id, background=True)
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_arxiv_cache() -> ArxivMetadataCache:
+    """The process-wide cache used by the query engine and living docs."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ArxivMetadataCache()
+        return _shared_cache
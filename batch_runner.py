@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Batch Runner - Run many canned queries offline from a JSONL file
+
+Input lines look like:
+
+    {"id": "q1", "exp_id": "talkhier_exp", "query": "graph traversal"}
+    {"id": "q2", "exp_id": "PAE_exp", "type": "research", "query": "..."}
+
+Each experiment is loaded once and queries run with bounded concurrency.
+Results are appended to the output JSONL as they finish, so the output
+file doubles as the checkpoint: rerunning with the same output skips every
+id that already has a successful result.
+
+With --provider-batch the LLM requests are submitted through the OpenAI
+Batch API instead (cheaper bulk throughput, higher latency). The mock
+LLM server implements the files and batches endpoints, so pointing
+OPENAI_BASE_URL at it exercises this path without the real API.
+
+A query only counts as done when the LLM answered it: a search that
+would fall back to keyword matching, or research that produced no
+trajectories, is recorded as an error and retried on the next run.
+
+Usage:
+    python batch_runner.py queries.jsonl --output results.jsonl --concurrency 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Set
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from r2e_query_engine import R2EQueryEngine, response_content
+
+# Columns written for each matching function
+RESULT_COLUMNS = ["function_name", "repo_name", "file_path", "relevance_score", "relevance", "explanation"]
+
+def load_batch(path: str, default_exp_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Read batch queries from a JSONL file.
+
+    Args:
+        path: Input JSONL path
+        default_exp_id: Experiment used for lines without an ``exp_id``
+
+    Returns:
+        List of query dicts with ``id``, ``exp_id``, ``type`` and ``query``
+    """
+    items = []
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping invalid line {line_number}: {e}")
+                continue
+            item.setdefault("id", str(line_number))
+            item.setdefault("exp_id", default_exp_id)
+            item.setdefault("type", "search")
+            if not item.get("exp_id") or not item.get("query"):
+                print(f"Skipping line {line_number}: exp_id and query are required")
+                continue
+            items.append(item)
+    return items
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """Ids that already have a successful result in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from a crashed run
+            if not result.get("error"):
+                done.add(str(result.get("id")))
+    return done
+
+def _records(results, include_code: bool) -> List[Dict[str, Any]]:
+    """Convert a results DataFrame into JSON-safe dicts."""
+    columns = [c for c in RESULT_COLUMNS + (["code"] if include_code else []) if c in results.columns]
+    records = results[columns].to_dict(orient="records")
+    return json.loads(json.dumps(records, default=str))
+
+class BatchRunner:
+    """Run batch queries against engines that are loaded once per experiment."""
+
+    def __init__(self, api_key: Optional[str] = None, use_openrouter: bool = False,
+                 concurrency: int = 8, include_code: bool = False):
+        """
+        Initialize the batch runner.
+
+        Args:
+            api_key: Optional API key (falls back to env var)
+            use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            concurrency: Maximum queries in flight at once
+            include_code: Whether to write function code into the results
+        """
+        self.api_key = api_key
+        self.use_openrouter = use_openrouter
+        self.concurrency = concurrency
+        self.include_code = include_code
+        self.engines: Dict[str, Optional[R2EQueryEngine]] = {}
+        self._write_lock = threading.Lock()
+
+    def load_engines(self, exp_ids: List[str]):
+        """Load every experiment once, in parallel."""
+        def load(exp_id):
+            engine = R2EQueryEngine(exp_id, self.api_key, self.use_openrouter)
+            return exp_id, engine if engine.load_data() else None
+
+        todo = [exp_id for exp_id in dict.fromkeys(exp_ids) if exp_id not in self.engines]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(todo)))) as executor:
+            for exp_id, engine in executor.map(load, todo):
+                self.engines[exp_id] = engine
+
+    def _write(self, output, result: Dict[str, Any]):
+        with self._write_lock:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    def run_query(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one batch query and return its result record."""
+        result = {"id": item["id"], "exp_id": item["exp_id"], "type": item["type"], "query": item["query"]}
+        engine = self.engines.get(item["exp_id"])
+        started = time.monotonic()
+
+        if engine is None:
+            result["error"] = f"Experiment '{item['exp_id']}' could not be loaded"
+            return result
+
+        try:
+            if item["type"] == "research":
+                trajectories = engine.generate_research_trajectories(item["query"], item.get("num_trajectories", 3))
+                if trajectories:
+                    result["trajectories"] = trajectories
+                else:
+                    result["error"] = "no research trajectories generated"
+            else:
+                limit = item.get("limit", 10)
+                # Keyword matches are not an answer to the query; fail so a resume retries it
+                results = engine.semantic_search(item["query"], limit=limit, arxiv_url=item.get("arxiv"),
+                                                 keyword_fallback=False)
+                result["results"] = _records(results.head(limit), self.include_code)
+        except Exception as e:
+            result["error"] = str(e)
+
+        result["elapsed"] = round(time.monotonic() - started, 3)
+        return result
+
+    def run(self, items: List[Dict[str, Any]], output_path: str) -> int:
+        """
+        Run all pending queries, appending results to ``output_path``.
+
+        Returns:
+            Number of queries that failed
+        """
+        done = load_checkpoint(output_path)
+        pending = [item for item in items if str(item["id"]) not in done]
+        print(f"{len(items)} queries, {len(items) - len(pending)} already done, {len(pending)} to run")
+        if not pending:
+            return 0
+
+        self.load_engines([item["exp_id"] for item in pending])
+
+        failed = 0
+        with open(output_path, "a") as output:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(self.run_query, item) for item in pending]
+                for i, future in enumerate(as_completed(futures), 1):
+                    result = future.result()
+                    self._write(output, result)
+                    if result.get("error"):
+                        failed += 1
+                    print(f"[{i}/{len(pending)}] {result['id']}: {'error' if result.get('error') else 'ok'}")
+        return failed
+
+    def _submit_provider_batch(self, engine: R2EQueryEngine, operation: str,
+                               requests: Dict[str, Dict[str, Any]], poll_interval: float) -> Dict[str, Any]:
+        """
+        Submit chat requests through the OpenAI Batch API and wait for the results.
+
+        Args:
+            engine: Engine whose OpenAI client is used
+            operation: Operation the requests belong to (selects the model route)
+            requests: Chat requests keyed by custom id
+            poll_interval: Seconds between status checks
+
+        Returns:
+            Mapping of custom id to the response body (or an ``error`` dict)
+        """
+        model = engine.router.routes[operation]["models"][0]
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions",
+                        "body": {"model": model, **request}})
+            for custom_id, request in requests.items()
+        ]
+
+        client = engine.client
+        batch_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions",
+                                      completion_window="24h")
+        print(f"Submitted provider batch {batch.id} with {len(lines)} {operation} requests")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+            print(f"Provider batch {batch.id}: {batch.status}")
+
+        responses = {}
+        if batch.status != "completed" or not batch.output_file_id:
+            return {custom_id: {"error": f"batch {batch.status}"} for custom_id in requests}
+
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if response.get("status_code") == 200:
+                responses[entry["custom_id"]] = response.get("body")
+                engine.telemetry.record(engine.exp_id, operation, model, 0.0, requests[entry["custom_id"]],
+                                        response.get("body"))
+            else:
+                responses[entry["custom_id"]] = {"error": entry.get("error") or response}
+        return responses
+
+    def run_provider_batch(self, items: List[Dict[str, Any]], output_path: str,
+                           poll_interval: float = 30.0) -> int:
+        """
+        Run pending queries through the provider's batch endpoint.
+
+        Searches go out in one batch per experiment; research queries then
+        submit a second batch built from their search results.
+
+        Returns:
+            Number of queries that failed
+        """
+        if self.use_openrouter:
+            print("Provider batch mode requires the OpenAI API (OpenRouter has no batch endpoint).")
+            return len(items)
+
+        done = load_checkpoint(output_path)
+        pending = [item for item in items if str(item["id"]) not in done]
+        print(f"{len(items)} queries, {len(items) - len(pending)} already done, {len(pending)} to run")
+        if not pending:
+            return 0
+
+        self.load_engines([item["exp_id"] for item in pending])
+
+        failed = 0
+        with open(output_path, "a") as output:
+            by_exp: Dict[str, List[Dict[str, Any]]] = {}
+            for item in pending:
+                by_exp.setdefault(item["exp_id"], []).append(item)
+
+            for exp_id, exp_items in by_exp.items():
+                engine = self.engines.get(exp_id)
+                if engine is None or not engine.api_key:
+                    for item in exp_items:
+                        self._write(output, {**item, "error": f"Experiment '{exp_id}' unavailable or no API key"})
+                        failed += 1
+                    continue
+
+                # Phase 1: every query needs a search
+                search_limit = {item["id"]: 20 if item["type"] == "research" else item.get("limit", 10)
+                                for item in exp_items}
+                requests = {
+                    str(item["id"]): engine._search_request(engine._build_search_prompt(
+                        item["query"], search_limit[item["id"]],
+                        engine._fetch_arxiv_context(item["arxiv"])
+                        if item["type"] != "research" and item.get("arxiv") else ""))
+                    for item in exp_items
+                }
+                responses = self._submit_provider_batch(engine, "search", requests, poll_interval)
+
+                searched = {}
+                for item in exp_items:
+                    body = responses.get(str(item["id"])) or {"error": "missing from batch output"}
+                    if "error" in body:
+                        searched[item["id"]] = None
+                        continue
+                    found = engine._parse_json_list(response_content(body), "results")
+                    searched[item["id"]] = (engine._match_search_results(found).head(search_limit[item["id"]])
+                                            if found is not None else None)
+
+                # Phase 2: research prompts built from the search results
+                research_items = [item for item in exp_items
+                                  if item["type"] == "research" and searched[item["id"]] is not None
+                                  and len(searched[item["id"]]) > 0]
+                research_responses = {}
+                if research_items:
+                    requests = {
+                        str(item["id"]): engine._research_request(engine._build_research_prompt(
+                            item["query"], searched[item["id"]], item.get("num_trajectories", 3)))
+                        for item in research_items
+                    }
+                    research_responses = self._submit_provider_batch(engine, "research", requests, poll_interval)
+
+                for item in exp_items:
+                    result = {"id": item["id"], "exp_id": exp_id, "type": item["type"], "query": item["query"]}
+                    if searched[item["id"]] is None:
+                        result["error"] = "search request failed in provider batch"
+                    elif item["type"] == "research":
+                        body = research_responses.get(str(item["id"]))
+                        trajectories = None
+                        if body is not None and "error" not in body:
+                            trajectories = engine._parse_json_list(response_content(body), "trajectories")
+                        if trajectories:
+                            result["trajectories"] = trajectories
+                        else:
+                            result["error"] = "no research trajectories generated"
+                    else:
+                        result["results"] = _records(searched[item["id"]], self.include_code)
+                    if result.get("error"):
+                        failed += 1
+                    self._write(output, result)
+        return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Run R2E queries in batch from a JSONL file")
+    parser.add_argument("batch", type=str, help="Input JSONL with one query per line")
+    parser.add_argument("--output", type=str, help="Output JSONL (default: <batch>.results.jsonl)")
+    parser.add_argument("--exp_id", type=str, help="Default experiment for lines without exp_id")
+    parser.add_argument("--api_key", type=str, help="API key (will use environment variable if not provided)")
+    parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API instead of OpenAI")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum queries in flight")
+    parser.add_argument("--include-code", action="store_true", help="Include function code in results")
+    parser.add_argument("--provider-batch", action="store_true", help="Submit through the provider's batch endpoint")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between provider batch status checks")
+
+    args = parser.parse_args()
+    sys.exit(1 if run_batch(args) else 0)
+
+def run_batch(args) -> int:
+    """Run a batch from parsed CLI arguments (shared with r2e_query_engine --batch)."""
+    output_path = args.output or os.path.splitext(args.batch)[0] + ".results.jsonl"
+    items = load_batch(args.batch, args.exp_id)
+    if not items:
+        print("No queries to run.")
+        return 0
+
+    runner = BatchRunner(args.api_key, args.use_openrouter, args.concurrency, args.include_code)
+    if args.provider_batch:
+        failed = runner.run_provider_batch(items, output_path, args.poll_interval)
+    else:
+        failed = runner.run(items, output_path)
+
+    print(f"\nResults written to {output_path} ({failed} failed)")
+    return failed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmark - End-to-end latency and throughput of the query engine
+
+Runs semantic_search, research trajectory generation and prototype
+generation against the mock LLM server (started in-process unless --url
+points at a running one) and reports throughput and p50/p95/p99 latency
+per operation. Searches run without the keyword fallback, so a search
+the LLM did not answer counts as failed rather than ok. The engine's
+adaptive concurrency limit starts (and is capped) at --concurrency, so
+requests do not queue behind a limit still growing from its default.
+
+Usage:
+    python benchmark.py --exp_id quickstart --requests 50 --concurrency 8
+    python benchmark.py --exp_id quickstart --latency lognormal:1.0,0.6 --rate-limit-rate 0.05 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from mock_llm_server import MockLLMServer
+
+QUERIES = [
+    "graph traversal",
+    "parse configuration files",
+    "tokenize source code",
+    "cache expensive results",
+    "retry failed network requests",
+    "build abstract syntax tree",
+]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0-100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def run_operation(name: str, calls: List[Callable[[], Any]], concurrency: int) -> Dict[str, Any]:
+    """
+    Run ``calls`` with bounded concurrency and measure each one.
+
+    Args:
+        name: Operation name for the report
+        calls: Zero-argument callables returning the operation's result
+        concurrency: Calls in flight at once
+
+    Returns:
+        Report row with counts, throughput and latency percentiles
+    """
+    def timed(call):
+        started = time.perf_counter()
+        try:
+            result = call()
+            ok = result is not None and len(result) > 0
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, calls))
+    wall = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        "operation": name,
+        "requests": len(calls),
+        "ok": sum(1 for _, ok in outcomes if ok),
+        "wall_s": wall,
+        "throughput_rps": len(calls) / wall if wall > 0 else float("nan"),
+        "mean_s": sum(latencies) / len(latencies) if latencies else float("nan"),
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+    }
+
+def print_report(rows: List[Dict[str, Any]]):
+    """Print the benchmark table."""
+    header = ["operation", "requests", "ok", "wall_s", "rps", "mean_s", "p50_s", "p95_s", "p99_s"]
+    table = [header] + [[
+        row["operation"], str(row["requests"]), str(row["ok"]), f"{row['wall_s']:.2f}",
+        f"{row['throughput_rps']:.2f}", f"{row['mean_s']:.3f}", f"{row['p50_s']:.3f}",
+        f"{row['p95_s']:.3f}", f"{row['p99_s']:.3f}",
+    ] for row in rows]
+
+    widths = [max(len(r[i]) for r in table) for i in range(len(header))]
+    for i, r in enumerate(table):
+        print("  ".join(cell.ljust(widths[j]) for j, cell in enumerate(r)))
+        if i == 0:
+            print("  ".join("-" * w for w in widths))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the R2E Query Engine against a mock LLM server")
+    parser.add_argument("--exp_id", type=str, required=True, help="R2E experiment ID")
+    parser.add_argument("--use_openrouter", action="store_true", help="Benchmark the OpenRouter client path")
+    parser.add_argument("--url", type=str, help="Base URL of a running mock server (default: start one)")
+    parser.add_argument("--latency", type=str, default="lognormal:0.5,0.4", help="Mock latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock HTTP 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Mock HTTP 429 rate")
+    parser.add_argument("--seed", type=int, default=0, help="Mock server seed")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per operation")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Requests in flight per operation (also the engine's concurrency limit)")
+    parser.add_argument("--ops", nargs="+", default=["search", "research", "prototype"],
+                        choices=["search", "research", "prototype"], help="Operations to benchmark")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the shared R2E_LLM_RPM/TPM limits")
+    parser.add_argument("--json", type=str, help="Write the report rows to this JSON file")
+
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server = MockLLMServer(port=0, latency=args.latency, error_rate=args.error_rate,
+                               rate_limit_rate=args.rate_limit_rate, seed=args.seed).start()
+        url = server.url
+    print(f"Using mock LLM server at {url}")
+
+    # Both clients read their endpoint from the environment at construction
+    os.environ["OPENAI_BASE_URL"] = url
+    os.environ["OPENROUTER_BASE_URL"] = url
+
+    from r2e_query_engine import R2EQueryEngine
+    from rate_limiter import LLMRateLimiter, AdaptiveConcurrency
+
+    engine = R2EQueryEngine(args.exp_id, api_key="mock-key", use_openrouter=args.use_openrouter)
+    engine.telemetry.enabled = False
+    if not args.rate_limit:
+        # Private bucket with no effective limit so the benchmark measures the engine
+        engine.limiter = LLMRateLimiter(f"benchmark_{os.getpid()}", rpm=1e9, tpm=1e12, max_retries=2)
+    # Allow --concurrency requests in flight from the start; 429s and slow answers still lower it
+    engine.limiter.concurrency = AdaptiveConcurrency(initial=args.concurrency, maximum=args.concurrency)
+    if not engine.load_data():
+        print("Failed to load data. Exiting.")
+        sys.exit(1)
+
+    # Distinct queries per operation so the session result store never short-circuits a call
+    def queries(operation):
+        return [f"{QUERIES[i % len(QUERIES)]} ({operation} run {i})" for i in range(args.requests)]
+
+    rows = []
+
+    if "search" in args.ops:
+        rows.append(run_operation("search", [
+            (lambda q=q: engine.semantic_search(q, keyword_fallback=False)) for q in queries("search")
+        ], args.concurrency))
+
+    if "research" in args.ops:
+        rows.append(run_operation("research", [
+            (lambda q=q: engine.generate_research_trajectories(q)) for q in queries("research")
+        ], args.concurrency))
+
+    if "prototype" in args.ops:
+        trajectories = engine.generate_research_trajectories(QUERIES[0])
+        if not trajectories:
+            print("Could not generate a trajectory to prototype; skipping prototype benchmark.")
+        else:
+            variants = [dict(trajectories[i % len(trajectories)], title=f"{trajectories[i % len(trajectories)]['title']} (run {i})")
+                        for i in range(args.requests)]
+            rows.append(run_operation("prototype", [
+                (lambda t=t: engine.generate_prototype(t, verbose=False)) for t in variants
+            ], args.concurrency))
+
+    print()
+    print_report(rows)
+    if server is not None:
+        counts = server.counts
+        print(f"\nMock server: {counts['requests']} requests, {counts['errors']} errors, "
+              f"{counts['rate_limited']} rate limited")
+        server.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
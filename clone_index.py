@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Clone Index - MinHash-LSH detection of duplicated functions across experiments
+
+Forks and vendored code put the same functions into many repositories.
+Each function's code is reduced to a set of token shingles (runs of
+SHINGLE_SIZE consecutive tokens) and summarized by a MinHash signature,
+whose agreement with another signature estimates the Jaccard similarity
+of the two shingle sets.
+
+Signatures are computed once per experiment when it is ingested and
+stored under ~/buckets/r2e_bucket/index/minhash; they are recomputed when
+the experiment's extracted data changes. Token hashes are stable, so
+signatures of different experiments are comparable.
+
+find_clones splits signatures into LSH bands. Functions that agree on a
+whole band land in the same bucket and each is checked against the
+bucket's first member, so the work grows with the number of functions
+rather than with the number of pairs. Verified pairs are merged into
+clusters.
+
+Usage:
+    python clone_index.py --build
+    python clone_index.py --experiments PAE_exp other_exp --threshold 0.8 --cross-repo
+"""
+
+import os
+import re
+import sys
+import json
+import zlib
+import argparse
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from session_store import catalog_version
+from global_index import R2E_BUCKET_PATH, INDEX_DIR
+
+SIGNATURE_DIR = os.path.join(INDEX_DIR, "minhash")
+
+# Signature length and tokens per shingle
+NUM_PERM = 128
+SHINGLE_SIZE = 4
+
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+# Shingles hashed per chunk; at 8 * NUM_PERM bytes per shingle the chunk stays in cache
+_CHUNK_SHINGLES = 1024
+
+_CODE_TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|\S")
+
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fixed multiply-shift hash coefficients, identical in every process."""
+    rng = np.random.RandomState(1)
+    a = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+    return a, b
+
+def _token_hashes(code: str, cache: Dict[str, int]) -> List[int]:
+    """Stable 32-bit hashes of a function's code tokens."""
+    hashes = []
+    for token in _CODE_TOKEN.findall(code or ""):
+        h = cache.get(token)
+        if h is None:
+            h = cache[token] = zlib.crc32(token.encode("utf-8"))
+        hashes.append(h)
+    return hashes
+
+def shingles(codes: List[str], shingle_size: int = SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    32-bit hashes of the token shingles of functions' code.
+
+    Code shorter than ``shingle_size`` tokens is one shingle; code without
+    tokens has none.
+
+    Args:
+        codes: Function sources
+        shingle_size: Consecutive tokens per shingle
+
+    Returns:
+        (hashes, counts): uint64 shingle hashes grouped by function, and shingles per function
+    """
+    cache: Dict[str, int] = {}
+    sequences = [_token_hashes(code, cache) for code in codes]
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    tokens = np.array([h for sequence in sequences for h in sequence], dtype=np.uint64)
+    if len(tokens) == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(len(codes), dtype=np.int64)
+
+    # Combine every window of shingle_size tokens, then keep the windows inside one function;
+    # shorter functions use a single window over all their tokens
+    widths = np.minimum(lengths, shingle_size)
+    width = int(widths.max())
+    padded = np.concatenate([tokens, np.zeros(width, dtype=np.uint64)])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    owner = np.repeat(np.arange(len(codes)), lengths)
+    position = np.arange(len(tokens)) - starts[owner]
+    keep = position <= lengths[owner] - widths[owner]
+    combined = np.zeros(len(tokens), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(width):
+            # Tokens past a short function's width do not take part in its shingle, so its
+            # hash does not depend on the longest function it is batched with
+            combined = np.where(j < widths[owner], combined * np.uint64(1000003) + padded[j:j + len(tokens)],
+                                combined)
+    combined = combined[keep]
+    counts = lengths - widths + (lengths > 0)
+    return (combined ^ (combined >> np.uint64(32))) & np.uint64(0xFFFFFFFF), counts
+
+def minhash_signatures(codes: List[str], num_perm: int = NUM_PERM,
+                       shingle_size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    MinHash signatures of functions' code.
+
+    Args:
+        codes: Function sources
+        num_perm: Signature length
+        shingle_size: Consecutive tokens per shingle
+
+    Returns:
+        uint32 array (functions x num_perm); rows of code without tokens are all 0xFFFFFFFF
+    """
+    a, b = _permutations(num_perm)
+    signatures = np.full((len(codes), num_perm), _EMPTY, dtype=np.uint32)
+    values, counts = shingles(codes, shingle_size)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    # Hash the shingles of several functions at once, then take each function's minimum
+    buffer = np.empty((_CHUNK_SHINGLES, num_perm), dtype=np.uint64)
+    start = 0
+    while start < len(codes):
+        # At least one function per chunk, however many shingles it has
+        stop = max(start + 1, int(np.searchsorted(offsets, offsets[start] + _CHUNK_SHINGLES, side="right")) - 1)
+        stop = min(stop, len(codes))
+        first, last = offsets[start], offsets[stop]
+        if last > first:
+            chunk = values[first:last]
+            hashed = buffer[:len(chunk)] if len(chunk) <= _CHUNK_SHINGLES else np.empty((len(chunk), num_perm), np.uint64)
+            # Multiply-shift hashing: the high 32 bits of (a * x + b) mod 2^64
+            np.multiply(chunk[:, None], a[None, :], out=hashed)
+            hashed += b
+            hashed >>= np.uint64(32)
+            nonempty = np.flatnonzero(counts[start:stop])
+            signatures[start + nonempty] = np.minimum.reduceat(hashed, offsets[start:stop][nonempty] - first, axis=0)
+        start = stop
+    return signatures
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows per band) whose LSH S-curve rises just below ``threshold``.
+
+    Pairs with a similarity of about (1 / bands) ** (1 / rows) or more collide
+    in at least one band with good probability.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+class CloneIndex:
+    """Stored MinHash signatures per experiment."""
+
+    def __init__(self, signature_dir: Optional[str] = None, num_perm: int = NUM_PERM,
+                 shingle_size: int = SHINGLE_SIZE):
+        """
+        Initialize the index.
+
+        Args:
+            signature_dir: Directory of the stored signatures (default: SIGNATURE_DIR)
+            num_perm: Signature length
+            shingle_size: Consecutive tokens per shingle
+        """
+        self.signature_dir = signature_dir or SIGNATURE_DIR
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    @staticmethod
+    def extracted_path(exp_id: str) -> str:
+        return os.path.join(R2E_BUCKET_PATH, "extracted_data", f"{exp_id}_extracted.json")
+
+    def _path(self, exp_id: str) -> str:
+        return os.path.join(self.signature_dir, f"{exp_id}.npz")
+
+    def build(self, exp_id: str) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Compute and store the signatures of one experiment.
+
+        Returns:
+            (functions, signatures): function_id/function_name/repo_name/file_path rows and their signatures
+        """
+        path = self.extracted_path(exp_id)
+        version = catalog_version(path)
+        with open(path, 'r') as f:
+            functions = json.load(f)
+
+        rows = []
+        for function_id, func in enumerate(functions):
+            module = func.get("file", {}).get("file_module", {})
+            rows.append((function_id, func.get("function_name", ""), module.get("repo", {}).get("repo_name", ""),
+                         module.get("module_id", {}).get("identifier", "")))
+        meta = pd.DataFrame(rows, columns=["function_id", "function_name", "repo_name", "file_path"])
+        signatures = minhash_signatures([func.get("function_code", "") for func in functions],
+                                        self.num_perm, self.shingle_size)
+
+        os.makedirs(self.signature_dir, exist_ok=True)
+        np.savez(self._path(exp_id), version=np.array(version or ""), shingle_size=self.shingle_size,
+                 signatures=signatures, function_name=meta["function_name"].to_numpy(str),
+                 repo_name=meta["repo_name"].to_numpy(str), file_path=meta["file_path"].to_numpy(str))
+        return meta, signatures
+
+    def load(self, exp_id: str, rebuild: bool = False) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Stored signatures of an experiment, computed first if missing or stale."""
+        path = self._path(exp_id)
+        if not rebuild and os.path.exists(path):
+            with np.load(path) as stored:
+                if (str(stored["version"]) == (catalog_version(self.extracted_path(exp_id)) or "")
+                        and stored["signatures"].shape[1] == self.num_perm
+                        and int(stored["shingle_size"]) == self.shingle_size):
+                    signatures = stored["signatures"]
+                    meta = pd.DataFrame({"function_id": np.arange(len(signatures)),
+                                         "function_name": stored["function_name"].astype(object),
+                                         "repo_name": stored["repo_name"].astype(object),
+                                         "file_path": stored["file_path"].astype(object)})
+                    return meta, signatures
+        return self.build(exp_id)
+
+def _clusters(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Connected-component label (smallest member) of each of ``n`` items joined by edges."""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        updated = updated[updated]  # pointer jumping
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def find_clones(experiments: List[str], threshold: float = 0.8, cross_repo: bool = False,
+                min_size: int = 2, index: Optional[CloneIndex] = None) -> pd.DataFrame:
+    """
+    Clusters of near-duplicate functions across experiments.
+
+    Args:
+        experiments: Experiment IDs to compare (within and across)
+        threshold: Minimum estimated Jaccard similarity of shingle sets
+        cross_repo: Only report clusters spanning more than one repository
+        min_size: Minimum functions per cluster
+        index: CloneIndex holding the signatures (default: the shared one)
+
+    Returns:
+        DataFrame with cluster, size, experiment, function_id, function_name,
+        repo_name, file_path and similarity (to the cluster's first function),
+        largest clusters first
+    """
+    index = index or CloneIndex()
+    metas, blocks = [], []
+    for exp_id in experiments:
+        try:
+            meta, signatures = index.load(exp_id)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Skipping {exp_id}: {e}")
+            continue
+        metas.append(meta.assign(experiment=exp_id))
+        blocks.append(signatures)
+    columns = ["cluster", "size", "experiment", "function_id", "function_name", "repo_name", "file_path", "similarity"]
+    if not blocks:
+        return pd.DataFrame(columns=columns)
+
+    functions = pd.concat(metas, ignore_index=True)
+    signatures = np.concatenate(blocks)
+    # Functions without any code token cannot be compared
+    candidates = np.flatnonzero((signatures != _EMPTY).any(axis=1))
+    bands, rows = lsh_bands(signatures.shape[1], threshold)
+
+    pairs = []
+    for band in range(bands):
+        chunk = signatures[candidates, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = np.zeros(len(candidates), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for column in range(rows):
+                keys = keys * np.uint64(0x9E3779B97F4A7C15) + chunk[:, column]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        # Each bucket member is paired with the bucket's first member only
+        heads = order[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+        members = ~first
+        pairs.append(np.stack([candidates[heads[members]], candidates[order[members]]], axis=1))
+
+    edges = np.unique(np.concatenate(pairs), axis=0) if pairs else np.zeros((0, 2), dtype=np.int64)
+    if len(edges):
+        agreement = (signatures[edges[:, 0]] == signatures[edges[:, 1]]).mean(axis=1)
+        edges = edges[agreement >= threshold]
+
+    labels = _clusters(len(signatures), edges[:, 0], edges[:, 1])
+    functions["cluster"] = labels
+    functions["similarity"] = (signatures == signatures[labels]).mean(axis=1).round(3)
+    functions["size"] = functions.groupby("cluster")["cluster"].transform("size")
+    clones = functions[functions["size"] >= max(2, min_size)]
+    if cross_repo:
+        spread = clones.groupby("cluster")[["experiment", "repo_name"]].nunique()
+        spanning = spread.index[(spread["experiment"] > 1) | (spread["repo_name"] > 1)]
+        clones = clones[clones["cluster"].isin(spanning)]
+
+    clones = clones.sort_values(["size", "cluster", "similarity"], ascending=[False, True, False], kind="stable")
+    # Number clusters 1, 2, ... in the order they are reported
+    clones["cluster"] = pd.factorize(clones["cluster"])[0] + 1
+    return clones[columns].reset_index(drop=True)
+
+def print_clones(clones: pd.DataFrame, max_clusters: int = 20):
+    """Print clone clusters, largest first."""
+    if clones.empty:
+        print("No clones found.")
+        return
+    count = clones["cluster"].nunique()
+    print(f"\nFound {count} clusters of near-duplicate functions ({len(clones)} functions):")
+    for cluster, group in clones.groupby("cluster", sort=True):
+        if cluster > max_clusters:
+            print(f"\n... {count - max_clusters} more clusters")
+            break
+        print(f"\nCluster {cluster} ({len(group)} functions)")
+        for _, func in group.iterrows():
+            print(f"  {func['similarity']:.2f}  {func['function_name']} ({func['repo_name']}) "
+                  f"[{func['experiment']}] {func['file_path']}")
+
+def main():
+    from multi_repo_search import get_all_experiments
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate functions across experiments")
+    parser.add_argument("--experiments", type=str, nargs="*", help="Experiments to compare (default: all)")
+    parser.add_argument("--build", action="store_true", help="(Re)compute the signatures and exit")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated Jaccard similarity")
+    parser.add_argument("--cross-repo", action="store_true", help="Only report clusters spanning several repositories")
+    parser.add_argument("--min-size", type=int, default=2, help="Minimum functions per cluster")
+    parser.add_argument("--max-clusters", type=int, default=20, help="Clusters to print")
+    parser.add_argument("--output", type=str, help="Also write all clusters to this CSV file")
+
+    args = parser.parse_args()
+    experiments = args.experiments or get_all_experiments()
+    if not experiments:
+        print("No experiments found. Extract functions from repositories first.")
+        sys.exit(1)
+
+    if args.build:
+        index = CloneIndex()
+        for exp_id in experiments:
+            meta, _ = index.build(exp_id)
+            print(f"Computed MinHash signatures for {len(meta)} functions in {exp_id}")
+        return
+
+    clones = find_clones(experiments, args.threshold, args.cross_repo, args.min_size)
+    print_clones(clones, args.max_clusters)
+    if args.output:
+        clones.to_csv(args.output, index=False)
+        print(f"\nWrote {len(clones)} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
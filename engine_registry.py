@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Engine Registry - Memory-budgeted R2EQueryEngine instances by experiment
+
+Processes that touch many experiments get their engines from one
+registry instead of loading them ad hoc. The registry:
+
+- loads each experiment once, even when several threads ask for it at
+  the same time (the others wait for the first load);
+- records each engine's catalog memory and, after a load pushes the
+  process RSS over the budget, evicts least recently used experiments
+  until the estimated RSS is back under it;
+- reloads an experiment whose extracted data changed since it was loaded.
+
+The budget comes from ``memory_budget_mb`` or R2E_MEMORY_BUDGET_MB
+(unset means no limit). Engines for other API credentials share the
+loaded catalog of the experiment instead of loading it again.
+
+Example:
+    registry = get_registry()
+    engine = registry.get("PAE_exp")
+"""
+
+import os
+import gc
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from session_store import catalog_version
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def engine_memory(engine) -> int:
+    """Bytes held by an engine's loaded catalog."""
+    if engine.functions_df is None:
+        return 0
+    return int(engine.functions_df.memory_usage(deep=True).sum())
+
+class _Entry:
+    """A loaded experiment: its engine, catalog version, size and credential variants."""
+
+    def __init__(self, engine, version: str, size: int):
+        self.engine = engine
+        self.version = version
+        self.size = size
+        self.variants: Dict[tuple, Any] = {}
+
+class EngineRegistry:
+    """Hands out loaded R2EQueryEngine instances by experiment ID within a memory budget."""
+
+    def __init__(self, memory_budget_mb: Optional[float] = None, api_key: Optional[str] = None,
+                 use_openrouter: bool = False):
+        """
+        Initialize the registry.
+
+        Args:
+            memory_budget_mb: Process RSS budget in megabytes (default: R2E_MEMORY_BUDGET_MB, unset = no limit)
+            api_key: Optional API key for the engines (falls back to env var)
+            use_openrouter: Whether engines use OpenRouter API instead of OpenAI
+        """
+        if memory_budget_mb is None and os.environ.get("R2E_MEMORY_BUDGET_MB"):
+            memory_budget_mb = float(os.environ["R2E_MEMORY_BUDGET_MB"])
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self.api_key = api_key
+        self.use_openrouter = use_openrouter
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def _new_engine(self, exp_id: str, api_key: Optional[str], use_openrouter: bool):
+        from r2e_query_engine import R2EQueryEngine
+        return R2EQueryEngine(exp_id, api_key, use_openrouter=use_openrouter)
+
+    def _is_current(self, entry: Optional[_Entry]) -> bool:
+        return entry is not None and catalog_version(entry.engine.extracted_data_path) == entry.version
+
+    def _load(self, exp_id: str) -> _Entry:
+        engine = self._new_engine(exp_id, self.api_key, self.use_openrouter)
+        version = catalog_version(engine.extracted_data_path)
+        if not engine.load_data():
+            raise Exception(f"Failed to load data for experiment '{exp_id}'")
+        return _Entry(engine, version, engine_memory(engine))
+
+    def get(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: Optional[bool] = None):
+        """
+        Loaded engine for an experiment.
+
+        Args:
+            exp_id: R2E experiment ID
+            api_key: Use these credentials instead of the registry's (shares the loaded catalog)
+            use_openrouter: Provider for api_key (default: the registry's)
+
+        Returns:
+            R2EQueryEngine with data loaded
+        """
+        with self._lock:
+            entry = self._entries.get(exp_id)
+            if entry is not None:
+                self._entries.move_to_end(exp_id)
+        if not self._is_current(entry):
+            entry = self._load_once(exp_id)
+        return self._variant(entry, exp_id, api_key, use_openrouter)
+
+    def _load_once(self, exp_id: str) -> _Entry:
+        """Load (or reload) an experiment, letting concurrent callers wait for one load."""
+        with self._lock:
+            load_lock = self._load_locks.setdefault(exp_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(exp_id)
+            if self._is_current(entry):
+                return entry
+            entry = self._load(exp_id)
+            with self._lock:
+                self._entries[exp_id] = entry
+                self._entries.move_to_end(exp_id)
+                self.loads += 1
+            self._enforce_budget(keep=exp_id)
+            return entry
+
+    def _variant(self, entry: _Entry, exp_id: str, api_key: Optional[str], use_openrouter: Optional[bool]):
+        """The entry's engine, or one for other credentials sharing its catalog."""
+        if use_openrouter is None:
+            use_openrouter = self.use_openrouter
+        if (api_key is None or api_key == self.api_key) and use_openrouter == self.use_openrouter:
+            return entry.engine
+        key = (api_key, use_openrouter)
+        with self._lock:
+            engine = entry.variants.get(key)
+            if engine is None:
+                engine = self._new_engine(exp_id, api_key, use_openrouter)
+                # Same rows and function ids as the loaded engine; no second copy in memory
+                engine.functions_df = entry.engine.functions_df
+                entry.variants[key] = engine
+        return engine
+
+    def _enforce_budget(self, keep: str):
+        """Evict least recently used experiments (never ``keep``) while over the RSS budget."""
+        if self.memory_budget is None:
+            return
+        rss = current_rss()
+        with self._lock:
+            tracked = sum(entry.size for entry in self._entries.values())
+            # Freed memory is not always returned to the OS at once, so plan from
+            # the tracked sizes rather than re-reading RSS after each eviction
+            estimated = rss if rss is not None else tracked
+            evicted = []
+            for exp_id in list(self._entries):
+                if estimated <= self.memory_budget:
+                    break
+                if exp_id == keep:
+                    continue
+                estimated -= self._entries.pop(exp_id).size
+                evicted.append(exp_id)
+            self.evictions += len(evicted)
+        if evicted:
+            gc.collect()
+            print(f"Evicted {', '.join(evicted)} to stay within the memory budget")
+
+    def holds(self, engine) -> bool:
+        """Whether an engine (or a credential variant) is still resident."""
+        with self._lock:
+            return any(engine is entry.engine or engine in entry.variants.values()
+                       for entry in self._entries.values())
+
+    def evict(self, exp_id: str):
+        """Drop an experiment's engines."""
+        with self._lock:
+            if self._entries.pop(exp_id, None) is not None:
+                self.evictions += 1
+
+    def refresh(self):
+        """Reload resident experiments whose extracted data changed."""
+        with self._lock:
+            resident = list(self._entries.items())
+        for exp_id, entry in resident:
+            if self._is_current(entry):
+                continue
+            try:
+                self._load_once(exp_id)
+                print(f"Reloaded {exp_id} after its extracted data changed")
+            except Exception as e:
+                print(f"Error reloading {exp_id}: {e}")
+
+    def resident(self) -> List[str]:
+        """Resident experiments, least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, exp_id: str) -> bool:
+        with self._lock:
+            return exp_id in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        rss = current_rss()
+        with self._lock:
+            return {
+                "experiments": list(self._entries),
+                "memory_mb": round(sum(entry.size for entry in self._entries.values()) / (1024 * 1024), 1),
+                "rss_mb": round(rss / (1024 * 1024), 1) if rss is not None else None,
+                "budget_mb": round(self.memory_budget / (1024 * 1024), 1) if self.memory_budget else None,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+_shared_registry: Optional[EngineRegistry] = None
+_shared_lock = threading.Lock()
+
+def get_registry() -> EngineRegistry:
+    """The process-wide registry (budget from R2E_MEMORY_BUDGET_MB)."""
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = EngineRegistry()
+        return _shared_registry
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Filter Cascade - Cheap proxy scoring before LLM verification for semantic filters
+
+A semantic filter otherwise costs one LLM judgement per row. The cascade
+scores every row locally first with the global index scorer (BM25 plus
+hashed-vector similarity between the condition and the function's name
+and code), then:
+
+- rows scoring at or above a high threshold are accepted,
+- rows scoring at or below a low threshold are rejected,
+- only the uncertain band in between goes to the LLM, many functions per
+  prompt.
+
+The thresholds are calibrated per filter: a sample of rows, stratified by
+proxy score, is labelled by the LLM. The high threshold is the loosest
+one whose accepted sample rows reach the target precision; the low one
+rejects the lowest scores as long as the sample matches among them stay
+within the target recall. Filter cost therefore grows with how ambiguous
+the condition is rather than with the size of the table. A sample with
+fewer than MIN_REJECT_POSITIVES matches says too little about where the
+matches score to reject anything; then every unsampled row is either
+accepted or verified.
+
+Usage:
+    python filter_cascade.py --exp_id PAE_exp --condition "parses configuration files" --target-precision 0.9
+"""
+
+import os
+import sys
+import argparse
+from typing import Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from global_index import GlobalIndex, KEYWORD_WEIGHT
+
+# Score strata the calibration sample is drawn from
+CALIBRATION_STRATA = 4
+
+# Matches the calibration sample needs before rows may be rejected unverified
+MIN_REJECT_POSITIVES = 3
+
+def proxy_scores(functions: pd.DataFrame, condition: str) -> np.ndarray:
+    """
+    Local relevance of every function to a filter condition, in [0, 1].
+
+    Args:
+        functions: Functions DataFrame (function_name and code columns)
+        condition: Natural language filter condition
+
+    Returns:
+        float array aligned with the rows of ``functions``
+    """
+    keyword, vector = GlobalIndex.from_functions(functions).scores(condition)
+    return (KEYWORD_WEIGHT * keyword + (1 - KEYWORD_WEIGHT) * vector).astype(float)
+
+def _loosest_threshold(scores: np.ndarray, correct: np.ndarray, weights: np.ndarray,
+                       target_precision: float) -> int:
+    """
+    Longest prefix of rows (sorted best first) whose weighted precision reaches the target.
+
+    One extra average-weight wrong row is counted, so a handful of sample rows
+    cannot reach a high target on its own. Prefixes may only end between
+    different scores.
+
+    Returns:
+        Index of the last row of the prefix, or -1 if no prefix qualifies
+    """
+    right = np.cumsum(weights * correct)
+    total = np.cumsum(weights) + weights.mean()
+    ends_tie = np.r_[scores[:-1] != scores[1:], True]
+    qualifying = np.flatnonzero((right / total >= target_precision) & ends_tie)
+    return int(qualifying[-1]) if len(qualifying) else -1
+
+def calibrate_thresholds(scores: np.ndarray, labels: np.ndarray, weights: np.ndarray,
+                         target_precision: float, target_recall: float) -> Tuple[float, float]:
+    """
+    Reject and accept thresholds from an LLM-labelled sample.
+
+    Args:
+        scores: Proxy scores of the sample rows
+        labels: LLM judgements of the sample rows
+        weights: Rows of the full table each sample row stands for
+        target_precision: Wanted precision of the accepted rows
+        target_recall: Share of the matches that must survive the rejected rows
+
+    Returns:
+        (low, high): rows scoring <= low are rejected, rows scoring >= high accepted
+        (-inf / inf when the sample does not support any; low is -inf whenever
+        the sample has fewer than MIN_REJECT_POSITIVES matches)
+    """
+    labels = labels.astype(bool)
+    descending = np.argsort(-scores, kind="stable")
+    last = _loosest_threshold(scores[descending], labels[descending], weights[descending], target_precision)
+    high = float(scores[descending][last]) if last >= 0 else np.inf
+
+    # Without enough matches in the sample the recall budget cannot be estimated
+    if labels.sum() < MIN_REJECT_POSITIVES:
+        return -np.inf, high
+
+    # Reject the lowest scores while the matches among them stay within the recall budget
+    ascending = descending[::-1]
+    ordered = scores[ascending]
+    lost = np.cumsum(weights[ascending] * labels[ascending])
+    budget = (1 - target_recall) * lost[-1]
+    ends_tie = np.r_[ordered[:-1] != ordered[1:], True]
+    qualifying = np.flatnonzero((lost <= budget) & ends_tie & (ordered < high))
+    low = float(ordered[qualifying[-1]]) if len(qualifying) else -np.inf
+    return low, high
+
+class FilterCascade:
+    """Semantic filter that sends only rows the proxy cannot decide to the LLM."""
+
+    def __init__(self, engine, target_precision: float = 0.9, target_recall: float = 0.95,
+                 sample_size: int = 40, batch_size: int = 20, seed: int = 0):
+        """
+        Initialize the cascade.
+
+        Args:
+            engine: R2EQueryEngine used for LLM verification
+            target_precision: Wanted precision of the rows accepted without the LLM
+            target_recall: Share of the matches that must survive the rows rejected without the LLM
+            sample_size: Rows labelled by the LLM to calibrate the thresholds
+            batch_size: Functions per verification prompt
+            seed: Seed of the calibration sample
+        """
+        self.engine = engine
+        self.target_precision = target_precision
+        self.target_recall = target_recall
+        self.sample_size = sample_size
+        self.batch_size = batch_size
+        self.seed = seed
+        self.stats: Dict[str, Any] = {}
+
+    def _sample(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Calibration rows drawn evenly from score strata, and the rows each stands for."""
+        rng = np.random.default_rng(self.seed)
+        strata = np.array_split(np.argsort(scores, kind="stable"), CALIBRATION_STRATA)
+        per_stratum = max(1, self.sample_size // CALIBRATION_STRATA)
+        rows, weights = [], []
+        for stratum in strata:
+            if len(stratum) == 0:
+                continue
+            chosen = rng.choice(stratum, size=min(per_stratum, len(stratum)), replace=False)
+            rows.append(chosen)
+            weights.append(np.full(len(chosen), len(stratum) / len(chosen)))
+        return np.concatenate(rows), np.concatenate(weights)
+
+    def run(self, functions: pd.DataFrame, condition: str) -> pd.DataFrame:
+        """
+        Filter functions by a natural language condition.
+
+        Args:
+            functions: Functions DataFrame (function_name, repo_name and code columns)
+            condition: Natural language filter condition
+
+        Returns:
+            Matching rows in their original order, with proxy_score and
+            filter_stage ("accepted", "sampled" or "verified") columns
+        """
+        n = len(functions)
+        scores = proxy_scores(functions, condition) if n else np.zeros(0)
+        decided = np.zeros(n, dtype=bool)
+        matches = np.zeros(n, dtype=bool)
+        stage = np.array([""] * n, dtype=object)
+        batches = 0
+
+        # Calibrate on a sample; its LLM labels are final for those rows
+        if n <= self.sample_size:
+            sample, weights = np.arange(n), np.ones(n)
+        else:
+            sample, weights = self._sample(scores)
+        labels = np.array(self.engine.verify_filter(condition, functions.iloc[sample], self.batch_size), dtype=bool)
+        batches += -(-len(sample) // self.batch_size)
+        decided[sample], matches[sample], stage[sample] = True, labels, "sampled"
+        low, high = calibrate_thresholds(scores[sample], labels, weights, self.target_precision,
+                                         self.target_recall) if len(sample) else (-np.inf, np.inf)
+
+        accepted = ~decided & (scores >= high)
+        rejected = ~decided & (scores <= low)
+        decided |= accepted | rejected
+        matches[accepted], stage[accepted] = True, "accepted"
+
+        # Only the uncertain band reaches the LLM
+        uncertain = np.flatnonzero(~decided)
+        if len(uncertain):
+            verified = self.engine.verify_filter(condition, functions.iloc[uncertain], self.batch_size)
+            matches[uncertain], stage[uncertain] = np.array(verified, dtype=bool), "verified"
+            batches += -(-len(uncertain) // self.batch_size)
+
+        self.stats = {
+            "rows": n,
+            "sampled": len(sample),
+            "accepted": int(accepted.sum()),
+            "rejected": int(rejected.sum()),
+            "verified": len(uncertain),
+            "matches": int(matches.sum()),
+            "llm_rows": len(sample) + len(uncertain),
+            "llm_prompts": batches,
+            "low_threshold": round(low, 4) if np.isfinite(low) else None,
+            "high_threshold": round(high, 4) if np.isfinite(high) else None,
+        }
+        return functions[matches].assign(proxy_score=scores[matches].round(4), filter_stage=stage[matches])
+
+    def print_stats(self):
+        stats = self.stats
+        if not stats:
+            return
+        print(f"Cascade filter: {stats['matches']} of {stats['rows']} rows match; "
+              f"{stats['llm_rows']} rows judged by the LLM in {stats['llm_prompts']} prompts "
+              f"({stats['sampled']} calibration, {stats['verified']} uncertain), "
+              f"{stats['accepted']} accepted and {stats['rejected']} rejected by the proxy "
+              f"(thresholds {stats['low_threshold']} / {stats['high_threshold']})")
+
+def main():
+    from r2e_query_engine import R2EQueryEngine
+
+    parser = argparse.ArgumentParser(description="Semantic filter with proxy scoring and LLM verification")
+    parser.add_argument("--exp_id", type=str, required=True, help="R2E experiment ID")
+    parser.add_argument("--condition", type=str, required=True, help="Natural language filter condition")
+    parser.add_argument("--target-precision", type=float, default=0.9, help="Precision of the rows the proxy accepts")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Share of matches kept by the proxy's rejections")
+    parser.add_argument("--sample-size", type=int, default=40, help="Rows labelled by the LLM for calibration")
+    parser.add_argument("--batch-size", type=int, default=20, help="Functions per LLM prompt")
+    parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API")
+    parser.add_argument("--limit", type=int, default=20, help="Matching functions to print")
+
+    args = parser.parse_args()
+    engine = R2EQueryEngine(args.exp_id, use_openrouter=args.use_openrouter)
+    if not engine.load_data():
+        sys.exit(1)
+
+    cascade = FilterCascade(engine, args.target_precision, args.target_recall, args.sample_size, args.batch_size)
+    matches = cascade.run(engine.scan(["function_id", "function_name", "repo_name", "file_path", "code"]),
+                          args.condition)
+    cascade.print_stats()
+    for _, func in matches.head(args.limit).iterrows():
+        print(f"  {func['proxy_score']:.2f}  {func['filter_stage']:9} {func['function_name']} "
+              f"({func['repo_name']}) {func['file_path']}")
+
+if __name__ == "__main__":
+    main()
@@ -56,8 +56,8 @@ def load_experiment_data(exp_id):
         print(f"Error loading data: {e}")
         return None
 
-def generate_documentation(exp_id):
-    """Generate documentation for an experiment."""
+def generate_documentation(exp_id, functions_df=None):
+    """Generate documentation for an experiment (from an already loaded catalog if given)."""
     # Create directory for documentation
     docs_dir = os.path.join(BASE_DIR, "docs")
     os.makedirs(docs_dir, exist_ok=True)
@@ -67,7 +67,8 @@ def generate_documentation(exp_id):
     html_file = os.path.join(docs_dir, f"{exp_id}_documentation.html")
     
     # Load the function data
-    functions_df = load_experiment_data(exp_id)
+    if functions_df is None:
+        functions_df = load_experiment_data(exp_id)
     if functions_df is None or len(functions_df) == 0:
         print(f"No functions found for {exp_id}")
         return None
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Global Index - One keyword + vector index spanning every experiment
+
+Instead of loading and searching each experiment separately, all
+extracted functions go into a single index:
+
+- keyword: BM25 over identifier tokens from function names and code
+- vector: hashed TF-IDF vectors (numpy only), compared by cosine similarity.
+  They are stored sparsely by bucket, so the hashing dimension can be large
+  enough to make collisions between query and document terms rare.
+
+Because corpus statistics are shared, scores are comparable across
+experiments. Both parts are calibrated to [0, 1] (BM25 is divided by its
+upper bound for the query) and blended into a 0-10 relevance score.
+
+The index is stored under ~/buckets/r2e_bucket/index, one file pair per
+set of experiments, and rebuilt when any of them changes.
+
+Usage:
+    python global_index.py --build
+    python global_index.py --query "graph traversal" --limit 20
+"""
+
+import os
+import re
+import sys
+import json
+import zlib
+import math
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from session_store import catalog_version
+from search_workers import Hit
+
+R2E_BUCKET_PATH = os.path.expanduser("~/buckets/r2e_bucket")
+INDEX_DIR = os.path.join(R2E_BUCKET_PATH, "index")
+
+# BM25 parameters and the weight of the keyword part in the blended score
+BM25_K1 = 1.2
+BM25_B = 0.75
+KEYWORD_WEIGHT = 0.6
+
+# Function name tokens count this many times as much as code tokens
+NAME_WEIGHT = 3
+
+# Buckets of the hashed TF-IDF vectors
+VECTOR_DIM = 2 ** 18
+
+# Keyword-fallback results score at most this much on the 0-10 scale, so a
+# full keyword match ranks below LLM results the model found relevant
+KEYWORD_FALLBACK_MAX = 1.0
+
+_IDENTIFIER = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case identifier parts of ``text`` (snake_case and camelCase are split)."""
+    tokens = []
+    for identifier in _IDENTIFIER.findall(text or ""):
+        for part in _CAMEL.findall(identifier):
+            if len(part) > 1:
+                tokens.append(part.lower())
+    return tokens
+
+def document_tokens(function_name: str, code: str) -> List[str]:
+    """Tokens indexed for one function."""
+    return tokenize(function_name) * NAME_WEIGHT + tokenize(code)
+
+def _bucket(token: str, dim: int) -> Tuple[int, float]:
+    """Feature-hashing bucket and sign for a token (stable across processes)."""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+def calibrated_scores(results: pd.DataFrame, query: str) -> pd.Series:
+    """
+    Relevance of engine results on a common 0-10 scale.
+
+    LLM results already carry ``relevance_score`` (0-10). Keyword fallback
+    results carry ``relevance`` = number of matched query keywords; matching
+    keywords says little about relevance, so the fraction of query keywords
+    matched is mapped to [0, KEYWORD_FALLBACK_MAX] and fallback hits rank
+    after the LLM's.
+
+    Args:
+        results: Results from semantic_search / simple_keyword_search
+        query: The query the results answer
+
+    Returns:
+        Series of scores aligned with ``results``
+    """
+    if results.empty:
+        return pd.Series(dtype=float)
+    keywords = max(1, len(query.lower().split()))
+    scores = pd.Series(np.nan, index=results.index, dtype=float)
+    if "relevance_score" in results.columns:
+        scores = pd.to_numeric(results["relevance_score"], errors="coerce")
+    if "relevance" in results.columns:
+        keyword = KEYWORD_FALLBACK_MAX * pd.to_numeric(results["relevance"], errors="coerce").clip(upper=keywords) / keywords
+        scores = scores.fillna(keyword)
+    return scores.fillna(0.0)
+
+class GlobalIndex:
+    """BM25 + hashed-vector index over the functions of many experiments."""
+
+    def __init__(self, index_dir: Optional[str] = None, dim: int = VECTOR_DIM):
+        """
+        Initialize an empty index.
+
+        Args:
+            index_dir: Directory for the stored index (default: INDEX_DIR)
+            dim: Dimension of the hashed TF-IDF vectors
+        """
+        self.index_dir = index_dir or INDEX_DIR
+        self.dim = dim
+        self.docs = pd.DataFrame(columns=["experiment", "function_id", "function_name", "repo_name", "file_path"])
+        self.versions: Dict[str, Optional[str]] = {}
+        self.terms: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings_doc = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.float32)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        # Normalized vector weights grouped by bucket: the documents and weights
+        # of bucket b are vector_docs/vector_weights[vector_offsets[b]:vector_offsets[b + 1]]
+        self.vector_offsets = np.zeros(dim + 1, dtype=np.int64)
+        self.vector_docs = np.zeros(0, dtype=np.int32)
+        self.vector_weights = np.zeros(0, dtype=np.float32)
+
+    @staticmethod
+    def extracted_path(exp_id: str) -> str:
+        return os.path.join(R2E_BUCKET_PATH, "extracted_data", f"{exp_id}_extracted.json")
+
+    def _paths(self, experiments: List[str]) -> Tuple[str, str]:
+        # Each set of experiments has its own files, so indexing a subset does not replace the full index
+        key = hashlib.sha1("\n".join(sorted(set(experiments))).encode("utf-8")).hexdigest()[:16]
+        return (os.path.join(self.index_dir, f"global_index_{key}.npz"),
+                os.path.join(self.index_dir, f"global_index_{key}.json"))
+
+    def build(self, experiments: List[str], workers: int = 8):
+        """
+        Build the index from the experiments' extracted data.
+
+        Args:
+            experiments: Experiment IDs to index
+            workers: Threads used to read the extracted JSON files
+        """
+        def read(exp_id):
+            path = self.extracted_path(exp_id)
+            version = catalog_version(path)
+            try:
+                with open(path, 'r') as f:
+                    return exp_id, version, json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Skipping {exp_id}: {e}")
+                return exp_id, version, []
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            loaded = list(executor.map(read, experiments))
+
+        rows = []
+        doc_terms = []
+        for exp_id, version, functions in loaded:
+            self.versions[exp_id] = version
+            for function_id, func in enumerate(functions):
+                module = func.get("file", {}).get("file_module", {})
+                name = func.get("function_name", "")
+                rows.append((exp_id, function_id, name, module.get("repo", {}).get("repo_name", ""),
+                             module.get("module_id", {}).get("identifier", "")))
+                doc_terms.append(Counter(document_tokens(name, func.get("function_code", ""))))
+
+        self._index(rows, doc_terms)
+        print(f"Indexed {len(rows)} functions from {len(experiments)} experiments ({len(self.terms)} terms)")
+
+    @classmethod
+    def from_functions(cls, functions: pd.DataFrame, experiment: str = "", dim: int = VECTOR_DIM) -> "GlobalIndex":
+        """
+        In-memory index over a functions DataFrame (e.g. an engine catalog or scan).
+
+        Documents keep the order of ``functions``; nothing is stored on disk.
+
+        Args:
+            functions: DataFrame with function_name and code columns
+            experiment: Experiment recorded for every document
+            dim: Dimension of the hashed TF-IDF vectors
+        """
+        def column(name):
+            return functions[name].fillna("").tolist() if name in functions.columns else [""] * len(functions)
+
+        ids = functions["function_id"] if "function_id" in functions.columns else range(len(functions))
+        names = column("function_name")
+        rows = list(zip([experiment] * len(functions), ids, names, column("repo_name"), column("file_path")))
+        index = cls(dim=dim)
+        index._index(rows, [Counter(document_tokens(name, code)) for name, code in zip(names, column("code"))])
+        return index
+
+    def _index(self, rows: List[Tuple], doc_terms: List[Counter]):
+        """Build postings and hashed vectors from document metadata rows and their term counts."""
+        term_ids: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        lengths = []
+        for doc, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                if term not in term_ids:
+                    term_ids[term] = len(postings)
+                    postings.append([])
+                postings[term_ids[term]].append((doc, tf))
+            lengths.append(sum(counts.values()))
+
+        self.docs = pd.DataFrame(rows, columns=["experiment", "function_id", "function_name", "repo_name", "file_path"])
+        self.terms = term_ids
+        sizes = np.array([len(p) for p in postings], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.postings_doc = np.array([d for p in postings for d, _ in p], dtype=np.int32)
+        self.postings_tf = np.array([tf for p in postings for _, tf in p], dtype=np.float32)
+        self.doc_lengths = np.array(lengths, dtype=np.float32)
+
+        # Hashed TF-IDF vectors, L2-normalized so a dot product is the cosine
+        idf = self._idf(sizes)
+        buckets, docs, weights = [], [], []
+        for doc, counts in enumerate(doc_terms):
+            vector: Dict[int, float] = {}
+            for term, tf in counts.items():
+                bucket, sign = _bucket(term, self.dim)
+                vector[bucket] = vector.get(bucket, 0.0) + sign * (1.0 + math.log(tf)) * idf[term_ids[term]]
+            norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+            buckets.extend(vector)
+            docs.extend([doc] * len(vector))
+            weights.extend(w / norm for w in vector.values())
+        buckets = np.array(buckets, dtype=np.int64)
+        order = np.argsort(buckets, kind="stable")
+        self.vector_offsets = np.concatenate([[0], np.cumsum(np.bincount(buckets, minlength=self.dim))]).astype(np.int64)
+        self.vector_docs = np.array(docs, dtype=np.int32)[order]
+        self.vector_weights = np.array(weights, dtype=np.float32)[order]
+
+    def _idf(self, document_frequency: np.ndarray) -> np.ndarray:
+        n = max(1, len(self.doc_lengths))
+        return np.log(1.0 + (n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+    def save(self):
+        """Write the index to disk."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        npz_path, meta_path = self._paths(list(self.versions))
+        np.savez(npz_path, offsets=self.offsets, postings_doc=self.postings_doc, postings_tf=self.postings_tf,
+                 doc_lengths=self.doc_lengths, vector_offsets=self.vector_offsets, vector_docs=self.vector_docs,
+                 vector_weights=self.vector_weights)
+        with open(meta_path, 'w') as f:
+            json.dump({"dim": self.dim, "versions": self.versions, "terms": list(self.terms),
+                       "docs": self.docs.values.tolist()}, f)
+
+    def load(self, experiments: List[str]) -> bool:
+        """Read the index of these experiments from disk; returns False if there is none."""
+        npz_path, meta_path = self._paths(experiments)
+        if not (os.path.exists(npz_path) and os.path.exists(meta_path)):
+            return False
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        with np.load(npz_path) as arrays:
+            if "vector_offsets" not in arrays:
+                return False
+            self.offsets = arrays["offsets"]
+            self.postings_doc = arrays["postings_doc"]
+            self.postings_tf = arrays["postings_tf"]
+            self.doc_lengths = arrays["doc_lengths"]
+            self.vector_offsets = arrays["vector_offsets"]
+            self.vector_docs = arrays["vector_docs"]
+            self.vector_weights = arrays["vector_weights"]
+        self.dim = meta["dim"]
+        self.versions = meta["versions"]
+        self.terms = {term: i for i, term in enumerate(meta["terms"])}
+        self.docs = pd.DataFrame(meta["docs"], columns=["experiment", "function_id", "function_name", "repo_name", "file_path"])
+        return True
+
+    def is_current(self, experiments: List[str]) -> bool:
+        """Whether the index covers these experiments at their current versions."""
+        return all(exp_id in self.versions and self.versions[exp_id] == catalog_version(self.extracted_path(exp_id))
+                   for exp_id in experiments)
+
+    @classmethod
+    def load_or_build(cls, experiments: List[str], index_dir: Optional[str] = None,
+                      rebuild: bool = False) -> "GlobalIndex":
+        """Load the stored index, rebuilding it if it is missing or stale."""
+        index = cls(index_dir)
+        if not rebuild and index.load(experiments) and index.is_current(experiments):
+            return index
+        index = cls(index_dir)
+        index.build(experiments)
+        index.save()
+        return index
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calibrated keyword and vector scores of every document for a query.
+
+        Returns:
+            (keyword, vector): float32 arrays in [0, 1], in document order
+        """
+        n = len(self.docs)
+        if n == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        query_terms = Counter(tokenize(query))
+        known = [(t, self.terms[t], qtf) for t, qtf in query_terms.items() if t in self.terms]
+        document_frequency = np.diff(self.offsets)
+        idf = self._idf(document_frequency)
+
+        # BM25, divided by its upper bound so it lies in [0, 1] for every query
+        keyword = np.zeros(n, dtype=np.float32)
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        upper = 0.0
+        for _, term_id, qtf in known:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[docs] / avg_length)
+            keyword[docs] += qtf * idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm)
+            upper += qtf * idf[term_id] * (BM25_K1 + 1)
+        if upper > 0:
+            keyword /= upper
+
+        # Cosine similarity of hashed TF-IDF vectors, over the query's buckets only
+        query_vector: Dict[int, float] = {}
+        for term, term_id, qtf in known:
+            bucket, sign = _bucket(term, self.dim)
+            query_vector[bucket] = query_vector.get(bucket, 0.0) + sign * (1.0 + math.log(qtf)) * idf[term_id]
+        q_norm = math.sqrt(sum(w * w for w in query_vector.values()))
+        vector = np.zeros(n, dtype=np.float32)
+        if q_norm > 0:
+            for bucket, weight in query_vector.items():
+                start, end = self.vector_offsets[bucket], self.vector_offsets[bucket + 1]
+                vector[self.vector_docs[start:end]] += (weight / q_norm) * self.vector_weights[start:end]
+            vector = np.clip(vector, 0.0, 1.0)
+        return keyword, vector
+
+    def search(self, query: str, limit: int = 10, experiments: Optional[List[str]] = None) -> List[Hit]:
+        """
+        Rank every indexed function for the query in one pass.
+
+        Args:
+            query: Natural language query about code
+            limit: Number of hits to return
+            experiments: Restrict results to these experiments
+
+        Returns:
+            Hits with 0-10 calibrated scores, best first
+        """
+        n = len(self.docs)
+        if n == 0:
+            return []
+
+        keyword, vector = self.scores(query)
+        scores = 10.0 * (KEYWORD_WEIGHT * keyword + (1 - KEYWORD_WEIGHT) * vector)
+        if experiments is not None:
+            scores = np.where(self.docs["experiment"].isin(experiments).to_numpy(), scores, 0.0)
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        hits = []
+        for doc in candidates:
+            row = self.docs.iloc[doc]
+            hits.append(Hit(row["experiment"], int(row["function_id"]), row["function_name"], row["repo_name"],
+                            row["file_path"], round(float(scores[doc]), 2),
+                            f"keyword {keyword[doc]:.2f}, vector {vector[doc]:.2f}"))
+        return hits
+
+    def fetch_code(self, hits: List[Hit]) -> Dict[Tuple[str, int], str]:
+        """Read code for hits from the extracted data (each experiment read once)."""
+        codes = {}
+        for exp_id in dict.fromkeys(hit.experiment for hit in hits):
+            try:
+                with open(self.extracted_path(exp_id), 'r') as f:
+                    functions = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            for hit in hits:
+                if hit.experiment == exp_id and hit.function_id < len(functions):
+                    codes[(exp_id, hit.function_id)] = functions[hit.function_id].get("function_code", "")
+        return codes
+
+def main():
+    from multi_repo_search import get_all_experiments, hits_to_dataframe, display_results
+
+    parser = argparse.ArgumentParser(description="Global keyword + vector index across experiments")
+    parser.add_argument("--build", action="store_true", help="(Re)build the index")
+    parser.add_argument("--query", type=str, help="Query the index")
+    parser.add_argument("--experiments", type=str, nargs="*", help="Experiments to index (default: all)")
+    parser.add_argument("--limit", type=int, default=10, help="Number of results")
+    parser.add_argument("--show-code", action="store_true", help="Show code for results")
+
+    args = parser.parse_args()
+    experiments = args.experiments or get_all_experiments()
+    if not experiments:
+        print("No experiments found. Extract functions from repositories first.")
+        sys.exit(1)
+
+    index = GlobalIndex.load_or_build(experiments, rebuild=args.build)
+    if args.query:
+        hits = index.search(args.query, args.limit, experiments)
+        codes = index.fetch_code(hits) if args.show_code else None
+        display_results(hits_to_dataframe(hits, codes), args.show_code, args.query)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Lazy Imports - Defer heavy module imports until first use
+
+pandas, numpy, openai, matplotlib and networkx together cost the CLI
+hundreds of milliseconds before it does anything. Entry points bind
+those names to lazy modules instead, so commands that never touch them
+(list, help, server round trips) start without paying for the import.
+
+Example:
+    pd = lazy_module("pandas")   # nothing imported yet
+    df = pd.DataFrame()          # pandas is imported here
+"""
+
+import types
+import importlib
+
+class LazyModule(types.ModuleType):
+    """Module placeholder that imports the real module on first attribute access."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the real attributes without going through __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+def lazy_module(name: str) -> types.ModuleType:
+    """
+    Module that is imported the first time one of its attributes is used.
+
+    Args:
+        name: Full module name, e.g. "matplotlib.pyplot"
+
+    Returns:
+        The module itself if it is already imported, otherwise a LazyModule
+    """
+    import sys
+
+    return sys.modules.get(name) or LazyModule(name)
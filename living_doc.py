@@ -122,29 +122,14 @@ class LivingDoc:
             if arxiv_url:
                 f.write(f"* **arXiv Paper**: [{arxiv_url}]({arxiv_url})\n")
                 
-                # Try to extract paper metadata
-                try:
-                    import requests
-                    from bs4 import BeautifulSoup
-                    
-                    if "arxiv.org/abs/" in arxiv_url:
-                        paper_id = arxiv_url.split("/abs/")[1].split(".")[0]
-                        api_url = f"http://export.arxiv.org/api/query?id_list={paper_id}"
-                        response = requests.get(api_url)
-                        
-                        if response.status_code == 200:
-                            soup = BeautifulSoup(response.content, 'xml')
-                            title = soup.find('title').text.strip()
-                            abstract = soup.find('summary').text.strip()
-                            authors = [author.find('name').text for author in soup.find_all('author')]
-                            
-                            f.write(f"* **Paper Title**: {title}\n")
-                            f.write(f"* **Authors**: {', '.join(authors)}\n")
-                            f.write("\n**Abstract**:\n\n")
-                            f.write(f"> {abstract}\n\n")
-                except Exception as e:
-                    # Continue without the metadata
-                    pass
+                # Paper metadata from the shared cache (already fetched if the search used it)
+                from arxiv_cache import get_arxiv_cache
+                paper = get_arxiv_cache().get(arxiv_url)
+                if paper is not None:
+                    f.write(f"* **Paper Title**: {paper['title']}\n")
+                    f.write(f"* **Authors**: {', '.join(paper['authors'])}\n")
+                    f.write("\n**Abstract**:\n\n")
+                    f.write(f"> {paper['abstract']}\n\n")
             
             # Results summary
             f.write("\n### Results Summary\n\n")
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+LLM Router - Hedged model fallback, circuit breaking and latency tracking
+
+Each engine operation (search/research/prototype/filter) has a route: an ordered
+list of models, a hedge delay and an overall timeout. The primary model is
+called first; if it has not answered after ``hedge_after`` seconds the next
+model is fired as well and whichever answers first wins. A model that fails
+repeatedly has its circuit opened and is skipped until ``reset_timeout``
+has passed. Callers can tighten a block of calls further with
+``ModelRouter.limits`` (a deadline and a cancel event).
+
+Routes can be overridden with a JSON file:
+
+    {
+      "search": {"models": ["openai/gpt-4o-2024-05-13", "openai/gpt-3.5-turbo"],
+                 "hedge_after": 5, "timeout": 60}
+    }
+"""
+
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+# Default hedge delays and timeouts (seconds) per operation
+DEFAULT_ROUTE_TIMINGS = {
+    "search": {"hedge_after": 10.0, "timeout": 90.0},
+    "research": {"hedge_after": 20.0, "timeout": 150.0},
+    "prototype": {"hedge_after": 30.0, "timeout": 240.0},
+    "filter": {"hedge_after": 10.0, "timeout": 90.0},
+}
+
+# Seconds between checks of a cancel event while waiting for a model
+CANCEL_POLL_INTERVAL = 0.1
+
+# (deadline, cancel event) set by ModelRouter.limits for the current thread or task
+_call_limits: ContextVar = ContextVar("r2e_call_limits", default=(None, None))
+
+def default_routes(models: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Build the default routes for every operation.
+
+    Args:
+        models: Ordered list of models, primary first
+
+    Returns:
+        Mapping of operation name to route settings
+    """
+    return {
+        operation: {"models": list(models), **timings}
+        for operation, timings in DEFAULT_ROUTE_TIMINGS.items()
+    }
+
+def load_routes(path: str, base: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Load route overrides from a JSON file on top of ``base``.
+
+    Args:
+        path: Path to a JSON file mapping operation names to route settings
+        base: Routes to update (unspecified keys keep their values)
+
+    Returns:
+        The merged routes
+    """
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+
+    routes = {op: dict(route) for op, route in (base or {}).items()}
+    for operation, route in overrides.items():
+        routes.setdefault(operation, {}).update(route)
+    return routes
+
+class CircuitBreaker:
+    """Skip a model after ``failure_threshold`` consecutive failures."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds before an open circuit lets one trial call through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half-open."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def available(self) -> bool:
+        """Whether a call could be made now, without claiming the half-open trial."""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half-open" and not self.trial_in_flight)
+
+    def allow(self) -> bool:
+        """Whether a call to the model may be made; when half-open only the first caller gets the trial."""
+        with self._lock:
+            state = self.state
+            if state == "open":
+                return False
+            if state == "half-open":
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """Give up a claimed trial without an outcome (e.g. a cancelled hedge)."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed half-open trial re-opens the circuit
+                self.opened_at = time.monotonic()
+
+class LatencyTracker:
+    """Rolling latency window for a single model."""
+
+    def __init__(self, window: int = 500):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.failures += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile (0-100) of successful calls, or None without data."""
+        with self._lock:
+            values = sorted(self.latencies)
+        if not values:
+            return None
+        index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+        return values[index]
+
+class ModelRouter:
+    """Route LLM calls per operation with hedging and circuit breaking."""
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]], failure_threshold: int = 3,
+                 reset_timeout: float = 60.0, max_workers: int = 32):
+        """
+        Initialize the router.
+
+        Args:
+            routes: Mapping of operation to {"models", "hedge_after", "timeout"}
+            failure_threshold: Consecutive failures that open a model's circuit
+            reset_timeout: Seconds an open circuit stays open
+            max_workers: Threads available for concurrent (hedged) sync calls
+        """
+        self.routes = routes
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self._lock = threading.Lock()
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[model]
+
+    def _tracker(self, model: str) -> LatencyTracker:
+        with self._lock:
+            if model not in self.trackers:
+                self.trackers[model] = LatencyTracker()
+            return self.trackers[model]
+
+    def _record(self, model: str, started: float, ok: bool):
+        self._tracker(model).record(time.monotonic() - started, ok)
+        if ok:
+            self._breaker(model).record_success()
+        else:
+            self._breaker(model).record_failure()
+
+    def _candidates(self, operation: str):
+        """Return (route, models with a closed circuit or a free half-open trial)."""
+        if operation not in self.routes:
+            raise Exception(f"No route configured for operation '{operation}'")
+        route = self.routes[operation]
+        models = [m for m in route["models"] if self._breaker(m).available()]
+        if not models:
+            raise Exception(f"All models for '{operation}' are unavailable (circuits open)")
+        return route, models
+
+    @contextmanager
+    def limits(self, deadline: Optional[float] = None, cancelled: Optional[threading.Event] = None):
+        """
+        Bound the calls routed inside the block by the current thread (or task).
+
+        Args:
+            deadline: time.monotonic() value after which calls give up, on top of the route timeout
+            cancelled: Event that makes a waiting call give up once set (sync calls only)
+        """
+        token = _call_limits.set((deadline, cancelled))
+        try:
+            yield
+        finally:
+            _call_limits.reset(token)
+
+    def complete(self, operation: str, call: Callable[[str], Any], verbose: bool = True) -> Any:
+        """
+        Run ``call(model)`` for the operation's route, hedging when slow.
+
+        Args:
+            operation: Operation name (search/research/prototype)
+            call: Blocking function performing the request for a given model
+            verbose: Whether to print hedging and model failures
+
+        Returns:
+            The first successful response
+
+        Raises:
+            Exception: If every model fails, the timeout or deadline expires or the call is cancelled
+        """
+        route, models = self._candidates(operation)
+        hedge_after = route.get("hedge_after")
+        started = time.monotonic()
+        deadline = started + route.get("timeout", 120.0)
+        limit, cancelled = _call_limits.get()
+        if limit is not None:
+            deadline = min(deadline, limit)
+
+        def timed(model):
+            # Claimed at launch: another caller may have taken the half-open trial meanwhile
+            if not self._breaker(model).allow():
+                raise Exception("circuit open")
+            started = time.monotonic()
+            try:
+                result = call(model)
+            except Exception:
+                self._record(model, started, ok=False)
+                raise
+            self._record(model, started, ok=True)
+            return result
+
+        pending = {}
+        errors = []
+        next_index = 0
+        launched_at = started
+
+        while True:
+            # Launch the next model if nothing is in flight (previous ones failed)
+            if not pending:
+                if next_index >= len(models):
+                    raise Exception(f"All models failed for {operation}: {'; '.join(errors)}")
+                pending[self._executor.submit(timed, models[next_index])] = models[next_index]
+                next_index += 1
+                launched_at = time.monotonic()
+
+            now = time.monotonic()
+            remaining = deadline - now
+            if remaining <= 0:
+                raise TimeoutError(f"No model answered {operation} within {now - started:.1f}s")
+
+            can_hedge = hedge_after is not None and next_index < len(models)
+            if can_hedge and now - launched_at >= hedge_after:
+                if verbose:
+                    print(f"{', '.join(pending.values())} slow for {operation}, hedging with {models[next_index]}")
+                pending[self._executor.submit(timed, models[next_index])] = models[next_index]
+                next_index += 1
+                launched_at = now
+                continue
+
+            wait_for = remaining
+            if can_hedge:
+                wait_for = min(wait_for, launched_at + hedge_after - now)
+            if cancelled is not None:
+                wait_for = min(wait_for, CANCEL_POLL_INTERVAL)
+
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if cancelled is not None and cancelled.is_set():
+                raise Exception(f"{operation} cancelled")
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    if verbose:
+                        print(f"Model {model} failed for {operation}: {e}")
+                    errors.append(f"{model}: {e}")
+
+    async def acomplete(self, operation: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Async counterpart of ``complete``; losing hedged requests are cancelled.
+
+        Args:
+            operation: Operation name (search/research/prototype)
+            call: Coroutine function performing the request for a given model
+
+        Returns:
+            The first successful response
+        """
+        route, models = self._candidates(operation)
+        hedge_after = route.get("hedge_after")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + route.get("timeout", 120.0)
+        limit, _ = _call_limits.get()
+        if limit is not None:
+            deadline = min(deadline, loop.time() + limit - time.monotonic())
+
+        async def timed(model):
+            if not self._breaker(model).allow():
+                raise Exception("circuit open")
+            started = time.monotonic()
+            try:
+                result = await call(model)
+            except asyncio.CancelledError:
+                self._breaker(model).release_trial()
+                raise
+            except Exception:
+                self._record(model, started, ok=False)
+                raise
+            self._record(model, started, ok=True)
+            return result
+
+        pending = {}
+        errors = []
+        next_index = 0
+
+        try:
+            while True:
+                if not pending:
+                    if next_index >= len(models):
+                        raise Exception(f"All models failed for {operation}: {'; '.join(errors)}")
+                    pending[asyncio.ensure_future(timed(models[next_index]))] = models[next_index]
+                    next_index += 1
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"No model answered {operation} within {route.get('timeout')}s")
+
+                wait_for = remaining
+                if hedge_after is not None and next_index < len(models):
+                    wait_for = min(remaining, hedge_after)
+
+                done, _ = await asyncio.wait(list(pending), timeout=wait_for,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if next_index < len(models) and wait_for < remaining:
+                        print(f"{', '.join(pending.values())} slow for {operation}, hedging with {models[next_index]}")
+                        pending[asyncio.ensure_future(timed(models[next_index]))] = models[next_index]
+                        next_index += 1
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        print(f"Model {model} failed for {operation}: {e}")
+                        errors.append(f"{model}: {e}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model call counts, failures, p50/p99 latency and circuit state."""
+        with self._lock:
+            models = sorted(set(self.trackers) | set(self.breakers))
+        return {
+            model: {
+                "calls": self._tracker(model).calls,
+                "failures": self._tracker(model).failures,
+                "p50": self._tracker(model).percentile(50),
+                "p99": self._tracker(model).percentile(99),
+                "circuit": self._breaker(model).state,
+            }
+            for model in models
+        }
+
+    def print_stats(self):
+        """Print the per-model routing statistics."""
+        stats = self.stats()
+        if not stats:
+            print("No LLM calls recorded.")
+            return
+        print("\nModel routing statistics:")
+        for model, s in stats.items():
+            p50 = f"{s['p50']:.2f}s" if s['p50'] is not None else "-"
+            p99 = f"{s['p99']:.2f}s" if s['p99'] is not None else "-"
+            print(f"  {model}: {s['calls']} calls, {s['failures']} failed, "
+                  f"p50 {p50}, p99 {p99}, circuit {s['circuit']}")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+LLM Telemetry - Per-call token, latency and cost log with aggregate reports
+
+Every LLM call made by the query engine appends one JSON line to the
+telemetry log (default ~/buckets/r2e_bucket/telemetry/llm_calls.jsonl,
+override with R2E_TELEMETRY_LOG):
+
+    {"timestamp": "...", "experiment": "...", "operation": "search",
+     "model": "...", "latency": 3.2, "prompt_tokens": 5120,
+     "completion_tokens": 410, "retries": 0, "cache_hit": false,
+     "cost": 0.0318, "ok": true}
+
+Usage:
+    python llm_telemetry.py --by operation
+    python llm_telemetry.py --by experiment operation day --since 7
+"""
+
+import os
+import json
+import datetime
+import argparse
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+TELEMETRY_LOG = os.environ.get(
+    "R2E_TELEMETRY_LOG",
+    os.path.expanduser("~/buckets/r2e_bucket/telemetry/llm_calls.jsonl")
+)
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4o-2024-05-13": (5.00, 15.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Estimate the USD cost of a call.
+
+    Args:
+        model: Model name, with or without a provider prefix ("openai/...")
+        prompt_tokens: Prompt tokens used
+        completion_tokens: Completion tokens generated
+
+    Returns:
+        Estimated cost, or None if the model has no known price
+    """
+    prices = MODEL_PRICES.get(model.split("/")[-1])
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+def _usage(response) -> Optional[Dict[str, int]]:
+    """Prompt/completion token counts reported by a chat completion response."""
+    if response is None:
+        return None
+    if isinstance(response, dict):
+        usage = response.get("usage")
+        if not usage:
+            return None
+        return {"prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0)}
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0}
+
+class TelemetryLog:
+    """Append-only JSONL log of LLM calls."""
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = True):
+        """
+        Initialize the telemetry log.
+
+        Args:
+            path: JSONL file to append to (default: TELEMETRY_LOG)
+            enabled: Set False to drop all records
+        """
+        self.path = path or TELEMETRY_LOG
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def record(self, experiment: str, operation: str, model: str, latency: float,
+               request: Optional[Dict[str, Any]] = None, response: Any = None,
+               retries: int = 0, cache_hit: bool = False, error: Optional[str] = None):
+        """
+        Append one call record.
+
+        Token counts come from the response's ``usage`` block; when it is
+        missing they are estimated from the request (~4 characters per token)
+        and the record is marked ``"estimated": true``.
+
+        Args:
+            experiment: Experiment ID the call was made for
+            operation: Engine operation (search/research/prototype/filter)
+            model: Model called
+            latency: Wall time in seconds, including retries
+            request: Chat request sent
+            response: Chat completion response, or None on failure
+            retries: Number of retries (e.g. after 429s)
+            cache_hit: Whether the answer was served from a cache
+            error: Error message if the call failed
+        """
+        if not self.enabled:
+            return
+
+        usage = _usage(response)
+        estimated = usage is None
+        if usage is None:
+            prompt_chars = sum(len(m.get("content") or "") for m in (request or {}).get("messages", []))
+            # Cache hits and failed calls consume no provider tokens
+            charged = not cache_hit and error is None
+            usage = {"prompt_tokens": prompt_chars // 4 if charged else 0, "completion_tokens": 0}
+
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "experiment": experiment,
+            "operation": operation,
+            "model": model,
+            "latency": round(latency, 4),
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "cost": None if cache_hit or error is not None else estimate_cost(model, usage["prompt_tokens"], usage["completion_tokens"]),
+            "ok": error is None,
+        }
+        if estimated:
+            entry["estimated"] = True
+        if error is not None:
+            entry["error"] = error[:300]
+
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # One write per line keeps appends from concurrent processes intact
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Error writing telemetry: {e}")
+
+def load_records(path: Optional[str] = None, since_days: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Read telemetry records, optionally only those from the last ``since_days`` days."""
+    path = path or TELEMETRY_LOG
+    if not os.path.exists(path):
+        return []
+
+    cutoff = None
+    if since_days is not None:
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=since_days)).isoformat(timespec="seconds")
+
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if cutoff and record.get("timestamp", "") < cutoff:
+                continue
+            record["day"] = record.get("timestamp", "")[:10]
+            records.append(record)
+    return records
+
+def aggregate(records: List[Dict[str, Any]], group_by: List[str]) -> List[Dict[str, Any]]:
+    """
+    Aggregate call records.
+
+    Args:
+        records: Records from load_records
+        group_by: Keys to group by (experiment, operation, model, day)
+
+    Returns:
+        One row per group with calls, failures, cache hits, tokens, cost and
+        latency percentiles, sorted by cost (most expensive first)
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[tuple(record.get(key, "") for key in group_by)].append(record)
+
+    rows = []
+    for key, items in groups.items():
+        latencies = sorted(r["latency"] for r in items if r.get("ok") and not r.get("cache_hit"))
+        row = dict(zip(group_by, key))
+        row.update({
+            "calls": len(items),
+            "failed": sum(1 for r in items if not r.get("ok")),
+            "cache_hits": sum(1 for r in items if r.get("cache_hit")),
+            "retries": sum(r.get("retries", 0) for r in items),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in items),
+            "completion_tokens": sum(r.get("completion_tokens", 0) for r in items),
+            "cost": sum(r.get("cost") or 0.0 for r in items),
+            "p50": latencies[len(latencies) // 2] if latencies else None,
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        })
+        rows.append(row)
+
+    rows.sort(key=lambda r: r["cost"], reverse=True)
+    return rows
+
+def print_report(group_by: List[str], path: Optional[str] = None, since_days: Optional[float] = None):
+    """Print the aggregate telemetry report."""
+    records = load_records(path, since_days)
+    if not records:
+        print(f"No telemetry recorded yet in {path or TELEMETRY_LOG}")
+        return
+
+    rows = aggregate(records, group_by)
+    header = group_by + ["calls", "failed", "cache", "retries", "prompt_tok", "compl_tok", "cost_usd", "p50_s", "p95_s"]
+    table = [header]
+    for row in rows:
+        table.append([str(row[k]) for k in group_by] + [
+            str(row["calls"]), str(row["failed"]), str(row["cache_hits"]), str(row["retries"]),
+            str(row["prompt_tokens"]), str(row["completion_tokens"]), f"{row['cost']:.4f}",
+            f"{row['p50']:.2f}" if row["p50"] is not None else "-",
+            f"{row['p95']:.2f}" if row["p95"] is not None else "-",
+        ])
+
+    widths = [max(len(r[i]) for r in table) for i in range(len(header))]
+    for i, r in enumerate(table):
+        print("  ".join(cell.ljust(widths[j]) for j, cell in enumerate(r)))
+        if i == 0:
+            print("  ".join("-" * w for w in widths))
+
+    total_cost = sum(row["cost"] for row in rows)
+    print(f"\n{len(records)} calls, estimated total cost ${total_cost:.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate report of LLM call telemetry")
+    parser.add_argument("--by", nargs="+", default=["experiment", "operation", "day"],
+                        choices=["experiment", "operation", "model", "day"], help="Group-by keys")
+    parser.add_argument("--since", type=float, help="Only include calls from the last N days")
+    parser.add_argument("--log", type=str, help="Telemetry log path")
+
+    args = parser.parse_args()
+    print_report(args.by, args.log, args.since)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,9 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import argparse
+import threading
 import importlib.util
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Union, Callable
 
 # Base directory
@@ -25,15 +27,17 @@ from r2e_query_engine import R2EQueryEngine
 class LOTUSBridge:
     """Bridge between R2E Query Engine and LOTUS semantic operators."""
     
-    def __init__(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False):
+    def __init__(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False,
+                 engine: Optional[R2EQueryEngine] = None):
         """Initialize the LOTUS Bridge.
         
         Args:
             exp_id: The experiment ID used in R2E
             api_key: Optional API key for LLM services
             use_openrouter: Whether to use OpenRouter API
+            engine: Already loaded R2EQueryEngine for the experiment (skips loading the data again)
         """
-        self.r2e_engine = R2EQueryEngine(exp_id, api_key, use_openrouter)
+        self.r2e_engine = engine or R2EQueryEngine(exp_id, api_key, use_openrouter)
         self.lotus_available = self._check_lotus_available()
         
         if self.lotus_available:
@@ -47,7 +51,8 @@ class LOTUSBridge:
                 self.lotus.settings.configure(lm=lm)
         
         # Load R2E data
-        self.r2e_engine.load_data()
+        if engine is None:
+            self.r2e_engine.load_data()
     
     def _check_lotus_available(self) -> bool:
         """Check if LOTUS library is available."""
@@ -68,16 +73,44 @@ class LOTUSBridge:
         """
         return self.r2e_engine.semantic_search(query)
     
-    def sem_filter(self, df: pd.DataFrame, filter_query: str) -> pd.DataFrame:
+    def scan(self, columns: Optional[List[str]] = None, repo: Optional[Union[str, List[str]]] = None,
+             path_prefix: Optional[str] = None) -> pd.DataFrame:
+        """Get every function of the experiment without an LLM call.
+        
+        Args:
+            columns: Columns to include (default: all)
+            repo: Only functions from this repository (or these repositories)
+            path_prefix: Only functions whose file path starts with this prefix
+            
+        Returns:
+            DataFrame of functions
+        """
+        return self.r2e_engine.scan(columns, repo, path_prefix)
+    
+    def sem_filter(self, df: pd.DataFrame, filter_query: str, cascade: bool = False,
+                   target_precision: float = 0.9) -> pd.DataFrame:
         """Apply semantic filtering using LOTUS if available.
         
+        In cascade mode a local proxy score decides the clear cases and only the
+        uncertain rows are sent to the LLM in batched prompts (filter_cascade.py).
+        
         Args:
             df: DataFrame to filter
             filter_query: Natural language filter query
+            cascade: Use the proxy + LLM verification cascade (needs an API key)
+            target_precision: Precision of the rows the proxy accepts or rejects (cascade only)
             
         Returns:
             Filtered DataFrame
         """
+        if cascade and self.r2e_engine.api_key:
+            from filter_cascade import FilterCascade
+            
+            runner = FilterCascade(self.r2e_engine, target_precision)
+            filtered = runner.run(df, filter_query)
+            runner.print_stats()
+            return filtered
+        
         if not self.lotus_available:
             print("LOTUS not available. Using basic keyword matching instead.")
             # Fall back to basic filtering
@@ -92,54 +125,42 @@ class LOTUSBridge:
         # Use LOTUS semantic filtering
         return df.sem_filter(filter_query)
     
-    def sem_join(self, df1: pd.DataFrame, df2: pd.DataFrame, join_query: str) -> pd.DataFrame:
+    def sem_join(self, df1: pd.DataFrame, df2: pd.DataFrame, join_query: str,
+                 k: int = 10, threshold: float = 0.5) -> pd.DataFrame:
         """Perform semantic join between two DataFrames.
         
+        Without LOTUS, rows are joined on the Jaccard similarity of the words in
+        their function name and code (similarity_join.py): each df1 row keeps its
+        top ``k`` df2 rows with a similarity above ``threshold``.
+        
         Args:
             df1: First DataFrame
             df2: Second DataFrame
             join_query: Natural language join condition
+            k: Matches kept per df1 row (fallback join only)
+            threshold: Minimum similarity (fallback join only)
             
         Returns:
             Joined DataFrame
         """
         if not self.lotus_available:
-            print("LOTUS not available. Using basic cross join instead.")
-            # Fall back to basic cross join with similarity scoring
-            result = []
+            print("LOTUS not available. Using top-k similarity join instead.")
+            from similarity_join import jaccard_topk_join
             
-            for _, row1 in df1.iterrows():
-                for _, row2 in df2.iterrows():
-                    # Compute a simple similarity score
-                    score = self._compute_similarity(row1, row2)
-                    if score > 0.5:  # Arbitrary threshold
-                        combined = {**row1.to_dict(), **{f"df2_{k}": v for k, v in row2.to_dict().items()}}
-                        combined['similarity'] = score
-                        result.append(combined)
+            def texts(df):
+                code = df["code"].fillna("") if "code" in df.columns else ""
+                return (df["function_name"].fillna("").astype(str) + " " + code).tolist()
             
-            return pd.DataFrame(result)
+            pairs = jaccard_topk_join(texts(df1), texts(df2), k=k, threshold=threshold)
+            left = df1.iloc[pairs["left"]].reset_index(drop=True)
+            right = df2.iloc[pairs["right"]].reset_index(drop=True).add_prefix("df2_")
+            result = pd.concat([left, right], axis=1)
+            result["similarity"] = pairs["similarity"]
+            return result
         
         # Use LOTUS semantic join
         return df1.sem_join(df2, join_query)
     
-    def _compute_similarity(self, row1, row2) -> float:
-        """Compute simple similarity between two rows."""
-        # Extract text to compare
-        text1 = f"{row1['function_name']} {row1.get('code', '')}"
-        text2 = f"{row2['function_name']} {row2.get('code', '')}"
-        
-        # Simple word overlap similarity
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        if not words1 or not words2:
-            return 0.0
-            
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
-    
     def generate_research(self, df: pd.DataFrame, research_query: str) -> List[Dict[str, Any]]:
         """Generate research trajectories from function data.
         
@@ -152,7 +173,8 @@ class LOTUSBridge:
         """
         return self.r2e_engine.generate_research_trajectories(research_query)
     
-    def get_available_experiments(self) -> List[str]:
+    @staticmethod
+    def get_available_experiments() -> List[str]:
         """Get list of available R2E experiments."""
         bucket_path = os.path.expanduser("~/buckets/r2e_bucket")
         extracted_data_dir = os.path.join(bucket_path, "extracted_data")
@@ -163,9 +185,50 @@ class LOTUSBridge:
         files = [f for f in os.listdir(extracted_data_dir) if f.endswith("_extracted.json")]
         return [f.replace("_extracted.json", "") for f in files]
 
-def generate_lotus_documentation(exp_id, api_key=None, use_openrouter=False):
-    """Generate documentation using LOTUS semantic capabilities."""
-    bridge = LOTUSBridge(exp_id, api_key, use_openrouter)
+# Bridges kept for the web UI, most recently used last
+MAX_CACHED_BRIDGES = 8
+_bridges: "OrderedDict[tuple, LOTUSBridge]" = OrderedDict()
+_bridges_lock = threading.Lock()
+
+def get_bridge(exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False) -> LOTUSBridge:
+    """Get a loaded bridge for an experiment and provider, reusing it across calls.
+    
+    Bridges are keyed by (experiment, provider, API key), so users with different
+    keys never share a client. Their engines come from the process engine registry,
+    which loads each experiment once (also under concurrent first requests), shares
+    its catalog across keys and evicts experiments beyond R2E_MEMORY_BUDGET_MB.
+    A bridge whose engine was evicted or reloaded is rebuilt; beyond
+    MAX_CACHED_BRIDGES the least recently used bridge is dropped.
+    
+    Args:
+        exp_id: The experiment ID used in R2E
+        api_key: Optional API key for LLM services
+        use_openrouter: Whether to use OpenRouter API
+        
+    Returns:
+        LOTUSBridge with data loaded
+    """
+    from engine_registry import get_registry
+
+    registry = get_registry()
+    engine = registry.get(exp_id, api_key or None, use_openrouter)
+    key = (exp_id, "openrouter" if use_openrouter else "openai", api_key or "")
+    with _bridges_lock:
+        bridge = _bridges.get(key)
+        if bridge is None or bridge.r2e_engine is not engine:
+            bridge = LOTUSBridge(exp_id, api_key, use_openrouter, engine=engine)
+            _bridges[key] = bridge
+        _bridges.move_to_end(key)
+        # Drop bridges holding engines the registry no longer keeps resident
+        for stale in [k for k, b in _bridges.items() if not registry.holds(b.r2e_engine)]:
+            del _bridges[stale]
+        while len(_bridges) > MAX_CACHED_BRIDGES:
+            _bridges.popitem(last=False)
+    return bridge
+
+def generate_lotus_documentation(exp_id, api_key=None, use_openrouter=False, bridge=None):
+    """Generate documentation using LOTUS semantic capabilities (reusing a loaded bridge if given)."""
+    bridge = bridge or LOTUSBridge(exp_id, api_key, use_openrouter)
     
     # Directory for documentation
     docs_dir = os.path.join(BASE_DIR, "lotus_docs")
@@ -177,7 +240,7 @@ def generate_lotus_documentation(exp_id, api_key=None, use_openrouter=False):
     
     # Get all functions from the experiment - use direct file access as fallback
     try:
-        all_functions = bridge.search("")
+        all_functions = bridge.scan(["function_name", "repo_name", "file_path", "code"])
     except Exception as e:
         print(f"Error using search API: {e}")
         print("Trying direct file access...")
@@ -314,8 +377,25 @@ def generate_lotus_documentation(exp_id, api_key=None, use_openrouter=False):
     print(f"Documentation generated: {md_file}")
     return md_file
 
-def start_web_ui():
-    """Start a simple web UI for LOTUS Bridge."""
+def _display_table(results: pd.DataFrame) -> pd.DataFrame:
+    """Metadata-only view of results for the UI; code is fetched when a row is selected."""
+    if results.empty:
+        return pd.DataFrame(columns=["function_name", "repo_name", "file_path", "relevance"])
+    table = results[["function_name", "repo_name", "file_path"]].copy()
+    # LLM results carry relevance_score, keyword results relevance
+    for column in ("relevance_score", "relevance"):
+        if column in results.columns:
+            table["relevance"] = results[column].values
+            break
+    return table.reset_index(drop=True)
+
+def start_web_ui(concurrency: int = 4, max_queue: int = 64):
+    """Start a simple web UI for LOTUS Bridge.
+    
+    Args:
+        concurrency: LLM-backed requests (search, filter, research) served at once
+        max_queue: Requests allowed to wait in the queue before new ones are rejected
+    """
     try:
         import gradio as gr
     except ImportError:
@@ -325,8 +405,7 @@ def start_web_ui():
         import gradio as gr
 
     # Get available experiments
-    bridge = LOTUSBridge("quickstart")  # Temporary instance to access methods
-    experiments = bridge.get_available_experiments()
+    experiments = LOTUSBridge.get_available_experiments()
     
     if not experiments:
         print("No experiments found. Please extract functions from repositories first.")
@@ -350,12 +429,17 @@ def start_web_ui():
             with gr.TabItem("Semantic Search"):
                 search_query = gr.Textbox(label="Search Query")
                 search_button = gr.Button("Search")
-                search_results = gr.Dataframe(label="Search Results")
+                search_results = gr.Dataframe(label="Search Results (select a row to view its code)", interactive=False)
+                search_code = gr.Code(label="Code", language="python")
+                search_ids = gr.State([])
                 
             with gr.TabItem("Semantic Filter"):
                 filter_query = gr.Textbox(label="Filter Query")
+                filter_use_cascade = gr.Checkbox(label="Cascade: proxy scoring, LLM only for uncertain rows", value=True)
                 filter_button = gr.Button("Apply Filter")
-                filter_results = gr.Dataframe(label="Filtered Results")
+                filter_results = gr.Dataframe(label="Filtered Results (select a row to view its code)", interactive=False)
+                filter_code = gr.Code(label="Code", language="python")
+                filter_ids = gr.State([])
                 
             with gr.TabItem("Research Generation"):
                 research_query = gr.Textbox(label="Research Question")
@@ -386,22 +470,26 @@ def start_web_ui():
                 
         # Define functionality
         def initialize_bridge(exp_id, api_key, use_openrouter):
-            bridge = LOTUSBridge(exp_id, api_key, use_openrouter)
-            return bridge
+            return get_bridge(exp_id, api_key or None, use_openrouter)
         
         def perform_search(exp_id, api_key, use_openrouter, query):
             bridge = initialize_bridge(exp_id, api_key, use_openrouter)
             results = bridge.search(query)
-            # Select relevant columns for display
-            display_cols = ["function_name", "repo_name", "relevance", "code"]
-            return results[display_cols] if not results.empty else pd.DataFrame()
+            # Only metadata goes to the browser; row positions pick the code on selection
+            return _display_table(results), list(results["function_id"]) if not results.empty else [], ""
         
-        def perform_filter(exp_id, api_key, use_openrouter, filter_text):
+        def perform_filter(exp_id, api_key, use_openrouter, filter_text, cascade):
             bridge = initialize_bridge(exp_id, api_key, use_openrouter)
-            results = bridge.search("")  # Get all functions
-            filtered = bridge.sem_filter(results, filter_text)
-            display_cols = ["function_name", "repo_name", "code"]
-            return filtered[display_cols] if not filtered.empty else pd.DataFrame()
+            results = bridge.scan(["function_id", "function_name", "repo_name", "file_path", "code"])
+            filtered = bridge.sem_filter(results, filter_text, cascade=cascade)
+            return _display_table(filtered), list(filtered["function_id"]) if not filtered.empty else [], ""
+        
+        def show_code(exp_id, api_key, use_openrouter, function_ids, evt: gr.SelectData):
+            row = evt.index[0] if isinstance(evt.index, (list, tuple)) else evt.index
+            if row is None or row >= len(function_ids):
+                return ""
+            bridge = initialize_bridge(exp_id, api_key, use_openrouter)
+            return bridge.r2e_engine.functions_df["code"].iat[int(function_ids[row])]
         
         def generate_research_trajectories(exp_id, api_key, use_openrouter, question):
             bridge = initialize_bridge(exp_id, api_key, use_openrouter)
@@ -410,7 +498,8 @@ def start_web_ui():
             
         def generate_documentation_for_exp(exp_id, api_key, use_openrouter):
             try:
-                doc_file = generate_lotus_documentation(exp_id, api_key, use_openrouter)
+                doc_file = generate_lotus_documentation(exp_id, api_key, use_openrouter,
+                                                        initialize_bridge(exp_id, api_key, use_openrouter))
                 if doc_file:
                     output = f"Documentation generated successfully.\n\nMarkdown: {doc_file}\n"
                     html_file = doc_file.replace(".md", ".html")
@@ -431,7 +520,8 @@ def start_web_ui():
             for exp_id in experiments:
                 output += f"• Processing {exp_id}...\n"
                 try:
-                    doc_file = generate_lotus_documentation(exp_id, api_key, use_openrouter)
+                    doc_file = generate_lotus_documentation(exp_id, api_key, use_openrouter,
+                                                            initialize_bridge(exp_id, api_key, use_openrouter))
                     if doc_file:
                         output += f"  ✓ Success: {doc_file}\n"
                         html_file = doc_file.replace(".md", ".html")
@@ -446,39 +536,65 @@ def start_web_ui():
             output += "\nDocumentation generation completed."
             return output, progress_html
             
-        # Connect UI elements
+        # Connect UI elements; LLM-backed handlers share one concurrency limit
         search_button.click(
             perform_search,
             inputs=[experiment, api_key, use_openrouter, search_query],
-            outputs=search_results
+            outputs=[search_results, search_ids, search_code],
+            concurrency_limit=concurrency,
+            concurrency_id="llm"
         )
         
         filter_button.click(
             perform_filter,
-            inputs=[experiment, api_key, use_openrouter, filter_query],
-            outputs=filter_results
+            inputs=[experiment, api_key, use_openrouter, filter_query, filter_use_cascade],
+            outputs=[filter_results, filter_ids, filter_code],
+            concurrency_limit=concurrency,
+            concurrency_id="llm"
         )
         
         research_button.click(
             generate_research_trajectories,
             inputs=[experiment, api_key, use_openrouter, research_query],
-            outputs=research_results
+            outputs=research_results,
+            concurrency_limit=concurrency,
+            concurrency_id="llm"
+        )
+        
+        # Code lookups only read the loaded catalog, so they are not limited
+        search_results.select(
+            show_code,
+            inputs=[experiment, api_key, use_openrouter, search_ids],
+            outputs=search_code,
+            concurrency_limit=None
+        )
+        
+        filter_results.select(
+            show_code,
+            inputs=[experiment, api_key, use_openrouter, filter_ids],
+            outputs=filter_code,
+            concurrency_limit=None
         )
         
-        # Documentation buttons
+        # Documentation buttons: one generation at a time
         generate_doc_button.click(
             generate_documentation_for_exp,
             inputs=[doc_experiment, api_key, use_openrouter],
-            outputs=[doc_output, doc_progress]
+            outputs=[doc_output, doc_progress],
+            concurrency_limit=1,
+            concurrency_id="docs"
         )
         
         generate_all_button.click(
             generate_all_documentation,
             inputs=[api_key, use_openrouter],
-            outputs=[doc_output, doc_progress]
+            outputs=[doc_output, doc_progress],
+            concurrency_limit=1,
+            concurrency_id="docs"
         )
     
-    # Launch the UI
+    # Launch the UI with a bounded request queue
+    ui.queue(max_size=max_queue)
     ui.launch(share=False)
 
 def main():
@@ -503,8 +619,7 @@ def main():
     
     # Get available experiments
     if args.all_experiments:
-        bridge = LOTUSBridge("quickstart")  # Temporary instance to access methods
-        experiments = bridge.get_available_experiments()
+        experiments = LOTUSBridge.get_available_experiments()
         if not experiments:
             print("No experiments found. Please extract functions from repositories first.")
             return
@@ -16,6 +16,11 @@ from pathlib import Path
 # Base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from query_server import get_server
+
 def print_color(text, color="blue"):
     """Print colored text to the terminal."""
     colors = {
@@ -66,93 +71,146 @@ def add_repository(repo_url, exp_id):
         print(e.stderr)
         return False
 
+def get_engine(exp_id):
+    """
+    Query engine for an experiment from the session's engine registry.
+
+    Engines are loaded once and reused; R2E_MEMORY_BUDGET_MB bounds how many stay resident.
+    
+    Returns:
+        R2EQueryEngine with data loaded, or None if loading failed
+    """
+    from engine_registry import get_registry
+
+    try:
+        return get_registry().get(exp_id)
+    except Exception as e:
+        print_color(f"Error: {e}", "red")
+        return None
+
 def search_repository(exp_id, query, arxiv_url=None, show_code=False):
     """Search within a repository using the R2E Query Engine."""
-    script_path = os.path.join(BASE_DIR, "r2e_query_engine.py")
-    
-    if not os.path.exists(script_path):
-        print_color(f"Error: r2e_query_engine.py not found at {script_path}", "red")
-        return False
-    
-    cmd = [sys.executable, script_path, "--exp_id", exp_id, "--query", query, "--document"]
+    server = get_server()
+    if server is not None:
+        print_color(f"Searching in experiment '{exp_id}' for: {query} (query server)", "blue")
+        try:
+            results = server.search(exp_id, query, arxiv_url=arxiv_url, document=True)
+        except Exception as e:
+            print_color(f"Error during search: {e}", "red")
+            return False
+        from r2e_query_engine import print_search_results
+        print_search_results(results, show_code)
+        return True
     
-    if show_code:
-        cmd.append("--show-code")
-        
+    print_color(f"Searching in experiment '{exp_id}' for: {query}", "blue")
     if arxiv_url:
-        cmd.extend(["--arxiv", arxiv_url])
+        print_color(f"Using arXiv paper as context: {arxiv_url}", "blue")
+        from arxiv_cache import get_arxiv_cache
+        get_arxiv_cache().prefetch(arxiv_url)
+    
+    engine = get_engine(exp_id)
+    if engine is None:
+        return False
     
     try:
-        print_color(f"Searching in experiment '{exp_id}' for: {query}", "blue")
-        if arxiv_url:
-            print_color(f"Using arXiv paper as context: {arxiv_url}", "blue")
-            
-        subprocess.run(cmd, check=True)
+        from r2e_query_engine import print_search_results
+        results = engine.semantic_search(query, arxiv_url=arxiv_url)
+        print_search_results(results, show_code)
+        if len(results) > 0:
+            from living_doc import LivingDoc
+            doc = LivingDoc()
+            doc.document_query(exp_id, query, results, arxiv_url=arxiv_url)
+            doc.generate_html()
+            print("\nAdded search results to living documentation.")
         return True
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print_color(f"Error during search: {e}", "red")
         return False
 
 def generate_research(exp_id, research_query, arxiv_url=None):
     """Generate research trajectories based on a query."""
-    script_path = os.path.join(BASE_DIR, "r2e_query_engine.py")
-    
-    if not os.path.exists(script_path):
-        print_color(f"Error: r2e_query_engine.py not found at {script_path}", "red")
-        return False
-    
-    cmd = [sys.executable, script_path, "--exp_id", exp_id, "--research", research_query, "--document"]
+    server = get_server()
+    if server is not None and not arxiv_url:
+        print_color(f"Generating research trajectories in '{exp_id}' for: {research_query} (query server)", "blue")
+        try:
+            trajectories = server.research(exp_id, research_query, document=True)
+        except Exception as e:
+            print_color(f"Error generating research: {e}", "red")
+            return False
+        if not trajectories:
+            print("Failed to generate research trajectories.")
+            return False
+        from r2e_query_engine import print_trajectories
+        print_trajectories(trajectories)
+        return True
     
+    print_color(f"Generating research trajectories in '{exp_id}' for: {research_query}", "blue")
     if arxiv_url:
-        cmd.extend(["--arxiv", arxiv_url])
+        print_color(f"Using arXiv paper as context: {arxiv_url}", "blue")
+    
+    engine = get_engine(exp_id)
+    if engine is None:
+        return False
     
     try:
-        print_color(f"Generating research trajectories in '{exp_id}' for: {research_query}", "blue")
-        if arxiv_url:
-            print_color(f"Using arXiv paper as context: {arxiv_url}", "blue")
-            
-        subprocess.run(cmd, check=True)
+        from r2e_query_engine import print_trajectories
+        trajectories = engine.generate_research_trajectories(research_query)
+        if not trajectories:
+            print("Failed to generate research trajectories.")
+            return False
+        print_trajectories(trajectories)
+        
+        import pandas as pd
+        from living_doc import LivingDoc
+        doc = LivingDoc()
+        doc.document_query(exp_id, research_query, pd.DataFrame(), trajectories, arxiv_url=arxiv_url)
+        doc.generate_html()
+        print("\nAdded research trajectories to living documentation.")
         return True
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print_color(f"Error generating research: {e}", "red")
         return False
 
 def start_lotus_ui():
     """Start the LOTUS Bridge UI for interactive exploration."""
-    script_path = os.path.join(BASE_DIR, "lotus_bridge.py")
-    
-    if not os.path.exists(script_path):
-        print_color(f"Error: lotus_bridge.py not found at {script_path}", "red")
-        return False
-    
     try:
         print_color("Starting LOTUS Bridge UI...", "blue")
-        subprocess.run([sys.executable, script_path, "--ui"], check=True)
+        from lotus_bridge import start_web_ui
+        start_web_ui()
         return True
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print_color(f"Error starting UI: {e}", "red")
         return False
 
 def generate_documentation(exp_id=None):
     """Generate documentation for one or all experiments."""
-    script_path = os.path.join(BASE_DIR, "generate_docs.py")
-    
-    if not os.path.exists(script_path):
-        # Try living_doc.py as fallback
-        script_path = os.path.join(BASE_DIR, "living_doc.py")
-        if not os.path.exists(script_path):
-            print_color("Error: No documentation generator found", "red")
+    server = get_server() if exp_id else None
+    if server is not None:
+        print_color(f"Generating documentation for experiment '{exp_id}' (query server)...", "blue")
+        try:
+            print(f"Documentation generated: {server.docs(exp_id)}")
+            return True
+        except Exception as e:
+            print_color(f"Error generating documentation: {e}", "red")
             return False
     
     try:
+        import generate_docs
+        from engine_registry import get_registry
+
+        registry = get_registry()
+        # Reuse catalogs already loaded in this session; others are loaded and dropped by generate_docs
+        def resident_catalog(exp):
+            return registry.get(exp).functions_df if exp in registry else None
+
         if exp_id:
             print_color(f"Generating documentation for experiment '{exp_id}'...", "blue")
-            subprocess.run([sys.executable, script_path, "--exp_id", exp_id], check=True)
-        else:
-            print_color("Generating documentation for all experiments...", "blue")
-            subprocess.run([sys.executable, script_path, "--generate_html"], check=True)
+            return generate_docs.generate_documentation(exp_id, resident_catalog(exp_id)) is not None
+        print_color("Generating documentation for all experiments...", "blue")
+        for exp in generate_docs.get_available_experiments():
+            generate_docs.generate_documentation(exp, resident_catalog(exp))
         return True
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print_color(f"Error generating documentation: {e}", "red")
         return False
 
@@ -220,6 +278,9 @@ def interactive_mode():
             repo_url = parts[1]
             exp_id = parts[2]
             if add_repository(repo_url, exp_id):
+                # Re-extracted data must be loaded again
+                from engine_registry import get_registry
+                get_registry().evict(exp_id)
                 experiments = list_experiments()
                 current_exp = exp_id
                 
@@ -311,6 +372,14 @@ def main():
     search_parser.add_argument("--arxiv", help="arXiv paper URL to include as context")
     search_parser.add_argument("--show-code", action="store_true", help="Show full code in results")
     
+    # Search-all command
+    search_all_parser = subparsers.add_parser("search-all", help="Search all experiments in parallel worker processes")
+    search_all_parser.add_argument("query", help="Search query")
+    search_all_parser.add_argument("--experiments", nargs="*", help="Specific experiment IDs to search")
+    search_all_parser.add_argument("--show-code", action="store_true", help="Show full code in results")
+    search_all_parser.add_argument("--visualize", action="store_true", help="Generate relationship graphs")
+    search_all_parser.add_argument("--llm", action="store_true", help="Use LLM semantic search instead of keyword search")
+    
     # Research command
     research_parser = subparsers.add_parser("research", help="Generate research trajectories")
     research_parser.add_argument("exp_id", help="Experiment ID to use")
@@ -324,6 +393,24 @@ def main():
     docs_parser = subparsers.add_parser("docs", help="Generate documentation")
     docs_parser.add_argument("exp_id", nargs="?", help="Experiment ID (optional, generates for all if not specified)")
     
+    # Clone detection command
+    clones_parser = subparsers.add_parser("clones", help="Find near-duplicate functions across experiments")
+    clones_parser.add_argument("--experiments", nargs="*", help="Experiments to compare (default: all)")
+    clones_parser.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated Jaccard similarity")
+    clones_parser.add_argument("--cross-repo", action="store_true", help="Only report clusters spanning several repositories")
+    
+    # Telemetry report command
+    telemetry_parser = subparsers.add_parser("telemetry", help="Report LLM token, latency and cost telemetry")
+    telemetry_parser.add_argument("--by", nargs="+", default=["experiment", "operation", "day"],
+                                  choices=["experiment", "operation", "model", "day"], help="Group-by keys")
+    telemetry_parser.add_argument("--since", type=float, help="Only include calls from the last N days")
+    
+    # Query server command
+    serve_parser = subparsers.add_parser("serve", help="Run the query server that keeps experiments resident")
+    serve_parser.add_argument("--port", type=int, default=8950, help="Port to bind")
+    serve_parser.add_argument("--memory-budget", type=float, default=2048, help="Process memory (RSS) budget (MB)")
+    serve_parser.add_argument("--preload", nargs="*", help="Experiments to load at start-up")
+    
     # Interactive mode command
     interactive_parser = subparsers.add_parser("interactive", help="Start interactive mode")
     
@@ -344,6 +431,10 @@ def main():
     elif args.command == "search":
         search_repository(args.exp_id, args.query, args.arxiv, args.show_code)
         
+    elif args.command == "search-all":
+        from search_all import search_all
+        search_all(args.query, args.experiments, args.show_code, args.visualize, args.llm)
+        
     elif args.command == "research":
         generate_research(args.exp_id, args.query, args.arxiv)
         
@@ -353,6 +444,20 @@ def main():
     elif args.command == "docs":
         generate_documentation(args.exp_id)
         
+    elif args.command == "clones":
+        from clone_index import find_clones, print_clones
+        from generate_docs import get_available_experiments
+        experiments = args.experiments or get_available_experiments()
+        print_clones(find_clones(experiments, args.threshold, args.cross_repo))
+        
+    elif args.command == "telemetry":
+        from llm_telemetry import print_report
+        print_report(args.by, since_days=args.since)
+        
+    elif args.command == "serve":
+        from query_server import serve
+        serve(port=args.port, memory_budget_mb=args.memory_budget, preload=args.preload)
+        
     elif args.command == "interactive":
         interactive_mode()
 
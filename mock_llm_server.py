@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Mock LLM Server - Deterministic local chat-completions endpoint
+
+Speaks the subset of the OpenAI chat-completions protocol used by
+OpenRouterClient and the OpenAI SDK (POST /chat/completions and
+/v1/chat/completions, optionally streamed as server-sent events), so the
+engine's hot paths can be benchmarked and regression-tested offline. The
+files and batches endpoints used by batch_runner --provider-batch are
+supported too; a batch completes as soon as it is created.
+
+Answers are derived from the prompt: search requests return functions
+listed in the prompt ranked by word overlap with the query, research
+requests return trajectories built from the listed components, filter
+requests match functions whose name shares a word with the condition,
+prototype requests return a small Python module. Latency, errors and
+429s are drawn from a random generator seeded per request, so the same
+request sequence always sees the same behaviour.
+
+Usage:
+    python mock_llm_server.py --port 8911 --latency lognormal:0.8,0.5 --error-rate 0.02 --rate-limit-rate 0.05
+
+    export OPENAI_BASE_URL=http://127.0.0.1:8911/v1
+    export OPENROUTER_BASE_URL=http://127.0.0.1:8911/v1
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution spec into a sampling function.
+
+    Supported specs (seconds):
+        fixed:0.5            always 0.5
+        uniform:0.2,1.0      uniform between 0.2 and 1.0
+        exp:0.5              exponential with mean 0.5
+        lognormal:0.8,0.5    lognormal with median 0.8 and sigma 0.5
+
+    Args:
+        spec: Distribution spec
+
+    Returns:
+        Function taking a random.Random and returning a latency in seconds
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    if kind == "lognormal":
+        import math
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+def _search_answer(prompt: str) -> Dict[str, Any]:
+    """Rank the functions listed in a search prompt by word overlap with the query."""
+    query = re.search(r"QUERY: (.*)", prompt)
+    query_words = _words(query.group(1)) if query else set()
+    limit = re.search(r"identify the (\d+) most relevant", prompt)
+    limit = int(limit.group(1)) if limit else 10
+
+    candidates = []
+    repo = ""
+    for line in prompt.splitlines():
+        repo_match = re.match(r"=== Repository: (.*) ===", line)
+        if repo_match:
+            repo = repo_match.group(1)
+        elif line.startswith("Function: "):
+            name = line[len("Function: "):].strip()
+            overlap = len(query_words & _words(name.replace("_", " ")))
+            candidates.append((overlap, name, repo))
+
+    # Stable ranking: overlap first, then listing order
+    ranked = sorted(enumerate(candidates), key=lambda item: (-item[1][0], item[0]))[:limit]
+    return {"results": [
+        {
+            "function_name": name,
+            "repo_name": repo,
+            "relevance_score": min(10, 5 + 2 * overlap),
+            "explanation": f"Name shares {overlap} word(s) with the query."
+        }
+        for _, (overlap, name, repo) in ranked
+    ]}
+
+def _research_answer(prompt: str) -> Dict[str, Any]:
+    """Build trajectories from the components listed in a research prompt."""
+    question = re.search(r"RESEARCH QUESTION: (.*)", prompt)
+    question = question.group(1).strip() if question else "the question"
+    count = re.search(r"suggest (\d+) potential research", prompt)
+    count = int(count.group(1)) if count else 3
+    components = list(dict.fromkeys(re.findall(r'"name": ?"([^"]+)"', prompt))) or ["main"]
+
+    return {"trajectories": [
+        {
+            "title": f"Direction {i + 1} for {question}",
+            "core_question": f"How can {components[i % len(components)]} be extended for {question}?",
+            "rationale": "Generated by the mock LLM server.",
+            "existing_components": components[i:i + 3] or components[:1],
+            "new_components": [f"component_{i + 1}"],
+            "challenges": ["Mock challenge"],
+            "evaluation": "Mock evaluation"
+        }
+        for i in range(count)
+    ]}
+
+def _filter_answer(prompt: str) -> Dict[str, Any]:
+    """Match each function of a filter prompt whose name shares a word with the condition."""
+    condition = re.search(r"CONDITION: (.*)", prompt)
+    condition_words = {w for w in _words(condition.group(1)) if len(w) > 2} if condition else set()
+    results = []
+    for match in re.finditer(r"### id: (\d+)\nFunction: (\S+)", prompt):
+        name_words = _words(match.group(2).replace("_", " "))
+        results.append({"id": int(match.group(1)), "match": bool(condition_words & name_words)})
+    return {"results": results}
+
+def _prototype_answer(prompt: str) -> str:
+    """Return a small deterministic Python module."""
+    title = re.search(r'"title": ?"([^"]+)"', prompt)
+    title = title.group(1) if title else "prototype"
+    return (
+        f'"""Prototype: {title}"""\n\n'
+        "def main():\n"
+        f"    print({title!r})\n\n"
+        'if __name__ == "__main__":\n'
+        "    main()\n"
+    )
+
+def completion_body(completion_id: str, request: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Chat completion response for ``request`` answered with ``content``."""
+    prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                  "total_tokens": prompt_tokens + len(content) // 4},
+    }
+
+def mock_completion(request: Dict[str, Any]) -> str:
+    """Content the mock model answers a chat request with."""
+    messages = request.get("messages", [])
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system").lower()
+    prompt = "\n".join(m.get("content", "") for m in messages if m.get("role") != "system")
+
+    if "prototype" in system:
+        return _prototype_answer(prompt)
+    if "research" in system:
+        answer = _research_answer(prompt)
+    elif "filter" in system:
+        answer = _filter_answer(prompt)
+    else:
+        answer = _search_answer(prompt)
+    return json.dumps(answer)
+
+class MockLLMServer:
+    """Threaded HTTP server answering chat completions with injected latency and faults."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8911, latency: str = "fixed:0.05",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: int = 0, chunk_size: int = 40):
+        """
+        Initialize the mock server.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Latency distribution spec (see parse_latency)
+            error_rate: Fraction of requests answered with HTTP 500
+            rate_limit_rate: Fraction of requests answered with HTTP 429
+            retry_after: Retry-After seconds sent with 429 responses
+            seed: Seed for latency and fault injection
+            chunk_size: Characters per chunk when streaming
+        """
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as OPENAI_BASE_URL / OPENROUTER_BASE_URL."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _draw(self) -> Tuple[float, Optional[int]]:
+        """Latency and injected status (None = success) for the next request."""
+        with self._lock:
+            self._counter += 1
+            self.counts["requests"] += 1
+            rng = random.Random(f"{self.seed}:{self._counter}")
+            latency = max(0.0, self.latency(rng))
+            roll = rng.random()
+            if roll < self.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return latency * 0.1, 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return latency, 500
+            return latency, None
+
+    def _add_file(self, data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        with self._lock:
+            file_id = f"file-mock{len(self.files) + 1}"
+            self.files[file_id] = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                                   "filename": filename, "purpose": purpose, "status": "processed", "data": data}
+        return self.files[file_id]
+
+    def _run_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        """Answer every request of a batch input file at once (no latency or fault injection)."""
+        outputs = []
+        for line in self.files[input_file_id]["data"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            body = completion_body("mock-" + hashlib.sha1(line.encode("utf-8")).hexdigest()[:12],
+                                   entry["body"], mock_completion(entry["body"]))
+            outputs.append(json.dumps({"id": f"batch_req_{len(outputs) + 1}", "custom_id": entry["custom_id"],
+                                       "response": {"status_code": 200, "body": body}, "error": None}))
+        output = self._add_file("\n".join(outputs).encode("utf-8"), "batch_output.jsonl", "batch_output")
+        with self._lock:
+            batch_id = f"batch_mock{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": endpoint, "input_file_id": input_file_id,
+                "completion_window": completion_window, "status": "completed", "output_file_id": output["id"],
+                "created_at": int(time.time()), "completed_at": int(time.time()),
+                "request_counts": {"total": len(outputs), "completed": len(outputs), "failed": 0},
+            }
+        return self.batches[batch_id]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output clean
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self) -> str:
+                route = self.path.split("?")[0].rstrip("/")
+                return route[len("/v1"):] if route.startswith("/v1/") else route
+
+            def do_GET(self):
+                route = self._route()
+                parts = route.strip("/").split("/")
+                if route == "/health":
+                    self._send_json(200, {"status": "ok", **server.counts})
+                elif parts[0] == "batches" and len(parts) == 2 and parts[1] in server.batches:
+                    self._send_json(200, server.batches[parts[1]])
+                elif parts[0] == "files" and len(parts) == 3 and parts[2] == "content" and parts[1] in server.files:
+                    data = server.files[parts[1]]["data"]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def _upload(self, raw: bytes):
+                """Store a multipart file upload."""
+                message = BytesParser().parsebytes(
+                    f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("utf-8") + raw)
+                fields, data, filename = {}, b"", "upload"
+                for part in message.get_payload() if message.is_multipart() else []:
+                    name = part.get_param("name", header="content-disposition")
+                    if part.get_filename() is not None:
+                        data, filename = part.get_payload(decode=True) or b"", part.get_filename()
+                    else:
+                        fields[name] = (part.get_payload(decode=True) or b"").decode("utf-8")
+                stored = server._add_file(data, filename, fields.get("purpose", ""))
+                self._send_json(200, {k: v for k, v in stored.items() if k != "data"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length)
+                route = self._route()
+                if route == "/files":
+                    self._upload(raw)
+                    return
+                if route == "/batches":
+                    request = json.loads(raw or b"{}")
+                    if request.get("input_file_id") not in server.files:
+                        self._send_json(404, {"error": {"message": "input file not found"}})
+                        return
+                    self._send_json(200, server._run_batch(request["input_file_id"], request.get("endpoint", ""),
+                                                           request.get("completion_window", "24h")))
+                    return
+                if route != "/chat/completions":
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                try:
+                    request = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid JSON"}})
+                    return
+
+                latency, status = server._draw()
+                time.sleep(latency)
+
+                if status == 429:
+                    self._send_json(429, {"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit"}},
+                                    {"Retry-After": str(int(server.retry_after))})
+                    return
+                if status == 500:
+                    self._send_json(500, {"error": {"message": "Internal error (mock)", "type": "server_error"}})
+                    return
+
+                content = mock_completion(request)
+                completion_id = "mock-" + hashlib.sha1(raw).hexdigest()[:12]
+
+                if request.get("stream"):
+                    self._stream(completion_id, request.get("model", "mock"), content)
+                    return
+
+                self._send_json(200, completion_body(completion_id, request, content))
+
+            def _stream(self, completion_id: str, model: str, content: str):
+                """Send the completion as server-sent events, one chunk at a time."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                chunks = [content[i:i + server.chunk_size] for i in range(0, len(content), server.chunk_size)]
+                for i, chunk in enumerate(chunks + [None]):
+                    delta = {"content": chunk} if chunk is not None else {}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    event = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": delta,
+                                                          "finish_reason": None if chunk is not None else "stop"}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "MockLLMServer":
+        """Serve in a daemon thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic mock chat-completions server")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8911, help="Port to bind")
+    parser.add_argument("--latency", type=str, default="fixed:0.05",
+                        help="Latency distribution: fixed:S, uniform:A,B, exp:MEAN or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds for 429 responses")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and fault injection")
+
+    args = parser.parse_args()
+    server = MockLLMServer(args.host, args.port, args.latency, args.error_rate,
+                           args.rate_limit_rate, args.retry_after, args.seed)
+    print(f"Mock LLM server listening on {server.url}")
+    print(f"  export OPENAI_BASE_URL={server.url}")
+    print(f"  export OPENROUTER_BASE_URL={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,6 @@ import os
 import sys
 import glob
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import argparse
 
@@ -17,29 +16,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Add current directory to path
 sys.path.insert(0, BASE_DIR)
 
-# Import R2EQueryEngine
-from r2e_query_engine import R2EQueryEngine
-
-def search_repository(exp_id, query, use_openrouter=False, show_code=False):
-    """Search a single repository and return the results"""
-    # Use environment variable for API key
-    api_key = os.environ.get("OPENROUTER_API_KEY") if use_openrouter else os.environ.get("OPENAI_API_KEY")
-    
-    # Initialize the query engine
-    engine = R2EQueryEngine(exp_id, api_key, use_openrouter=use_openrouter)
-    
-    # Load the extracted data
-    if not engine.load_data():
-        return pd.DataFrame()  # Return empty dataframe if loading fails
-    
-    # Perform the search
-    results = engine.semantic_search(query)
-    
-    # Add repository identifier
-    if not results.empty:
-        results['experiment'] = exp_id
-        
-    return results
+from search_workers import SearchWorkerPool
+from global_index import GlobalIndex, calibrated_scores
 
 def get_all_experiments():
     """Get all available experiment IDs from extracted data directory"""
@@ -55,14 +33,35 @@ def get_all_experiments():
     
     return experiments
 
-def display_results(results, show_code=False):
+def hits_to_dataframe(hits, codes=None):
+    """Build a results DataFrame from worker hits, adding code when fetched"""
+    results = pd.DataFrame([hit._asdict() for hit in hits])
+    if results.empty:
+        return results
+    results['relevance_score'] = results['score']
+    if codes is not None:
+        results['code'] = [codes.get((hit.experiment, hit.function_id), "") for hit in hits]
+    return results
+
+def run_query(searcher, query, show_code=False, limit=10, experiments=None, deadline=None):
+    """Search through the worker pool or global index and display the results, fetching code only if shown"""
+    if deadline is not None:
+        hits = searcher.search(query, limit=limit, experiments=experiments, deadline=deadline)
+    else:
+        hits = searcher.search(query, limit=limit, experiments=experiments)
+    codes = searcher.fetch_code(hits) if show_code and hits else None
+    display_results(hits_to_dataframe(hits, codes), show_code, query)
+
+def display_results(results, show_code=False, query=""):
     """Display the combined search results"""
     if results.empty:
         print("No matching functions found.")
         return
     
-    # Sort by relevance
-    results = results.sort_values('relevance', ascending=False)
+    # LLM and keyword results use different score columns; rank on the common 0-10 scale
+    if 'score' not in results.columns:
+        results = results.assign(score=calibrated_scores(results, query))
+    results = results.sort_values('score', ascending=False, kind='stable')
     
     print(f"\nFound {len(results)} relevant functions across repositories:")
     
@@ -70,9 +69,8 @@ def display_results(results, show_code=False):
         exp_id = func.get('experiment', 'unknown')
         print(f"\n{i+1}. {func['function_name']} ({func['repo_name']}) [{exp_id}]")
         
-        if 'relevance_score' in func:
-            print(f"   Relevance: {func['relevance_score']}/10")
-        if 'explanation' in func:
+        print(f"   Relevance: {func['score']:.1f}/10")
+        if 'explanation' in func and isinstance(func['explanation'], str):
             print(f"   Why: {func['explanation']}")
         
         # Display code
@@ -91,9 +89,40 @@ def main():
     parser.add_argument("--experiments", type=str, nargs="*", help="Specific experiment IDs to search")
     parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API")
     parser.add_argument("--show-code", action="store_true", help="Show full code for functions")
+    parser.add_argument("--rpm", type=int, help="LLM requests per minute shared by all worker processes")
+    parser.add_argument("--tpm", type=int, help="LLM tokens per minute shared by all worker processes")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU, at most one per experiment)")
+    parser.add_argument("--memory-budget", type=float, help="Memory (RSS) budget per worker process in MB (default: R2E_MEMORY_BUDGET_MB)")
+    parser.add_argument("--limit", type=int, default=10, help="Maximum results across all experiments")
+    parser.add_argument("--deadline", type=float, help="Seconds to wait before returning the best results found so far")
+    parser.add_argument("--interactive", action="store_true", help="Keep the workers warm and prompt for more queries")
+    parser.add_argument("--index", action="store_true", help="Rank all experiments in one pass with the global keyword + vector index")
+    parser.add_argument("--shards", type=str, nargs="+", help="Query shard servers (see shard_search.py) instead of local workers")
+    parser.add_argument("--shard-timeout", type=float, help="Seconds to wait for each shard (default: its route timeout per wave of experiments)")
+    parser.add_argument("--rebuild-index", action="store_true", help="Rebuild the global index before searching")
     
     args = parser.parse_args()
     
+    # Worker processes inherit the shared rate limits through the environment
+    if args.rpm:
+        os.environ["R2E_LLM_RPM"] = str(args.rpm)
+    if args.tpm:
+        os.environ["R2E_LLM_TPM"] = str(args.tpm)
+    
+    if args.shards:
+        # Shard servers own their experiments; nothing is loaded here
+        from shard_search import ShardCoordinator
+        coordinator = ShardCoordinator(args.shards, timeout=args.shard_timeout)
+        print(f"Searching across {len(coordinator.loaded)} experiments on {len(args.shards)} shards")
+        print(f"Query: {args.query}")
+        run_query(coordinator, args.query, args.show_code, args.limit, args.experiments, args.deadline)
+        while args.interactive:
+            query = input("\nNext query (or press Enter to exit): ").strip()
+            if not query:
+                break
+            run_query(coordinator, query, args.show_code, args.limit, args.experiments, args.deadline)
+        return
+    
     # Get experiments to search
     if args.experiments:
         experiments = args.experiments
@@ -107,23 +136,27 @@ def main():
     print(f"Searching across {len(experiments)} repositories: {', '.join(experiments)}")
     print(f"Query: {args.query}")
     
-    # Perform searches in parallel
-    all_results = []
-    with ProcessPoolExecutor(max_workers=min(os.cpu_count(), len(experiments))) as executor:
-        futures = [executor.submit(search_repository, exp_id, args.query, args.use_openrouter, args.show_code) 
-                  for exp_id in experiments]
-        
-        for future in futures:
-            results = future.result()
-            if not results.empty:
-                all_results.append(results)
+    if args.index or args.rebuild_index:
+        # One index probe instead of loading every experiment; no LLM calls
+        searcher = GlobalIndex.load_or_build(experiments, rebuild=args.rebuild_index)
+        run_query(searcher, args.query, args.show_code, args.limit, experiments)
+        while args.interactive:
+            query = input("\nNext query (or press Enter to exit): ").strip()
+            if not query:
+                break
+            run_query(searcher, query, args.show_code, args.limit, experiments)
+        return
     
-    # Combine and display results
-    if all_results:
-        combined_results = pd.concat(all_results)
-        display_results(combined_results, args.show_code)
-    else:
-        print("No matching functions found.")
+    # Workers load their experiments once and stay up for further queries
+    with SearchWorkerPool(experiments, num_workers=args.workers, use_openrouter=args.use_openrouter,
+                          memory_budget_mb=args.memory_budget) as pool:
+        run_query(pool, args.query, args.show_code, args.limit, deadline=args.deadline)
+        
+        while args.interactive:
+            query = input("\nNext query (or press Enter to exit): ").strip()
+            if not query:
+                break
+            run_query(pool, query, args.show_code, args.limit, deadline=args.deadline)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,8 @@
 import networkx as nx
 import multiprocessing as mp
 
+from shared_catalog import SharedGraph, row_ranges
+
 def _program_graph_to_nx(program_graph, directed=False):
     """Converts a ProgramGraph to a NetworkX graph.
 
@@ -50,21 +52,67 @@ def max_betweenness(graph):
     nx_graph = _program_graph_to_nx(graph, directed=False)
     return max(nx.algorithms.centrality.betweenness_centrality(nx_graph).values())
 
+def eccentricity(graph, node):
+    """Returns the eccentricity of a node in a SharedGraph.
+
+    The graph's diameter is the largest eccentricity over all nodes, so this
+    works as a per-node traversal_function for parallel_traversal and
+    load_balancing.
+
+    Args:
+        graph: A SharedGraph.
+        node: Position of the node to start from.
+
+    Returns:
+        The longest shortest-path distance from the node, following outgoing
+        edges, to any node reachable from it.
+    """
+    distances = {node: 0}
+    frontier = [node]
+    while frontier:
+        next_frontier = []
+        for current in frontier:
+            for neighbor in graph.neighbors(current).tolist():
+                if neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return max(distances.values())
+
 def parallel_traversal(graph, traversal_function, num_processes=None):
     """Performs a parallel traversal of a graph using multiple processes.
 
+    The graph's adjacency is packed once into shared memory. Each process
+    receives only the shared memory handle and a range of node positions, and
+    attaches to the arrays without copying them.
+
     Args:
         graph: A ProgramGraph.
-        traversal_function: A function that takes a node as input and performs the
-            desired traversal operation.
+        traversal_function: A picklable function taking a SharedGraph and a node
+            position that performs the desired traversal operation.
         num_processes: The number of processes to use for parallel execution. If None,
             the number of available CPUs will be used.
     """
     if num_processes is None:
         num_processes = mp.cpu_count()
 
-    with mp.Pool(processes=num_processes) as pool:
-        pool.map(traversal_function, graph.all_nodes())
+    shared = SharedGraph.from_program_graph(graph)
+    try:
+        tasks = [(shared.handle, start, stop, traversal_function)
+                 for start, stop in row_ranges(len(shared), num_processes)]
+        with mp.Pool(processes=num_processes) as pool:
+            pool.starmap(_traverse_range, tasks)
+    finally:
+        shared.close()
+
+def _traverse_range(handle, start, stop, traversal_function):
+    """Worker function for parallel_traversal: visits node positions start to stop."""
+    graph = SharedGraph.attach(handle)
+    try:
+        for node in range(start, stop):
+            traversal_function(graph, node)
+    finally:
+        graph.close()
 
 def distributed_processing(graph, processing_function, num_partitions=None):
     """Processes a graph in a distributed manner using multiple partitions.
@@ -89,52 +137,70 @@ def distributed_processing(graph, processing_function, num_partitions=None):
 def load_balancing(graph, traversal_function, num_processes=None):
     """Performs a parallel traversal of a graph with load balancing.
 
+    Unlike parallel_traversal, node positions are handed out one at a time
+    from a queue, so a process that gets expensive nodes does not hold up
+    the others. The graph is shared the same way as in parallel_traversal.
+
     Args:
         graph: A ProgramGraph.
-        traversal_function: A function that takes a node as input and performs the
-            desired traversal operation.
+        traversal_function: A picklable function taking a SharedGraph and a node
+            position that performs the desired traversal operation.
         num_processes: The number of processes to use for parallel execution. If None,
             the number of available CPUs will be used.
     """
     if num_processes is None:
         num_processes = mp.cpu_count()
 
-    # Create a queue to store tasks
-    task_queue = mp.Queue()
-
-    # Add all nodes to the task queue
-    for node in graph.all_nodes():
-        task_queue.put(node)
-
-    # Create a pool of worker processes
-    workers = []
-    for _ in range(num_processes):
-        worker = mp.Process(target=_worker, args=(task_queue, traversal_function))
-        worker.start()
-        workers.append(worker)
-
-    # Wait for all tasks to be completed
-    task_queue.join()
-
-    # Wait for all workers to finish
-    for worker in workers:
-        worker.join()
-
-def _worker(task_queue, traversal_function):
-    """Worker function for load balancing."""
-    while True:
-        # Get a task from the queue
-        node = task_queue.get()
-
-        # Perform the traversal operation
-        traversal_function(node)
-
-        # Mark the task as done
-        task_queue.task_done()
+    shared = SharedGraph.from_program_graph(graph)
+    try:
+        # Create a queue to store tasks
+        task_queue = mp.JoinableQueue()
+
+        # Add all node positions to the task queue, then one stop marker per worker
+        for node in range(len(shared)):
+            task_queue.put(node)
+        for _ in range(num_processes):
+            task_queue.put(None)
+
+        # Create a pool of worker processes
+        workers = []
+        for _ in range(num_processes):
+            worker = mp.Process(target=_worker, args=(task_queue, shared.handle, traversal_function))
+            worker.start()
+            workers.append(worker)
+
+        # Wait for all tasks to be completed
+        task_queue.join()
+
+        # Wait for all workers to finish
+        for worker in workers:
+            worker.join()
+    finally:
+        shared.close()
+
+def _worker(task_queue, handle, traversal_function):
+    """Worker function for load balancing: visits queued node positions until a stop marker."""
+    graph = SharedGraph.attach(handle)
+    try:
+        while True:
+            # Get a task from the queue
+            node = task_queue.get()
+            if node is None:
+                task_queue.task_done()
+                break
+
+            # Perform the traversal operation
+            try:
+                traversal_function(graph, node)
+            finally:
+                # Mark the task as done
+                task_queue.task_done()
+    finally:
+        graph.close()
 
 if __name__ == "__main__":
     # Example usage
     graph = ...  # Load a ProgramGraph
-    parallel_traversal(graph, diameter)
+    parallel_traversal(graph, eccentricity)
     distributed_processing(graph, max_betweenness)
-    load_balancing(graph, diameter)
\ No newline at end of file
+    load_balancing(graph, eccentricity)
\ No newline at end of file
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Prompt Compression - Content hashing and deduplication of function bodies
+
+Vendored copies, forks and boilerplate mean the same function body often
+appears many times in one experiment. These helpers fingerprint bodies so
+prompt builders can list each body once together with every location it
+appears in, and optionally strip comments and redundant whitespace.
+
+Two fingerprints are available:
+- exact: comments and whitespace are ignored
+- near: additionally ignores the function's own name and the values of
+  string and number literals, so renamed or lightly edited copies collapse
+"""
+
+import io
+import re
+import hashlib
+import textwrap
+import tokenize
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+_DEF_NAME = re.compile(r'^(\s*(?:async\s+)?def\s+)\w+', re.MULTILINE)
+
+def _tokens(code: str, mask_literals: bool = False) -> Optional[List[str]]:
+    """Token strings of ``code`` without comments/layout, or None if it does not tokenize."""
+    skip = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+            tokenize.DEDENT, tokenize.ENCODING, tokenize.ENDMARKER}
+    try:
+        tokens = []
+        for tok in tokenize.generate_tokens(io.StringIO(textwrap.dedent(code)).readline):
+            if tok.type in skip:
+                continue
+            if mask_literals and tok.type == tokenize.STRING:
+                tokens.append("STR")
+            elif mask_literals and tok.type == tokenize.NUMBER:
+                tokens.append("NUM")
+            else:
+                tokens.append(tok.string)
+        return tokens
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+
+def strip_comments(code: str) -> str:
+    """Remove ``#`` comments from Python code, keeping strings intact."""
+    try:
+        lines = textwrap.dedent(code).splitlines(keepends=True)
+        comments = [tok for tok in tokenize.generate_tokens(io.StringIO("".join(lines)).readline)
+                    if tok.type == tokenize.COMMENT]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Fall back to dropping whole-line comments only
+        return "\n".join(line for line in code.splitlines() if not line.lstrip().startswith("#"))
+
+    # Cut each comment out of its line, right to left so offsets stay valid
+    for tok in reversed(comments):
+        row, col = tok.start
+        line = lines[row - 1]
+        lines[row - 1] = line[:col].rstrip() + ("\n" if line.endswith("\n") else "")
+    return "".join(lines)
+
+def compact_code(code: str, remove_comments: bool = True) -> str:
+    """
+    Shrink code for a prompt: dedent, strip comments, drop blank lines and trailing spaces.
+
+    Args:
+        code: Function source
+        remove_comments: Whether to strip ``#`` comments
+
+    Returns:
+        The compacted source
+    """
+    if not code:
+        return code
+    if remove_comments:
+        code = strip_comments(code)
+    lines = [line.rstrip() for line in textwrap.dedent(code).splitlines()]
+    return "\n".join(line for line in lines if line.strip())
+
+def code_fingerprint(code: str, near: bool = False) -> Optional[str]:
+    """
+    Content hash of a function body.
+
+    Args:
+        code: Function source
+        near: Also ignore the function name and literal values
+
+    Returns:
+        Hex digest, or None for empty code (which never counts as a duplicate)
+    """
+    if not code or not code.strip():
+        return None
+    if near:
+        code = _DEF_NAME.sub(r"\1_", code)
+    tokens = _tokens(code, mask_literals=near)
+    if tokens is None:
+        text = compact_code(code)
+        if near:
+            text = re.sub(r'"[^"]*"|\'[^\']*\'', "STR", text)
+        canonical = re.sub(r"\s+", " ", text)
+    else:
+        canonical = " ".join(tokens)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+def group_duplicates(codes: List[str], near: bool = True,
+                     keys: Optional[List[str]] = None) -> List[List[int]]:
+    """
+    Group positions of identical (or near-identical) bodies.
+
+    Args:
+        codes: Function sources
+        near: Use the near-duplicate fingerprint
+        keys: Optional extra key per position (e.g. the function name);
+            only positions with equal keys are grouped
+
+    Returns:
+        Groups of positions into ``codes`` with more than one member, each in
+        original order (the first position is the representative)
+    """
+    groups: Dict[Any, List[int]] = OrderedDict()
+    for i, code in enumerate(codes):
+        fingerprint = code_fingerprint(code, near=near)
+        if fingerprint is not None:
+            groups.setdefault((keys[i] if keys else None, fingerprint), []).append(i)
+    return [positions for positions in groups.values() if len(positions) > 1]
+
+def dedupe_components(components: List[Dict[str, Any]], near: bool = True,
+                      keys: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Collapse component dicts (with ``code`` and ``locations`` keys) that share a body.
+
+    The first component of each group is kept and the others' locations
+    are appended to its ``locations`` list. With ``keys`` (e.g. function
+    names), only components with equal keys are collapsed.
+    """
+    duplicate_of = {}
+    for group in group_duplicates([c.get("code", "") for c in components], near=near, keys=keys):
+        for position in group[1:]:
+            duplicate_of[position] = group[0]
+
+    kept = []
+    for i, component in enumerate(components):
+        if i in duplicate_of:
+            components[duplicate_of[i]].setdefault("locations", []).extend(component.get("locations", []))
+        else:
+            kept.append(component)
+    return kept
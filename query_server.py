@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Query Server - Long-running local server keeping experiments resident
+
+Every CLI call otherwise starts a cold process that imports pandas and
+openai, parses the extracted JSON and answers a single question. The
+server keeps one warm R2EQueryEngine per experiment and answers search,
+research, prototype and documentation requests over local HTTP/JSON.
+
+Experiments are loaded on first use and kept within a memory budget,
+least recently used experiments being evicted first. When an
+experiment's extracted data changes, it is reloaded in the background
+and swapped in; requests already running finish on the old engine.
+
+main.py and r2e_query_engine.py use a running server automatically.
+
+Usage:
+    python query_server.py --port 8950 --memory-budget 2048
+    python main.py search PAE_exp "graph traversal"   # answered by the server
+
+Endpoints:
+    GET  /health      resident experiments and memory use
+    POST /search      {"exp_id", "query", "limit", "arxiv_url", "document", "use_openrouter"}
+    POST /research    {"exp_id", "query", "num_trajectories", "document", "use_openrouter"}
+    POST /prototype   {"exp_id", "trajectory", "document", "use_openrouter"}
+    POST /docs        {"exp_id"}
+
+``use_openrouter`` picks the provider for one request (default: the
+server's); engines for both providers share the loaded catalog.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import List, Dict, Any, Optional
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+# Where the CLI looks for a running server
+SERVER_URL = os.environ.get("R2E_SERVER_URL", "http://127.0.0.1:8950")
+
+def _records(df) -> List[Dict[str, Any]]:
+    """JSON-safe records for a DataFrame."""
+    if df is None or len(df) == 0:
+        return []
+    return json.loads(df.to_json(orient="records"))
+
+class QueryServer:
+    """HTTP/JSON front end for an EngineRegistry."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8950, memory_budget_mb: float = 2048,
+                 api_key: Optional[str] = None, use_openrouter: bool = False, watch_interval: float = 5.0):
+        """
+        Initialize the server.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            memory_budget_mb: Process memory (RSS) budget, in megabytes
+            api_key: Optional API key (falls back to env var)
+            use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            watch_interval: Seconds between checks for changed extracted data (0 disables)
+        """
+        from http.server import ThreadingHTTPServer
+        from engine_registry import EngineRegistry
+
+        self.registry = EngineRegistry(memory_budget_mb, api_key, use_openrouter)
+        self.watch_interval = watch_interval
+        self.started = time.time()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _document(self, exp_id: str, query: str, results, research=None, arxiv_url=None):
+        from living_doc import LivingDoc
+        import pandas as pd
+
+        doc = LivingDoc()
+        doc.document_query(exp_id, query, results if results is not None else pd.DataFrame(), research,
+                           arxiv_url=arxiv_url)
+        doc.generate_html()
+
+    def _engine(self, request: Dict[str, Any]):
+        return self.registry.get(request["exp_id"], use_openrouter=request.get("use_openrouter"))
+
+    def search(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        engine = self._engine(request)
+        limit = int(request.get("limit", 10))
+        # The keyword fallback is not limited, so cap what is sent back
+        results = engine.semantic_search(request["query"], limit=limit, arxiv_url=request.get("arxiv_url")).head(limit)
+        if request.get("document") and len(results) > 0:
+            self._document(request["exp_id"], request["query"], results, arxiv_url=request.get("arxiv_url"))
+        return {"results": _records(results)}
+
+    def research(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        engine = self._engine(request)
+        trajectories = engine.generate_research_trajectories(request["query"],
+                                                             int(request.get("num_trajectories", 3)))
+        if request.get("document") and trajectories:
+            self._document(request["exp_id"], request["query"], None, trajectories)
+        return {"trajectories": trajectories or []}
+
+    def prototype(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        engine = self._engine(request)
+        trajectory = request["trajectory"]
+        code = engine.get_prototype(trajectory)
+        if request.get("document") and code:
+            from living_doc import LivingDoc
+            LivingDoc().document_prototype(request["exp_id"], trajectory.get("title", ""), code)
+        return {"code": code}
+
+    def docs(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from generate_docs import generate_documentation
+
+        engine = self.registry.get(request["exp_id"])
+        return {"path": generate_documentation(request["exp_id"], engine.functions_df)}
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+        routes = {"/search": self.search, "/research": self.research,
+                  "/prototype": self.prototype, "/docs": self.docs}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Engine output is enough
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/health":
+                    self._send_json(200, {"status": "ok", "uptime": round(time.time() - server.started, 1),
+                                          **server.registry.stats()})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+
+                handler = routes.get(self.path.rstrip("/"))
+                if handler is None:
+                    self._send_json(404, {"error": "not found"})
+                    return
+                try:
+                    self._send_json(200, handler(request))
+                except KeyError as e:
+                    self._send_json(400, {"error": f"missing field {e}"})
+                except Exception as e:
+                    self._send_json(500, {"error": str(e)})
+
+        return Handler
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            self.registry.refresh()
+
+    def start(self) -> "QueryServer":
+        """Serve (and watch for changed data) in daemon threads."""
+        targets = [self.httpd.serve_forever]
+        if self.watch_interval > 0:
+            targets.append(self._watch)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class QueryClient:
+    """Client for a running QueryServer."""
+
+    def __init__(self, url: str = SERVER_URL, timeout: float = 600.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        import urllib.error
+        import urllib.request
+
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            raise Exception(json.loads(e.read().decode("utf-8")).get("error", str(e)))
+
+    def health(self, timeout: float = 0.3) -> Optional[Dict[str, Any]]:
+        """Server status, or None if no server answers."""
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except Exception:
+            return None
+
+    def search(self, exp_id: str, query: str, limit: int = 10, arxiv_url: Optional[str] = None,
+               document: bool = False, use_openrouter: Optional[bool] = None):
+        """Search on the server; returns a results DataFrame like R2EQueryEngine.semantic_search."""
+        import pandas as pd
+
+        answer = self._post("/search", {"exp_id": exp_id, "query": query, "limit": limit, "arxiv_url": arxiv_url,
+                                        "document": document, "use_openrouter": use_openrouter})
+        return pd.DataFrame(answer["results"])
+
+    def research(self, exp_id: str, query: str, num_trajectories: int = 3, document: bool = False,
+                 use_openrouter: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Generate research trajectories on the server."""
+        return self._post("/research", {"exp_id": exp_id, "query": query, "num_trajectories": num_trajectories,
+                                        "document": document, "use_openrouter": use_openrouter})["trajectories"]
+
+    def prototype(self, exp_id: str, trajectory: Dict[str, Any], document: bool = False,
+                  use_openrouter: Optional[bool] = None) -> str:
+        """Generate a prototype for a research trajectory on the server."""
+        return self._post("/prototype", {"exp_id": exp_id, "trajectory": trajectory, "document": document,
+                                         "use_openrouter": use_openrouter})["code"]
+
+    def docs(self, exp_id: str) -> str:
+        """Generate an experiment's documentation on the server; returns the output path."""
+        return self._post("/docs", {"exp_id": exp_id})["path"]
+
+def get_server(url: Optional[str] = None) -> Optional[QueryClient]:
+    """
+    Client for the running query server, if there is one.
+
+    Set R2E_NO_SERVER=1 to always run locally.
+    """
+    if os.environ.get("R2E_NO_SERVER"):
+        return None
+    client = QueryClient(url or SERVER_URL)
+    return client if client.health() is not None else None
+
+def serve(host: str = "127.0.0.1", port: int = 8950, memory_budget_mb: float = 2048, watch_interval: float = 5.0,
+          preload: Optional[List[str]] = None, use_openrouter: bool = False):
+    """Run the query server in the foreground until interrupted."""
+    server = QueryServer(host, port, memory_budget_mb, use_openrouter=use_openrouter, watch_interval=watch_interval)
+    for exp_id in preload or []:
+        try:
+            server.registry.get(exp_id)
+        except Exception as e:
+            print(f"Error preloading {exp_id}: {e}")
+    server.start()
+    print(f"R2E query server listening on {server.url} (memory budget {memory_budget_mb:.0f} MB)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running R2E query server")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8950, help="Port to bind")
+    parser.add_argument("--memory-budget", type=float, default=2048, help="Process memory (RSS) budget (MB)")
+    parser.add_argument("--watch-interval", type=float, default=5.0,
+                        help="Seconds between checks for changed extracted data (0 disables)")
+    parser.add_argument("--preload", type=str, nargs="*", help="Experiments to load at start-up")
+    parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API")
+
+    args = parser.parse_args()
+    serve(args.host, args.port, args.memory_budget, args.watch_interval, args.preload, args.use_openrouter)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+"""
+Async R2E Query Engine - asyncio variant of R2EQueryEngine
+
+All LLM requests go through one shared aiohttp session with a keep-alive
+connection pool, a per-host connection limit and explicit timeouts, so a
+single process can run hundreds of concurrent queries. The in-flight limit
+starts at the per-host connection limit and backs off on 429s and slow
+answers; waiting requests sleep on the event loop instead of polling.
+Prompt building (which fingerprints function bodies) runs in the default
+executor so it does not stall other queries.
+
+Example:
+    async with AsyncR2EQueryEngine("quickstart", use_openrouter=True) as engine:
+        await engine.aload_data()
+        results = await asyncio.gather(*(engine.asearch(q) for q in queries))
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import pandas as pd
+from typing import List, Dict, Any, Optional
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from r2e_query_engine import (
+    R2EQueryEngine,
+    build_chat_payload,
+    response_content,
+)
+from rate_limiter import RateLimitError, AsyncAdaptiveConcurrency
+
+class AsyncOpenRouterClient:
+    """An asyncio client for the OpenRouter API backed by a pooled aiohttp session."""
+    
+    def __init__(self, api_key: str, timeout: float = 120.0, connect_timeout: float = 10.0,
+                 max_connections: int = 200, max_connections_per_host: int = 50,
+                 keepalive_timeout: float = 30.0):
+        """
+        Initialize the async OpenRouter client.
+        
+        Args:
+            api_key: The OpenRouter API key
+            timeout: Total timeout in seconds for a single completion
+            connect_timeout: Timeout in seconds for establishing a connection
+            max_connections: Size of the shared connection pool
+            max_connections_per_host: Concurrent connections allowed per host;
+                further requests queue until a connection is free
+            keepalive_timeout: Seconds an idle connection is kept open for reuse
+        """
+        self.api_key = api_key
+        self.base_url = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+    
+    def _get_session(self):
+        """Create the shared session lazily, inside the running event loop."""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self._session
+    
+    async def chat_completions_create(self, model: str, messages: List[Dict],
+                                      temperature: float = 0.7,
+                                      response_format: Optional[Dict] = None,
+                                      max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Create a chat completion using OpenRouter API.
+        
+        Args:
+            model: The model to use (e.g., "openai/gpt-4")
+            messages: List of message objects
+            temperature: Sampling temperature
+            response_format: Desired format for the response
+            max_tokens: Maximum tokens to generate
+        
+        Returns:
+            Response JSON dict in the OpenAI chat-completions format
+        """
+        payload = build_chat_payload(model, messages, temperature, response_format, max_tokens)
+        session = self._get_session()
+        
+        async with session.post(f"{self.base_url}/chat/completions", json=payload) as response:
+            text = await response.text()
+            
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                raise RateLimitError(f"Error code: 429 - {text}",
+                                     retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+            
+            if response.status != 200:
+                raise Exception(f"Error code: {response.status} - {text}")
+            
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError as e:
+                print(f"Error decoding JSON response: {e}")
+                print(f"Raw response: {text[:500]}...")
+                raise Exception("Failed to decode OpenRouter response")
+    
+    async def aclose(self):
+        """Close the shared session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+class AsyncR2EQueryEngine(R2EQueryEngine):
+    """
+    Asyncio variant of R2EQueryEngine.
+    
+    Prompt construction and result parsing are shared with the synchronous
+    engine; only the LLM round trips are awaited.
+    """
+    
+    def __init__(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False,
+                 routes: Optional[Dict[str, Dict[str, Any]]] = None,
+                 timeout: float = 120.0, connect_timeout: float = 10.0,
+                 max_connections: int = 200, max_connections_per_host: int = 50):
+        """
+        Initialize the async query engine.
+        
+        Args:
+            exp_id: The experiment ID used in R2E
+            api_key: Optional API key (falls back to env var)
+            use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            routes: Optional per-operation model routes (see llm_router)
+            timeout: Total timeout in seconds for a single completion
+            connect_timeout: Timeout in seconds for establishing a connection
+            max_connections: Size of the shared connection pool
+            max_connections_per_host: Concurrent connections allowed per host; also
+                the starting and highest number of requests in flight
+        """
+        super().__init__(exp_id, api_key, use_openrouter, routes=routes)
+        self.aclient = None
+        
+        # Every request holds a connection, so more in flight than the pool allows only queues
+        self.limiter.async_concurrency = AsyncAdaptiveConcurrency(
+            initial=max_connections_per_host,
+            maximum=max_connections_per_host
+        )
+        
+        if not self.api_key:
+            return
+        
+        if use_openrouter:
+            self.aclient = AsyncOpenRouterClient(
+                self.api_key,
+                timeout=timeout,
+                connect_timeout=connect_timeout,
+                max_connections=max_connections,
+                max_connections_per_host=max_connections_per_host
+            )
+        else:
+            from openai import AsyncOpenAI
+            
+            # The OpenAI SDK keeps its own pooled keep-alive client
+            self.aclient = AsyncOpenAI(api_key=self.api_key, timeout=timeout)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def aclose(self):
+        """Release the pooled HTTP connections."""
+        if self.aclient is not None:
+            if isinstance(self.aclient, AsyncOpenRouterClient):
+                await self.aclient.aclose()
+            else:
+                await self.aclient.close()
+    
+    async def _run_blocking(self, func, *args):
+        """Run a blocking helper (file or arXiv I/O, prompt building) in the default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+    
+    async def aload_data(self) -> bool:
+        """Load the extracted functions data without blocking the event loop."""
+        return await self._run_blocking(self.load_data)
+    
+    async def _acall_model(self, operation: str, model: str, request: Dict[str, Any]):
+        """Async counterpart of R2EQueryEngine._call_model."""
+        if self.use_openrouter:
+            func = lambda: self.aclient.chat_completions_create(model=model, **request)
+        else:
+            func = lambda: self.aclient.chat.completions.create(model=model, **request)
+        
+        stats = {}
+        started = time.monotonic()
+        try:
+            response = await self.limiter.acall(func, request, stats, operation)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.telemetry.record(self.exp_id, operation, model, time.monotonic() - started,
+                                  request, retries=stats.get("retries", 0), error=str(e))
+            raise
+        
+        self.telemetry.record(self.exp_id, operation, model, time.monotonic() - started,
+                              request, response, retries=stats.get("retries", 0))
+        return response
+    
+    async def _acomplete(self, operation: str, request: Dict[str, Any]) -> Optional[str]:
+        """Async counterpart of R2EQueryEngine._complete."""
+        response = await self.router.acomplete(
+            operation,
+            lambda model: self._acall_model(operation, model, request)
+        )
+        return response_content(response)
+    
+    async def asearch(self, query: str, limit: int = 10, arxiv_url: Optional[str] = None,
+                      keyword_fallback: bool = True) -> pd.DataFrame:
+        """
+        Async semantic search; see R2EQueryEngine.semantic_search.
+        
+        Args:
+            query: Natural language query about code
+            limit: Maximum number of results to return
+            arxiv_url: Optional arXiv paper URL to include in context
+            keyword_fallback: Fall back to keyword search when the LLM search fails
+                (otherwise the failure is raised)
+        
+        Returns:
+            DataFrame of matching functions ranked by relevance
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return pd.DataFrame()
+        
+        if not self.api_key:
+            if not keyword_fallback:
+                raise Exception("API key required for semantic search.")
+            print("No API key provided. Falling back to keyword search.")
+            return self.simple_keyword_search(query)
+        
+        stored = self._stored_search(query, limit, arxiv_url)
+        if stored is not None:
+            return stored
+        
+        arxiv_context = await self._run_blocking(self._fetch_arxiv_context, arxiv_url) if arxiv_url else ""
+        prompt = await self._run_blocking(self._build_search_prompt, query, limit, arxiv_context)
+        
+        try:
+            content = await self._acomplete("search", self._search_request(prompt))
+        except Exception as e:
+            if not keyword_fallback:
+                raise
+            print(f"Error performing semantic search: {e}")
+            return self.simple_keyword_search(query)
+        
+        results = self._parse_json_list(content, "results")
+        if results is None:
+            if not keyword_fallback:
+                raise Exception("Could not parse the semantic search response.")
+            return self.simple_keyword_search(query)
+        
+        matched = self._match_search_results(results)
+        self._store_search(query, limit, arxiv_url, matched)
+        return matched
+    
+    async def agenerate_research_trajectories(self, query: str, num_trajectories: int = 3) -> List[Dict[str, Any]]:
+        """
+        Async research trajectory generation; see R2EQueryEngine.generate_research_trajectories.
+        
+        Args:
+            query: Research question or direction
+            num_trajectories: Number of research trajectories to generate
+        
+        Returns:
+            List of research trajectories with details
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return []
+        
+        if not self.api_key:
+            print("API key required for generating research trajectories.")
+            return []
+        
+        relevant_functions = self._stored_search(query, 20, any_limit=True)
+        if relevant_functions is None:
+            relevant_functions = await self.asearch(query, limit=20)
+        
+        if len(relevant_functions) == 0:
+            print("No relevant functions found for this research query.")
+            return []
+        
+        prompt = await self._run_blocking(self._build_research_prompt, query, relevant_functions, num_trajectories)
+        
+        try:
+            content = await self._acomplete("research", self._research_request(prompt))
+        except Exception as e:
+            print(f"Error generating research trajectories: {e}")
+            return []
+        
+        return self._parse_json_list(content, "trajectories") or []
+    
+    async def agenerate_prototype(self, research_trajectory: Dict[str, Any]) -> str:
+        """
+        Async prototype generation; see R2EQueryEngine.generate_prototype.
+        
+        Args:
+            research_trajectory: A research trajectory dictionary
+        
+        Returns:
+            String containing prototype code
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return ""
+        
+        if not self.api_key:
+            print("API key required for generating prototype code.")
+            return ""
+        
+        prompt = await self._run_blocking(self._build_prototype_prompt, research_trajectory)
+        
+        try:
+            content = await self._acomplete("prototype", self._prototype_request(prompt))
+        except Exception as e:
+            print(f"Error generating prototype code: {e}")
+            return ""
+        
+        if content is None:
+            print("Unexpected prototype response structure")
+            return ""
+        
+        return content
+
+async def _run_queries(args) -> None:
+    """Run all queries concurrently against one engine."""
+    async with AsyncR2EQueryEngine(args.exp_id, args.api_key, args.use_openrouter,
+                                   max_connections_per_host=args.concurrency) as engine:
+        if not await engine.aload_data():
+            print("Failed to load data. Exiting.")
+            sys.exit(1)
+        
+        all_results = await asyncio.gather(*(engine.asearch(q) for q in args.query))
+        
+        for query, results in zip(args.query, all_results):
+            print(f"\n=== {query} ===")
+            if len(results) == 0:
+                print("No matching functions found.")
+                continue
+            for i, (_, func) in enumerate(results.iterrows()):
+                print(f"{i+1}. {func['function_name']} ({func['repo_name']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several R2E queries concurrently with the async engine")
+    parser.add_argument("--exp_id", type=str, required=True, help="R2E experiment ID")
+    parser.add_argument("--api_key", type=str, help="API key (will use environment variable if not provided)")
+    parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API instead of OpenAI")
+    parser.add_argument("--query", type=str, action="append", required=True, help="Query to run (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Maximum concurrent connections (and requests in flight) per host")
+    
+    args = parser.parse_args()
+    asyncio.run(_run_queries(args))
+
+if __name__ == "__main__":
+    main()
@@ -6,40 +6,72 @@ This script implements core functionality similar to LOTUS but tailored
 specifically for working with code extracted from R2E.
 """
 
+from __future__ import annotations
+
 import json
 import os
 import sys
 import subprocess
-import pandas as pd
-import numpy as np
-from typing import List, Dict, Any, Optional, Union
+import time
+from typing import List, Dict, Any, Optional, Union, Iterator, Callable, Tuple, Set
 import re
 import argparse
-import requests
 from pathlib import Path
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, Future
+
+# Heavy dependencies are imported on first use so --help and server round trips start fast
+from lazy_imports import lazy_module
+pd = lazy_module("pandas")
+np = lazy_module("numpy")
+requests = lazy_module("requests")
+
+from llm_router import ModelRouter, default_routes, load_routes
+from rate_limiter import LLMRateLimiter, RateLimitError
+from llm_telemetry import TelemetryLog
+from prompt_compression import compact_code, group_duplicates, dedupe_components
+from session_store import SessionResultStore, catalog_version
+from arxiv_cache import get_arxiv_cache, format_arxiv_context
 
 # Configuration
 R2E_BUCKET_PATH = os.path.expanduser("~/buckets/r2e_bucket")
 R2E_REPOS_PATH = os.path.expanduser("~/buckets/local_repoeval_bucket/repos")
 
+# LLM models: OpenRouter primary/fallback and the direct OpenAI model
+OPENROUTER_PRIMARY_MODEL = "openai/gpt-4o-2024-05-13"
+OPENROUTER_FALLBACK_MODEL = "openai/gpt-3.5-turbo"
+OPENAI_MODEL = "gpt-4-turbo"
+
+# Code characters per function sent in a filter verification prompt
+FILTER_CODE_CHARS = 1500
+
 class OpenRouterClient:
     """A client for OpenRouter API to access various LLM models."""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, timeout: float = 120.0, connect_timeout: float = 10.0):
         """
         Initialize the OpenRouter client.
         
         Args:
             api_key: The OpenRouter API key
+            timeout: Read timeout in seconds for a single completion
+            connect_timeout: Timeout in seconds for establishing the connection
         """
         self.api_key = api_key
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        self.timeout = (connect_timeout, timeout)
+        
+        # Reuse one keep-alive connection pool for every request
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
         
     def chat_completions_create(self, model: str, messages: List[Dict], 
                                 temperature: float = 0.7, 
                                 response_format: Optional[Dict] = None,
-                                max_tokens: Optional[int] = None):
+                                max_tokens: Optional[int] = None,
+                                verbose: bool = True):
         """
         Create a chat completion using OpenRouter API.
         
@@ -49,38 +81,30 @@ class OpenRouterClient:
             temperature: Sampling temperature
             response_format: Desired format for the response
             max_tokens: Maximum tokens to generate
+            verbose: Whether to print the response status
             
         Returns:
             Response object similar to OpenAI's response
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        payload = build_chat_payload(model, messages, temperature, response_format, max_tokens)
         
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature
-        }
-        
-        if max_tokens:
-            payload["max_tokens"] = max_tokens
-            
-        if response_format:
-            payload["response_format"] = response_format
-        
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload
+            json=payload,
+            timeout=self.timeout
         )
         
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise RateLimitError(f"Error code: 429 - {response.text}",
+                                 retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        
         if response.status_code != 200:
             raise Exception(f"Error code: {response.status_code} - {response.text}")
             
         # Print the raw response for debugging
-        print(f"OpenRouter response status: {response.status_code}")
+        if verbose:
+            print(f"OpenRouter response status: {response.status_code}")
         
         try:
             return response.json()
@@ -89,10 +113,44 @@ class OpenRouterClient:
             print(f"Raw response: {response.text[:500]}...")
             raise Exception(f"Failed to decode OpenRouter response")
 
+def build_chat_payload(model: str, messages: List[Dict], temperature: float = 0.7,
+                       response_format: Optional[Dict] = None,
+                       max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Build the JSON body of a chat-completions request."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature
+    }
+    
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+        
+    if response_format:
+        payload["response_format"] = response_format
+    
+    return payload
+
+def response_content(response) -> Optional[str]:
+    """
+    Extract the message content from a chat completion response.
+    
+    Works for both the raw OpenRouter JSON dict and OpenAI SDK objects.
+    
+    Returns:
+        The content string, or None if the response has no choices
+    """
+    if isinstance(response, dict):
+        if "choices" in response and len(response["choices"]) > 0:
+            return response["choices"][0]["message"]["content"]
+        return None
+    return response.choices[0].message.content
+
 class R2EQueryEngine:
     """A query engine for code extracted by R2E using LLMs."""
     
-    def __init__(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False):
+    def __init__(self, exp_id: str, api_key: Optional[str] = None, use_openrouter: bool = False,
+                 routes: Optional[Dict[str, Dict[str, Any]]] = None):
         """
         Initialize the R2E Query Engine.
         
@@ -100,12 +158,42 @@ class R2EQueryEngine:
             exp_id: The experiment ID used in R2E
             api_key: Optional API key (falls back to env var)
             use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            routes: Optional per-operation model routes (see llm_router)
         """
         self.exp_id = exp_id
         self.functions_df = None
         self.extracted_data_path = os.path.join(R2E_BUCKET_PATH, "extracted_data", f"{exp_id}_extracted.json")
         self.use_openrouter = use_openrouter
         
+        # Per-operation model routing with hedged fallback and circuit breaking
+        models = [OPENROUTER_PRIMARY_MODEL, OPENROUTER_FALLBACK_MODEL] if use_openrouter else [OPENAI_MODEL]
+        self.router = ModelRouter(routes or default_routes(models))
+        
+        # Requests/min and tokens/min shared with every process on this host
+        self.limiter = LLMRateLimiter("openrouter" if use_openrouter else "openai")
+        
+        # Per-call token, latency and cost log
+        self.telemetry = TelemetryLog()
+        
+        # Prompt size controls: collapse duplicate bodies, optionally strip comments/whitespace
+        self.dedupe_prompts = True
+        self.compact_prompts = False
+        
+        # Duplicate groups of the search candidates: (functions_df, catalog version, also_in, skip)
+        self._search_duplicates_cache = None
+        
+        # Speculative prototype generation for the top N trajectories (0 = off)
+        self.prefetch_prototypes = 0
+        self._prefetch_executor = None
+        self._prototype_futures: Dict[str, Future] = {}
+        
+        # Search results from this session, reused by research (dropped when the catalog changes)
+        self.results = SessionResultStore(lambda: catalog_version(self.extracted_data_path))
+        
+        # Reads code by function id when functions_df has no code column (e.g. search workers,
+        # whose code lives in a shared catalog)
+        self.code_lookup: Optional[Callable[[List[int]], List[str]]] = None
+        
         # Initialize LLM client
         if use_openrouter:
             self.api_key = api_key or os.environ.get("OPENROUTER_API_KEY") or os.environ.get("OPENAI_API_KEY")
@@ -119,6 +207,7 @@ class R2EQueryEngine:
             if not self.api_key:
                 print("Warning: No OpenAI API key provided. LLM queries will not work.")
             else:
+                from openai import OpenAI
                 self.client = OpenAI(api_key=self.api_key)
     
     def load_data(self) -> bool:
@@ -153,7 +242,10 @@ class R2EQueryEngine:
                 }
                 for func in extracted_functions
             ])
+            # Stable row id so results can refer back to a function (e.g. to fetch its code later)
+            self.functions_df["function_id"] = np.arange(len(self.functions_df))
             
+            self.results.invalidate()
             print(f"Loaded {len(self.functions_df)} functions from {self.extracted_data_path}")
             return True
             
@@ -176,79 +268,146 @@ class R2EQueryEngine:
             return pd.DataFrame()
             
         keywords = keywords.lower().split()
+        if len(self.functions_df) == 0:
+            return self.functions_df.assign(relevance=0)
         
         # Create a simple relevance score based on keyword matches
-        def score_function(row):
+        def score_function(name, code):
             # Focus primarily on code and function name since docstring isn't available
-            text = f"{row['function_name']} {row['code']}".lower()
+            text = f"{name} {code}".lower()
             return sum(1 for keyword in keywords if keyword in text)
         
-        self.functions_df['relevance'] = self.functions_df.apply(score_function, axis=1)
-        results = self.functions_df[self.functions_df['relevance'] > 0].sort_values('relevance', ascending=False)
+        # Score into a separate Series so concurrent searches never write to the shared frame
+        relevance = pd.Series([score_function(name, code) for name, code in
+                               zip(self.functions_df['function_name'], self._codes(self.functions_df))],
+                              index=self.functions_df.index)
+        results = self.functions_df[relevance > 0].assign(relevance=relevance[relevance > 0])
+        results = results.sort_values('relevance', ascending=False)
         
         return results.reset_index(drop=True)
     
-    def semantic_search(self, query: str, limit: int = 10, arxiv_url: Optional[str] = None) -> pd.DataFrame:
+    def _codes(self, rows: pd.DataFrame) -> List[str]:
+        """Code of catalog rows, from ``code_lookup`` when the catalog has no code column."""
+        if 'code' in rows.columns:
+            return rows['code'].tolist()
+        return self.code_lookup(rows['function_id'].tolist())
+    
+    def _catalog_positions(self, repo: Optional[Union[str, List[str]]], path_prefix: Optional[str]):
+        """Row positions matching the scan filters, or None for every row."""
+        df = self.functions_df
+        mask = None
+        if repo is not None:
+            mask = df["repo_name"].isin([repo] if isinstance(repo, str) else list(repo)).to_numpy()
+        if path_prefix:
+            prefix_mask = df["file_path"].str.startswith(path_prefix).to_numpy(dtype=bool)
+            mask = prefix_mask if mask is None else mask & prefix_mask
+        return None if mask is None else np.flatnonzero(mask)
+    
+    def iter_functions(self, columns: Optional[List[str]] = None, repo: Optional[Union[str, List[str]]] = None,
+                       path_prefix: Optional[str] = None, batch_size: int = 1000) -> Iterator[pd.DataFrame]:
         """
-        Perform a semantic search using LLM to find relevant functions.
+        Stream the loaded catalog in batches, without any LLM call.
         
         Args:
-            query: Natural language query about code
-            limit: Maximum number of results to return
-            arxiv_url: Optional arXiv paper URL to include in context
+            columns: Columns to include (default: all); add "function_id" to refer back to rows
+            repo: Only functions from this repository (or any of these repositories)
+            path_prefix: Only functions whose file path starts with this prefix
+            batch_size: Maximum rows per batch
+            
+        Yields:
+            DataFrames of at most batch_size rows, keeping the catalog's index
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return
+        
+        columns = list(columns or self.functions_df.columns)
+        unknown = [column for column in columns if column not in self.functions_df.columns]
+        if unknown:
+            raise ValueError(f"Unknown catalog columns: {', '.join(unknown)}")
+        
+        projected = self.functions_df[columns]
+        positions = self._catalog_positions(repo, path_prefix)
+        total = len(projected) if positions is None else len(positions)
+        for start in range(0, total, max(1, batch_size)):
+            if positions is None:
+                yield projected.iloc[start:start + batch_size]
+            else:
+                yield projected.iloc[positions[start:start + batch_size]]
+    
+    def scan(self, columns: Optional[List[str]] = None, repo: Optional[Union[str, List[str]]] = None,
+             path_prefix: Optional[str] = None) -> pd.DataFrame:
+        """
+        Return the whole loaded catalog (optionally projected and filtered), without any LLM call.
+        
+        Args:
+            columns: Columns to include (default: all)
+            repo: Only functions from this repository (or any of these repositories)
+            path_prefix: Only functions whose file path starts with this prefix
             
         Returns:
-            DataFrame of matching functions ranked by relevance
+            DataFrame of matching functions
         """
         if self.functions_df is None:
             print("No data loaded. Call load_data() first.")
-            return pd.DataFrame()
+            return pd.DataFrame(columns=columns or [])
+        
+        batches = list(self.iter_functions(columns, repo, path_prefix, batch_size=max(1, len(self.functions_df))))
+        if not batches:
+            return self.functions_df[list(columns or self.functions_df.columns)].iloc[0:0]
+        return batches[0]
+    
+    def _fetch_arxiv_context(self, arxiv_url: str) -> str:
+        """
+        Fetch the abstract of an arXiv paper and format it as prompt context.
+        
+        Args:
+            arxiv_url: arXiv abstract or PDF URL
             
-        if not self.api_key:
-            print("No API key provided. Falling back to keyword search.")
-            return self.simple_keyword_search(query)
+        Returns:
+            Context string, or an empty string if the paper could not be fetched
+        """
+        # Shared with LivingDoc, so the paper is fetched once per process and cached on disk
+        paper = get_arxiv_cache().get(arxiv_url)
+        if paper is None:
+            return ""
         
-        # Fetch arXiv paper content if URL provided
-        arxiv_context = ""
-        if arxiv_url:
-            try:
-                import requests
-                from bs4 import BeautifulSoup
-
-                # Convert to PDF URL if not already
-                if "arxiv.org/abs/" in arxiv_url:
-                    paper_id = arxiv_url.split("/abs/")[1].split(".")[0]
-                    pdf_url = f"https://arxiv.org/pdf/{paper_id}.pdf"
-                elif "arxiv.org/pdf/" in arxiv_url:
-                    pdf_url = arxiv_url
-                else:
-                    print(f"Invalid arXiv URL format: {arxiv_url}")
-                    pdf_url = None
-                
-                if pdf_url:
-                    # Use the arxiv API to get metadata instead of parsing PDF
-                    # This is a more reliable way to get the abstract
-                    api_url = f"http://export.arxiv.org/api/query?id_list={paper_id}"
-                    response = requests.get(api_url)
-                    
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'xml')
-                        title = soup.find('title').text.strip()
-                        abstract = soup.find('summary').text.strip()
-                        authors = [author.find('name').text for author in soup.find_all('author')]
-                        
-                        arxiv_context = f"""
-ARXIV PAPER CONTEXT:
-Title: {title}
-Authors: {', '.join(authors)}
-URL: {arxiv_url}
-Abstract: {abstract}
-"""
-                        print(f"Successfully retrieved arXiv paper: {title}")
-            except Exception as e:
-                print(f"Error fetching arXiv paper: {e}")
-                # Continue without the paper context
+        print(f"Successfully retrieved arXiv paper: {paper['title']}")
+        return format_arxiv_context(paper, arxiv_url)
+    
+    def _search_duplicates(self, candidates: pd.DataFrame) -> Tuple[Dict[Any, List[str]], Set[Any]]:
+        """
+        Duplicate search candidates, fingerprinted once per loaded catalog.
+        
+        The candidates only depend on the catalog, so the groups are kept until
+        the catalog is reloaded or its file changes.
+        
+        Returns:
+            Map from each kept row label to the other repos holding a copy, and
+            the labels of the copies left out of the prompt
+        """
+        version = catalog_version(self.extracted_data_path)
+        cached = self._search_duplicates_cache
+        if cached is not None and cached[0] is self.functions_df and cached[1] == version:
+            return cached[2], cached[3]
+        
+        also_in = {}
+        skip = set()
+        labels = list(candidates.index)
+        groups = group_duplicates(self._codes(candidates), near=True,
+                                  keys=candidates['function_name'].tolist())
+        for group in groups:
+            repos_with_copy = []
+            for position in group[1:]:
+                repos_with_copy.append(candidates.loc[labels[position], 'repo_name'])
+                skip.add(labels[position])
+            also_in[labels[group[0]]] = list(dict.fromkeys(repos_with_copy))
         
+        self._search_duplicates_cache = (self.functions_df, version, also_in, skip)
+        return also_in, skip
+    
+    def _build_search_prompt(self, query: str, limit: int, arxiv_context: str = "") -> str:
+        """Build the semantic search prompt listing the candidate functions."""
         # Group functions by repo for context
         repos = self.functions_df['repo_name'].unique()
         
@@ -271,24 +430,34 @@ For each repository you'll analyze functions from, I will provide:
 REPOSITORIES:
 """
         
+        # Limit per repo to avoid token limits
+        candidates = self.functions_df.groupby('repo_name', sort=False).head(50)
+        
+        # List copies of the same function (same name and body) once, naming every other repo
+        also_in, skip = self._search_duplicates(candidates) if self.dedupe_prompts else ({}, set())
+        
         # Add information about each repository's functions
         for repo in repos:
-            repo_funcs = self.functions_df[self.functions_df['repo_name'] == repo].head(50)  # Limit per repo to avoid token limits
+            repo_funcs = candidates[candidates['repo_name'] == repo]
+            repo_funcs = repo_funcs[~repo_funcs.index.isin(skip)]
             
             if len(repo_funcs) == 0:
                 continue
                 
             prompt += f"\n=== Repository: {repo} ===\n"
             
-            for _, func in repo_funcs.iterrows():
+            for idx, func in repo_funcs.iterrows():
                 prompt += f"\nFunction: {func['function_name']}\n"
-                prompt += f"Signature: {func['signature']}\n"
+                if func['signature'] or not self.compact_prompts:
+                    prompt += f"Signature: {func['signature']}\n"
                 if func['docstring']:
                     # Truncate long docstrings
                     docstring = func['docstring']
                     if len(docstring) > 200:
                         docstring = docstring[:200] + "..."
                     prompt += f"Description: {docstring}\n"
+                if idx in also_in:
+                    prompt += f"Also in: {', '.join(also_in[idx])}\n"
         
         prompt += f"""
 Based on the information provided, identify the {limit} most relevant functions for the query.
@@ -311,15 +480,22 @@ Format your response as a JSON array with this structure:
 
 IMPORTANT: Only include functions that are genuinely relevant to the query.
 """
+        return prompt
+    
+    def _search_request(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat request (messages, format, temperature) for a search prompt."""
+        if not self.use_openrouter:
+            return {
+                "messages": [
+                    {"role": "system", "content": "You are a code analysis assistant that helps find relevant functions in repositories."},
+                    {"role": "user", "content": prompt}
+                ],
+                "response_format": {"type": "json_object"},
+                "temperature": 0.2
+            }
         
-        try:
-            if self.use_openrouter:
-                try:
-                    # Use OpenRouter client
-                    print("Making OpenRouter API request with OpenAI GPT-4o...")
-                    
-                    # Wrap the prompt to emphasize JSON format
-                    json_prompt = f"""
+        # Wrap the prompt to emphasize JSON format
+        json_prompt = f"""
 {prompt}
 
 CRITICAL: You MUST respond with valid JSON only. Your response must be a JSON object with a 'results' array containing objects with the fields: function_name, repo_name, relevance_score, and explanation.
@@ -336,124 +512,44 @@ Example response format:
   ]
 }}
 """
-                    
-                    # Try to use OpenAI GPT-4o if available
-                    try:
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-4o-2024-05-13",  # Using OpenAI GPT-4o
-                            messages=[
-                                {"role": "system", "content": "You are a code analysis assistant that helps find relevant functions in repositories. You MUST return valid JSON."},
-                                {"role": "user", "content": json_prompt}
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.2
-                        )
-                    except Exception as e:
-                        print(f"Failed to use GPT-4o: {e}, falling back to GPT-3.5")
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-3.5-turbo",  # Fallback to GPT-3.5-Turbo 
-                            messages=[
-                                {"role": "system", "content": "You are a code analysis assistant that helps find relevant functions in repositories. You MUST return valid JSON."},
-                                {"role": "user", "content": json_prompt}
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.2
-                        )
-                    
-                    # Print debug information
-                    print(f"OpenRouter response received with type: {type(response)}")
-                    
-                    # Parse the OpenRouter response
-                    if "choices" in response and len(response["choices"]) > 0:
-                        content = response["choices"][0]["message"]["content"]
-                        print(f"Content received: {content[:100]}...")
-                        try:
-                            parsed_content = json.loads(content)
-                            results = parsed_content.get("results", [])
-                        except json.JSONDecodeError as e:
-                            print(f"Error parsing content as JSON: {e}")
-                            print(f"Raw content: {content[:200]}...")
-                            # Fall back to keyword search
-                            return self.simple_keyword_search(query)
-                    else:
-                        print(f"Unexpected response structure: {response.keys()}")
-                        # Fall back to keyword search
-                        return self.simple_keyword_search(query)
-                except Exception as e:
-                    print(f"OpenRouter request failed: {e}")
-                    # Fall back to keyword search
-                    return self.simple_keyword_search(query)
-            else:
-                # Use OpenAI client
-                response = self.client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a code analysis assistant that helps find relevant functions in repositories."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.2
-                )
-                
-                # Parse the OpenAI response
-                content = response.choices[0].message.content
-                results = json.loads(content).get("results", [])
-            
-            # Match with our dataframe to get complete information
-            relevant_functions = []
-            for result in results:
-                func_name = result.get("function_name")
-                repo_name = result.get("repo_name")
-                
-                # Find the matching function in our dataframe
-                matches = self.functions_df[
-                    (self.functions_df['function_name'] == func_name) & 
-                    (self.functions_df['repo_name'] == repo_name)
-                ]
-                
-                if len(matches) > 0:
-                    func_data = matches.iloc[0].to_dict()
-                    func_data['relevance_score'] = result.get("relevance_score", 0)
-                    func_data['explanation'] = result.get("explanation", "")
-                    relevant_functions.append(func_data)
-            
-            # Convert to DataFrame and sort by relevance
-            results_df = pd.DataFrame(relevant_functions)
-            if len(results_df) > 0:
-                results_df = results_df.sort_values('relevance_score', ascending=False)
-            
-            return results_df
-            
-        except Exception as e:
-            print(f"Error performing semantic search: {e}")
-            return self.simple_keyword_search(query)
+        return {
+            "messages": [
+                {"role": "system", "content": "You are a code analysis assistant that helps find relevant functions in repositories. You MUST return valid JSON."},
+                {"role": "user", "content": json_prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.2
+        }
     
-    def generate_research_trajectories(self, query: str, num_trajectories: int = 3) -> List[Dict[str, Any]]:
-        """
-        Generate potential research trajectories based on a query and the available code.
-        
-        Args:
-            query: Research question or direction
-            num_trajectories: Number of research trajectories to generate
+    def _match_search_results(self, results: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Join LLM search results back onto the functions DataFrame."""
+        relevant_functions = []
+        for result in results:
+            func_name = result.get("function_name")
+            repo_name = result.get("repo_name")
             
-        Returns:
-            List of research trajectories with details
-        """
-        if self.functions_df is None:
-            print("No data loaded. Call load_data() first.")
-            return []
+            # Find the matching function in our dataframe
+            matches = self.functions_df[
+                (self.functions_df['function_name'] == func_name) & 
+                (self.functions_df['repo_name'] == repo_name)
+            ]
             
-        if not self.api_key:
-            print("API key required for generating research trajectories.")
-            return []
-        
-        # First, find relevant functions for this query
-        relevant_functions = self.semantic_search(query, limit=20)
+            if len(matches) > 0:
+                func_data = matches.iloc[0].to_dict()
+                func_data['relevance_score'] = result.get("relevance_score", 0)
+                func_data['explanation'] = result.get("explanation", "")
+                relevant_functions.append(func_data)
         
-        if len(relevant_functions) == 0:
-            print("No relevant functions found for this research query.")
-            return []
+        # Convert to DataFrame and sort by relevance
+        results_df = pd.DataFrame(relevant_functions)
+        if len(results_df) > 0:
+            results_df = results_df.sort_values('relevance_score', ascending=False)
         
+        return results_df
+    
+    def _build_research_prompt(self, query: str, relevant_functions: pd.DataFrame,
+                               num_trajectories: int) -> str:
+        """Build the research trajectory prompt from the relevant functions."""
         # Extract the most relevant functions with their details
         functions_context = []
         for _, func in relevant_functions.iterrows():
@@ -461,10 +557,28 @@ Example response format:
                 "name": func['function_name'],
                 "repo": func['repo_name'],
                 "signature": func['signature'],
-                "docstring": func['docstring'][:200] + "..." if len(func['docstring']) > 200 else func['docstring']
+                "docstring": func['docstring'][:200] + "..." if len(func['docstring']) > 200 else func['docstring'],
+                "code": func['code']
             })
         
-        prompt = f"""
+        # Collapse copies of the same function found in several repos
+        if self.dedupe_prompts:
+            for context in functions_context:
+                context["locations"] = [f"{context['name']} @ {context['repo']}"]
+            functions_context = dedupe_components(functions_context,
+                                                   keys=[context["name"] for context in functions_context])
+        for context in functions_context:
+            del context["code"]
+            if self.dedupe_prompts and len(context["locations"]) == 1:
+                del context["locations"]
+            # Compact prompts leave out empty fields
+            if self.compact_prompts:
+                for field in ("signature", "docstring"):
+                    if not context[field]:
+                        del context[field]
+        
+        indent = None if self.compact_prompts else 2
+        return f"""
 You are a research assistant helping to identify promising research trajectories 
 based on available code components. Given a research question and a set of functions 
 extracted from various repositories, suggest {num_trajectories} potential research 
@@ -473,7 +587,7 @@ trajectories.
 RESEARCH QUESTION: {query}
 
 AVAILABLE CODE COMPONENTS:
-{json.dumps(functions_context, indent=2)}
+{json.dumps(functions_context, indent=indent)}
 
 For each research trajectory, provide:
 1. A title for the research direction
@@ -502,15 +616,21 @@ IMPORTANT: The research trajectories should be novel, feasible given the availab
 components, and have clear potential for impact. They should also be distinct from 
 each other to explore different possibilities.
 """
+    
+    def _research_request(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat request for a research trajectory prompt."""
+        if not self.use_openrouter:
+            return {
+                "messages": [
+                    {"role": "system", "content": "You are a research assistant that helps identify promising research directions."},
+                    {"role": "user", "content": prompt}
+                ],
+                "response_format": {"type": "json_object"},
+                "temperature": 0.7  # Higher temperature for more creative research ideas
+            }
         
-        try:
-            if self.use_openrouter:
-                try:
-                    # Use OpenRouter client
-                    print("Making OpenRouter research request with Google Gemini...")
-                    
-                    # Wrap the prompt to emphasize JSON format
-                    json_prompt = f"""
+        # Wrap the prompt to emphasize JSON format
+        json_prompt = f"""
 {prompt}
 
 CRITICAL: You MUST respond with valid JSON only. Your response must be a JSON object with a 'trajectories' array containing objects with the fields specified in the prompt.
@@ -530,88 +650,17 @@ Example response format:
   ]
 }}
 """
-                    
-                    # Try to use OpenAI GPT-4o for research trajectory generation
-                    try:
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-4o-2024-05-13",  # Using OpenAI GPT-4o
-                            messages=[
-                                {"role": "system", "content": "You are a research assistant that helps identify promising and creative research directions. You MUST return valid JSON."},
-                                {"role": "user", "content": json_prompt}
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.7  # Higher temperature for more creative research ideas
-                        )
-                    except Exception as e:
-                        print(f"Failed to use GPT-4o for research generation: {e}, falling back to GPT-3.5")
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-3.5-turbo",  # Fallback to GPT-3.5-Turbo
-                            messages=[
-                                {"role": "system", "content": "You are a research assistant that helps identify promising research directions. You MUST return valid JSON."},
-                                {"role": "user", "content": json_prompt}
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.7  # Higher temperature for more creative research ideas
-                        )
-                    
-                    # Print debug information
-                    print(f"OpenRouter research response received")
-                    
-                    # Parse the OpenRouter response
-                    if "choices" in response and len(response["choices"]) > 0:
-                        content = response["choices"][0]["message"]["content"]
-                        try:
-                            parsed_content = json.loads(content)
-                            trajectories = parsed_content.get("trajectories", [])
-                        except json.JSONDecodeError as e:
-                            print(f"Error parsing research response as JSON: {e}")
-                            return []
-                    else:
-                        print(f"Unexpected research response structure")
-                        return []
-                except Exception as e:
-                    print(f"OpenRouter research request failed: {e}")
-                    return []
-            else:
-                # Use OpenAI client
-                response = self.client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a research assistant that helps identify promising research directions."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.7  # Higher temperature for more creative research ideas
-                )
-                
-                # Parse the OpenAI response
-                content = response.choices[0].message.content
-                trajectories = json.loads(content).get("trajectories", [])
-            
-            return trajectories
-            
-        except Exception as e:
-            print(f"Error generating research trajectories: {e}")
-            return []
+        return {
+            "messages": [
+                {"role": "system", "content": "You are a research assistant that helps identify promising and creative research directions. You MUST return valid JSON."},
+                {"role": "user", "content": json_prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.7  # Higher temperature for more creative research ideas
+        }
     
-    def generate_prototype(self, research_trajectory: Dict[str, Any]) -> str:
-        """
-        Generate a prototype implementation for a research trajectory.
-        
-        Args:
-            research_trajectory: A research trajectory dictionary
-            
-        Returns:
-            String containing prototype code
-        """
-        if self.functions_df is None:
-            print("No data loaded. Call load_data() first.")
-            return ""
-            
-        if not self.api_key:
-            print("API key required for generating prototype code.")
-            return ""
-        
+    def _build_prototype_prompt(self, research_trajectory: Dict[str, Any]) -> str:
+        """Build the prototype prompt with the code of the trajectory's existing components."""
         # Extract existing components that would be used
         existing_components = research_trajectory.get("existing_components", [])
         
@@ -624,18 +673,34 @@ Example response format:
                     "name": matches.iloc[0]['function_name'],
                     "signature": matches.iloc[0]['signature'],
                     "code": matches.iloc[0]['code'],
-                    "docstring": matches.iloc[0]['docstring']
+                    "docstring": matches.iloc[0]['docstring'],
+                    "locations": [f"{matches.iloc[0]['repo_name']}/{matches.iloc[0]['file_path']}"]
                 })
         
-        prompt = f"""
+        # Send each distinct body once per component name, listing every copy's location
+        if self.dedupe_prompts:
+            for detail in component_details:
+                detail["locations"] = [f"{detail['name']} @ {detail['locations'][0]}"]
+            component_details = dedupe_components(component_details,
+                                                   keys=[detail["name"] for detail in component_details])
+            for detail in component_details:
+                if len(detail["locations"]) == 1:
+                    del detail["locations"]
+        
+        if self.compact_prompts:
+            for detail in component_details:
+                detail["code"] = compact_code(detail["code"])
+        
+        indent = None if self.compact_prompts else 2
+        return f"""
 You are tasked with creating a prototype implementation for a research project. 
 I will provide you with a research trajectory and existing code components to leverage.
 
 RESEARCH TRAJECTORY:
-{json.dumps(research_trajectory, indent=2)}
+{json.dumps(research_trajectory, indent=indent)}
 
 EXISTING COMPONENTS TO USE:
-{json.dumps(component_details, indent=2)}
+{json.dumps(component_details, indent=indent)}
 
 Your task is to generate a prototype implementation that:
 1. Implements the core functionality needed for this research direction
@@ -650,72 +715,408 @@ the prototype functionality.
 
 FORMAT YOUR RESPONSE AS VALID PYTHON CODE ONLY, WITHOUT ANY ADDITIONAL EXPLANATION OR MARKDOWN.
 """
+    
+    def _prototype_request(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat request for a prototype prompt."""
+        if not self.use_openrouter:
+            return {
+                "messages": [
+                    {"role": "system", "content": "You are a research code generator that creates prototype implementations."},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.2  # Lower temperature for more focused code generation
+            }
         
-        try:
-            if self.use_openrouter:
-                try:
-                    # Use OpenRouter client
-                    print("Making OpenRouter prototype generation request with Google Gemini...")
-                    
-                    # Prepare the prompt for code generation
-                    code_prompt = f"""
+        # Prepare the prompt for code generation
+        code_prompt = f"""
 {prompt}
 
 IMPORTANT: Respond with ONLY valid Python code. Do not include any other text or explanations.
 The code should be well-structured, properly commented, and follow best practices.
 Include proper error handling and make the code modular and maintainable.
 """
-                    
-                    # Try to use OpenAI GPT-4o for code generation
-                    try:
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-4o-2024-05-13",  # Using OpenAI GPT-4o
-                            messages=[
-                                {"role": "system", "content": "You are a research code generator that creates prototype implementations. You excel at writing clean, efficient Python code. Respond with ONLY valid Python code."},
-                                {"role": "user", "content": code_prompt}
-                            ],
-                            temperature=0.2  # Lower temperature for more focused code generation
-                        )
-                    except Exception as e:
-                        print(f"Failed to use GPT-4o for code generation: {e}, falling back to GPT-3.5")
-                        response = self.client.chat_completions_create(
-                            model="openai/gpt-3.5-turbo",  # Fallback to GPT-3.5-Turbo
-                            messages=[
-                                {"role": "system", "content": "You are a research code generator that creates prototype implementations. Respond with ONLY valid Python code."},
-                                {"role": "user", "content": code_prompt}
-                            ],
-                            temperature=0.2  # Lower temperature for more focused code generation
-                        )
-                    
-                    # Print debug information
-                    print(f"OpenRouter prototype response received")
-                    
-                    # Return the generated code from OpenRouter
-                    if "choices" in response and len(response["choices"]) > 0:
-                        return response["choices"][0]["message"]["content"]
-                    else:
-                        print("Unexpected prototype response structure")
-                        return ""
-                except Exception as e:
-                    print(f"OpenRouter prototype request failed: {e}")
-                    return ""
-            else:
-                # Use OpenAI client
-                response = self.client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a research code generator that creates prototype implementations."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.2  # Lower temperature for more focused code generation
-                )
-                
-                # Return the generated code from OpenAI
-                return response.choices[0].message.content
+        return {
+            "messages": [
+                {"role": "system", "content": "You are a research code generator that creates prototype implementations. You excel at writing clean, efficient Python code. Respond with ONLY valid Python code."},
+                {"role": "user", "content": code_prompt}
+            ],
+            "temperature": 0.2  # Lower temperature for more focused code generation
+        }
+    
+    def _build_filter_prompt(self, condition: str, functions: pd.DataFrame) -> str:
+        """Build a prompt asking which functions of a batch satisfy a condition."""
+        blocks = []
+        for position, (_, func) in enumerate(functions.iterrows()):
+            code = func.get('code', '') or ''
+            if self.compact_prompts:
+                code = compact_code(code)
+            if len(code) > FILTER_CODE_CHARS:
+                code = code[:FILTER_CODE_CHARS] + "\n# ... (truncated)"
+            blocks.append(f"### id: {position}\nFunction: {func['function_name']} ({func.get('repo_name', '')})\n"
+                          f"```python\n{code}\n```")
+        
+        functions_text = "\n\n".join(blocks)
+        return f"""
+Decide for each function below whether it satisfies the condition.
+
+CONDITION: {condition}
+
+FUNCTIONS:
+{functions_text}
+
+Format your response as a JSON object with one entry per function id:
+{{
+  "results": [
+    {{"id": 0, "match": true}},
+    {{"id": 1, "match": false}},
+    ...
+  ]
+}}
+
+IMPORTANT: Answer for every id. Only mark a function as a match if it clearly satisfies the condition.
+"""
+    
+    def _filter_request(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat request for a filter verification prompt."""
+        if not self.use_openrouter:
+            return {
+                "messages": [
+                    {"role": "system", "content": "You are a code analysis assistant that checks functions against a filter condition."},
+                    {"role": "user", "content": prompt}
+                ],
+                "response_format": {"type": "json_object"},
+                "temperature": 0.0
+            }
+        
+        # Wrap the prompt to emphasize JSON format
+        json_prompt = f"""
+{prompt}
+
+CRITICAL: You MUST respond with valid JSON only. Your response must be a JSON object with a 'results' array containing objects with the fields id and match.
+"""
+        return {
+            "messages": [
+                {"role": "system", "content": "You are a code analysis assistant that checks functions against a filter condition. You MUST return valid JSON."},
+                {"role": "user", "content": json_prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.0
+        }
+    
+    def _call_model(self, operation: str, model: str, request: Dict[str, Any], verbose: bool = True):
+        """Call one model through the rate limiter and record its telemetry."""
+        if self.use_openrouter:
+            func = lambda: self.client.chat_completions_create(model=model, verbose=verbose, **request)
+        else:
+            func = lambda: self.client.chat.completions.create(model=model, **request)
+        
+        stats = {}
+        started = time.monotonic()
+        try:
+            response = self.limiter.call(func, request, stats, operation, verbose)
+        except Exception as e:
+            self.telemetry.record(self.exp_id, operation, model, time.monotonic() - started,
+                                  request, retries=stats.get("retries", 0), error=str(e))
+            raise
+        
+        self.telemetry.record(self.exp_id, operation, model, time.monotonic() - started,
+                              request, response, retries=stats.get("retries", 0))
+        return response
+    
+    def _complete(self, operation: str, request: Dict[str, Any], verbose: bool = True) -> Optional[str]:
+        """
+        Send a chat request to the configured provider.
+        
+        The operation's route decides which models are tried; a slow primary
+        is hedged with the next model and the first answer wins. Every call
+        waits for the shared rate limiter and is retried on 429.
+        
+        Args:
+            operation: Name of the calling operation (search/research/prototype/filter)
+            request: Chat request built by one of the ``_*_request`` helpers
+            verbose: Whether to print progress (off for background work)
+            
+        Returns:
+            The response content, or None if the response had no choices
+        """
+        response = self.router.complete(operation, lambda model: self._call_model(operation, model, request, verbose),
+                                        verbose=verbose)
+        
+        if self.use_openrouter and verbose:
+            print(f"OpenRouter {operation} response received")
+        
+        return response_content(response)
+    
+    def _parse_json_list(self, content: Optional[str], key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Parse a JSON object response and return the list stored under ``key``.
+        
+        Returns:
+            The parsed list, or None if the content is missing or not valid JSON
+        """
+        if content is None:
+            print("Unexpected response structure")
+            return None
+        
+        try:
+            return json.loads(content).get(key, [])
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"Error parsing content as JSON: {e}")
+            print(f"Raw content: {content[:200]}...")
+            return None
+    
+    def _search_key(self, query: str, arxiv_url: Optional[str] = None) -> tuple:
+        return (" ".join(query.lower().split()), arxiv_url or "")
+    
+    def _stored_search(self, query: str, limit: int, arxiv_url: Optional[str] = None,
+                       any_limit: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Search results for the same query from earlier in the session, if any.
+        
+        Args:
+            query: Natural language query about code
+            limit: Number of results wanted
+            arxiv_url: arXiv paper URL the search was run with
+            any_limit: Accept a stored search that asked for fewer results
+            
+        Returns:
+            Up to ``limit`` stored results, or None if the search must be run
+        """
+        entry = self.results.get("search", self._search_key(query, arxiv_url))
+        if entry is None:
+            return None
+        stored_limit, results = entry
+        if stored_limit < limit and not any_limit:
+            return None
+        self.telemetry.record(self.exp_id, "search", self.router.routes["search"]["models"][0], 0.0,
+                              cache_hit=True)
+        return results.head(limit).copy()
+    
+    def _store_search(self, query: str, limit: int, arxiv_url: Optional[str], results: pd.DataFrame):
+        self.results.put("search", self._search_key(query, arxiv_url), (limit, results.copy()))
+    
+    def semantic_search(self, query: str, limit: int = 10, arxiv_url: Optional[str] = None,
+                        keyword_fallback: bool = True) -> pd.DataFrame:
+        """
+        Perform a semantic search using LLM to find relevant functions.
+        
+        Args:
+            query: Natural language query about code
+            limit: Maximum number of results to return
+            arxiv_url: Optional arXiv paper URL to include in context
+            keyword_fallback: Fall back to keyword search when the LLM search fails
+                (otherwise the failure is raised)
             
+        Returns:
+            DataFrame of matching functions ranked by relevance
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return pd.DataFrame()
+            
+        if not self.api_key:
+            if not keyword_fallback:
+                raise Exception("API key required for semantic search.")
+            print("No API key provided. Falling back to keyword search.")
+            return self.simple_keyword_search(query)
+        
+        stored = self._stored_search(query, limit, arxiv_url)
+        if stored is not None:
+            return stored
+        
+        # Fetch arXiv paper content if URL provided
+        arxiv_context = self._fetch_arxiv_context(arxiv_url) if arxiv_url else ""
+        
+        prompt = self._build_search_prompt(query, limit, arxiv_context)
+        
+        try:
+            if self.use_openrouter:
+                print("Making OpenRouter API request with OpenAI GPT-4o...")
+            content = self._complete("search", self._search_request(prompt))
         except Exception as e:
-            print(f"Error generating prototype code: {e}")
+            if not keyword_fallback:
+                raise
+            print(f"Error performing semantic search: {e}")
+            return self.simple_keyword_search(query)
+        
+        results = self._parse_json_list(content, "results")
+        if results is None:
+            if not keyword_fallback:
+                raise Exception("Could not parse the semantic search response.")
+            # Fall back to keyword search
+            return self.simple_keyword_search(query)
+        
+        matched = self._match_search_results(results)
+        self._store_search(query, limit, arxiv_url, matched)
+        return matched
+    
+    def generate_research_trajectories(self, query: str, num_trajectories: int = 3) -> List[Dict[str, Any]]:
+        """
+        Generate potential research trajectories based on a query and the available code.
+        
+        Args:
+            query: Research question or direction
+            num_trajectories: Number of research trajectories to generate
+            
+        Returns:
+            List of research trajectories with details
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
+            return []
+            
+        if not self.api_key:
+            print("API key required for generating research trajectories.")
+            return []
+        
+        # First, find relevant functions for this query (reusing a search from this session)
+        relevant_functions = self._stored_search(query, 20, any_limit=True)
+        if relevant_functions is None:
+            relevant_functions = self.semantic_search(query, limit=20)
+        
+        if len(relevant_functions) == 0:
+            print("No relevant functions found for this research query.")
+            return []
+        
+        prompt = self._build_research_prompt(query, relevant_functions, num_trajectories)
+        
+        try:
+            if self.use_openrouter:
+                print("Making OpenRouter research request with OpenAI GPT-4o...")
+            content = self._complete("research", self._research_request(prompt))
+        except Exception as e:
+            print(f"Error generating research trajectories: {e}")
+            return []
+        
+        return self._parse_json_list(content, "trajectories") or []
+    
+    def verify_filter(self, condition: str, functions: pd.DataFrame, batch_size: int = 20,
+                      max_workers: int = 4) -> List[bool]:
+        """
+        Ask the LLM which functions satisfy a condition, several functions per prompt.
+        
+        Args:
+            condition: Natural language filter condition
+            functions: Functions to check (function_name, repo_name and code columns)
+            batch_size: Functions per prompt
+            max_workers: Prompts in flight at once (all share the rate limiter)
+            
+        Returns:
+            One bool per row of ``functions``; rows the model gave no answer for count as not matching
+        """
+        if not self.api_key:
+            raise Exception("API key required for LLM filter verification.")
+        
+        def verify(start):
+            batch = functions.iloc[start:start + batch_size]
+            try:
+                content = self._complete("filter", self._filter_request(self._build_filter_prompt(condition, batch)))
+            except Exception as e:
+                print(f"Error verifying filter batch: {e}")
+                return [False] * len(batch)
+            answers = {}
+            for answer in self._parse_json_list(content, "results") or []:
+                try:
+                    answers[int(answer.get("id"))] = answer.get("match") is True
+                except (TypeError, ValueError, AttributeError):
+                    continue
+            return [answers.get(i, False) for i in range(len(batch))]
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            batches = list(executor.map(verify, range(0, len(functions), batch_size)))
+        return [match for batch in batches for match in batch]
+    
+    def generate_prototype(self, research_trajectory: Dict[str, Any], verbose: bool = True) -> str:
+        """
+        Generate a prototype implementation for a research trajectory.
+        
+        Args:
+            research_trajectory: A research trajectory dictionary
+            verbose: Whether to print request progress and errors (off for prefetches,
+                whose failures are retried in the foreground)
+            
+        Returns:
+            String containing prototype code
+        """
+        if self.functions_df is None:
+            print("No data loaded. Call load_data() first.")
             return ""
+            
+        if not self.api_key:
+            print("API key required for generating prototype code.")
+            return ""
+        
+        prompt = self._build_prototype_prompt(research_trajectory)
+        
+        try:
+            if self.use_openrouter and verbose:
+                print("Making OpenRouter prototype generation request with OpenAI GPT-4o...")
+            content = self._complete("prototype", self._prototype_request(prompt), verbose)
+        except Exception as e:
+            if verbose:
+                print(f"Error generating prototype code: {e}")
+            return ""
+        
+        if content is None:
+            if verbose:
+                print("Unexpected prototype response structure")
+            return ""
+        
+        return content
+    
+    def _trajectory_key(self, trajectory: Dict[str, Any]) -> str:
+        return json.dumps(trajectory, sort_keys=True, default=str)
+    
+    def start_prototype_prefetch(self, trajectories: List[Dict[str, Any]], count: Optional[int] = None):
+        """
+        Start generating prototypes for the top trajectories in the background.
+        
+        Prototypes are generated one at a time, in trajectory order, so the one
+        the user is most likely to ask for first is ready first.
+        
+        Args:
+            trajectories: Research trajectories, best first
+            count: Number of trajectories to prefetch (default: self.prefetch_prototypes)
+        """
+        count = self.prefetch_prototypes if count is None else count
+        if count <= 0 or not self.api_key:
+            return
+        
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prototype-prefetch")
+        
+        for trajectory in trajectories[:count]:
+            key = self._trajectory_key(trajectory)
+            if key not in self._prototype_futures:
+                self._prototype_futures[key] = self._prefetch_executor.submit(
+                    self.generate_prototype, trajectory, False)
+    
+    def cancel_prototype_prefetch(self):
+        """Drop prefetched prototypes that have not started yet."""
+        for key, future in list(self._prototype_futures.items()):
+            if future.cancel():
+                del self._prototype_futures[key]
+    
+    def get_prototype(self, research_trajectory: Dict[str, Any]) -> str:
+        """
+        Return the prototype for a trajectory, using a prefetched one when available.
+        
+        Args:
+            research_trajectory: A research trajectory dictionary
+            
+        Returns:
+            String containing prototype code
+        """
+        future = self._prototype_futures.get(self._trajectory_key(research_trajectory))
+        if future is not None and not future.cancelled():
+            if not future.done():
+                print("Waiting for prototype already being generated in the background...")
+            code = future.result()
+            if code:
+                return code
+            # Failed prefetches are retried in the foreground
+            del self._prototype_futures[self._trajectory_key(research_trajectory)]
+        return self.generate_prototype(research_trajectory)
     
     def interactive_mode(self):
         """Start an interactive query session."""
@@ -727,6 +1128,7 @@ Include proper error handling and make the code modular and maintainable.
             command = input("\nCommand (search/research/prototype/help/exit): ").strip().lower()
             
             if command == 'exit':
+                self.cancel_prototype_prefetch()
                 break
                 
             elif command == 'help':
@@ -781,6 +1183,10 @@ Include proper error handling and make the code modular and maintainable.
                 if not self.current_trajectories:
                     print("Failed to generate research trajectories.")
                 else:
+                    # New trajectories replace the old ones; stop work nobody will ask for
+                    self.cancel_prototype_prefetch()
+                    self.start_prototype_prefetch(self.current_trajectories)
+                    
                     print(f"\nGenerated {len(self.current_trajectories)} research trajectories:")
                     for i, trajectory in enumerate(self.current_trajectories):
                         print(f"\n{i+1}. {trajectory['title']}")
@@ -825,7 +1231,7 @@ Include proper error handling and make the code modular and maintainable.
                     if hasattr(self, 'current_trajectories') and 0 <= idx < len(self.current_trajectories):
                         trajectory = self.current_trajectories[idx]
                         print(f"\nGenerating prototype for: {trajectory['title']}")
-                        code = self.generate_prototype(trajectory)
+                        code = self.get_prototype(trajectory)
                         
                         if code:
                             print("\n=== Generated Prototype ===\n")
@@ -848,9 +1254,54 @@ Include proper error handling and make the code modular and maintainable.
             else:
                 print("Unknown command. Type 'help' for available commands.")
 
+def print_search_results(results: pd.DataFrame, show_code: bool = False, file=None):
+    """
+    Print search results with code snippets for the top 3 (or full code).
+    
+    Args:
+        results: Results from semantic_search or simple_keyword_search
+        show_code: Show full code for every result
+        file: Stream to print to (default: sys.stdout)
+    """
+    if len(results) == 0:
+        print("No matching functions found.", file=file)
+        return
+    
+    print(f"\nFound {len(results)} relevant functions:", file=file)
+    for i, (_, func) in enumerate(results.iterrows()):
+        print(f"\n{i+1}. {func['function_name']} ({func['repo_name']})", file=file)
+        if 'relevance_score' in func:
+            print(f"   Relevance: {func['relevance_score']}/10", file=file)
+        if 'explanation' in func:
+            print(f"   Why: {func['explanation']}", file=file)
+        
+        # Show code (full or snippet)
+        if func['code']:
+            if show_code:
+                # Show full code
+                print(f"\n   Code:\n   {func['code'].replace(chr(10), chr(10)+'   ')}", file=file)
+            elif i < 3:
+                # Show snippet for top 3 results
+                code_snippet = func['code'][:200] + "..." if len(func['code']) > 200 else func['code']
+                print(f"\n   Code snippet:\n   {code_snippet.replace(chr(10), chr(10)+'   ')}", file=file)
+
+def print_trajectories(trajectories: List[Dict[str, Any]]):
+    """
+    Print a summary of generated research trajectories.
+    
+    Args:
+        trajectories: Results from generate_research_trajectories
+    """
+    print(f"\nGenerated {len(trajectories)} research trajectories:")
+    for i, trajectory in enumerate(trajectories):
+        print(f"\n{i+1}. {trajectory['title']}")
+        print(f"   Core Question: {trajectory['core_question']}")
+        print(f"   Rationale: {trajectory['rationale'][:100]}...")
+        print(f"   Existing Components: {', '.join(trajectory['existing_components'])}")
+
 def main():
     parser = argparse.ArgumentParser(description="R2E Query Engine - A tool for semantic querying of code extracted with R2E")
-    parser.add_argument("--exp_id", type=str, required=True, help="R2E experiment ID")
+    parser.add_argument("--exp_id", type=str, help="R2E experiment ID (required unless --batch lines name their own)")
     parser.add_argument("--api_key", type=str, help="API key (will use environment variable if not provided)")
     parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API instead of OpenAI")
     parser.add_argument("--interactive", action="store_true", help="Start interactive mode")
@@ -861,11 +1312,73 @@ def main():
     parser.add_argument("--document", action="store_true", help="Add results to living documentation")
     parser.add_argument("--no-document", action="store_true", help="Don't add results to living documentation")
     parser.add_argument("--arxiv", type=str, help="ArXiv paper URL to include as context")
+    parser.add_argument("--offline-arxiv", action="store_true", help="Only use arXiv papers already in the local cache")
+    parser.add_argument("--routes", type=str, help="JSON file with per-operation model routes (models, hedge_after, timeout)")
+    parser.add_argument("--routing-stats", action="store_true", help="Print per-model latency and circuit state on exit")
+    parser.add_argument("--no-dedupe", action="store_true", help="List duplicate function bodies separately in prompts")
+    parser.add_argument("--compact-prompts", action="store_true", help="Strip comments, whitespace and empty fields from prompts")
+    parser.add_argument("--prefetch-prototypes", type=int, default=0, metavar="N",
+                        help="In interactive mode, generate prototypes for the top N trajectories in the background")
+    parser.add_argument("--batch", type=str, help="Run queries from a JSONL file offline (see batch_runner.py)")
+    parser.add_argument("--output", type=str, help="Output JSONL for --batch (default: <batch>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum queries in flight for --batch")
+    parser.add_argument("--include-code", action="store_true", help="Include function code in --batch results")
+    parser.add_argument("--provider-batch", action="store_true", help="Submit --batch through the provider's batch endpoint")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between provider batch status checks")
+    parser.add_argument("--no-server", action="store_true", help="Run locally even if a query server is running")
     
     args = parser.parse_args()
     
+    if args.batch:
+        from batch_runner import run_batch
+        failed = run_batch(args)
+        sys.exit(1 if failed else 0)
+    
+    if not args.exp_id:
+        parser.error("--exp_id is required")
+    
+    # One-shot queries go to a running query server unless they need engine settings
+    # the shared server cannot change per request (the provider is forwarded)
+    local_settings = (args.routes or args.api_key or args.no_dedupe or args.compact_prompts
+                      or args.offline_arxiv)
+    if (args.query or args.research) and not (args.interactive or args.no_server or local_settings):
+        from query_server import get_server
+        server = get_server()
+        if server is not None:
+            should_document = args.document or not args.no_document
+            try:
+                if args.research:
+                    print(f"Generating research trajectories for: {args.research} (query server)")
+                    trajectories = server.research(args.exp_id, args.research, document=should_document,
+                                                   use_openrouter=args.use_openrouter)
+                    if trajectories:
+                        print_trajectories(trajectories)
+                    else:
+                        print("Failed to generate research trajectories.")
+                else:
+                    print(f"Searching for: {args.query} (query server)")
+                    results = server.search(args.exp_id, args.query, arxiv_url=args.arxiv, document=should_document,
+                                            use_openrouter=args.use_openrouter)
+                    print_search_results(results, args.show_code)
+                return
+            except Exception as e:
+                print(f"Query server error ({e}); running locally")
+    
     # Initialize the query engine
-    engine = R2EQueryEngine(args.exp_id, args.api_key, args.use_openrouter)
+    routes = None
+    if args.routes:
+        models = [OPENROUTER_PRIMARY_MODEL, OPENROUTER_FALLBACK_MODEL] if args.use_openrouter else [OPENAI_MODEL]
+        routes = load_routes(args.routes, default_routes(models))
+    engine = R2EQueryEngine(args.exp_id, args.api_key, args.use_openrouter, routes=routes)
+    engine.dedupe_prompts = not args.no_dedupe
+    engine.compact_prompts = args.compact_prompts
+    engine.prefetch_prototypes = args.prefetch_prototypes
+    
+    # Fetch the arXiv paper while the catalog loads
+    if args.offline_arxiv:
+        get_arxiv_cache().offline = True
+    if args.arxiv:
+        get_arxiv_cache().prefetch(args.arxiv)
     
     # Load the extracted data
     if not engine.load_data():
@@ -881,12 +1394,7 @@ def main():
         if not trajectories:
             print("Failed to generate research trajectories.")
         else:
-            print(f"\nGenerated {len(trajectories)} research trajectories:")
-            for i, trajectory in enumerate(trajectories):
-                print(f"\n{i+1}. {trajectory['title']}")
-                print(f"   Core Question: {trajectory['core_question']}")
-                print(f"   Rationale: {trajectory['rationale'][:100]}...")
-                print(f"   Existing Components: {', '.join(trajectory['existing_components'])}")
+            print_trajectories(trajectories)
             
             # Document research trajectories if requested
             should_document = args.document or (not args.no_document and not args.interactive)
@@ -910,27 +1418,8 @@ def main():
         
         results = engine.semantic_search(args.query, arxiv_url=arxiv_url)
         
-        if len(results) == 0:
-            print("No matching functions found.")
-        else:
-            print(f"\nFound {len(results)} relevant functions:")
-            for i, (_, func) in enumerate(results.iterrows()):
-                print(f"\n{i+1}. {func['function_name']} ({func['repo_name']})")
-                if 'relevance_score' in func:
-                    print(f"   Relevance: {func['relevance_score']}/10")
-                if 'explanation' in func:
-                    print(f"   Why: {func['explanation']}")
-                
-                # Show code (full or snippet)
-                if func['code']:
-                    if args.show_code:
-                        # Show full code
-                        print(f"\n   Code:\n   {func['code'].replace(chr(10), chr(10)+'   ')}")
-                    elif i < 3:
-                        # Show snippet for top 3 results
-                        code_snippet = func['code'][:200] + "..." if len(func['code']) > 200 else func['code']
-                        print(f"\n   Code snippet:\n   {code_snippet.replace(chr(10), chr(10)+'   ')}")
-            
+        print_search_results(results, args.show_code)
+        if len(results) > 0:
             # Document search results if requested
             should_document = args.document or (not args.no_document and not args.interactive)
             if should_document:
@@ -946,6 +1435,9 @@ def main():
     else:
         print("No action specified. Use --interactive, --query, or --research")
         parser.print_help()
+    
+    if args.routing_stats:
+        engine.router.print_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter - Cross-process token bucket and adaptive concurrency for LLM calls
+
+All of a user's processes on a host share one bucket per provider,
+stored in a small JSON state file (under RATE_LIMIT_DIR) guarded by an
+exclusive file lock. The bucket covers both requests/min and tokens/min.
+A 429 sets a shared cooldown that every process honours, and each process
+adapts its number of in-flight requests per provider AIMD-style: +1/limit
+per fast success, halved on 429 or on a success slower than the
+operation's latency target. Other failures leave the limit unchanged.
+Async callers use AsyncAdaptiveConcurrency, whose waiters sleep until a
+slot frees instead of polling; the async engine sizes it from its
+connection pool.
+
+Limits come from the R2E_LLM_RPM and R2E_LLM_TPM environment variables so
+that worker processes inherit them.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a process-local lock
+    fcntl = None
+
+DEFAULT_RPM = 120
+DEFAULT_TPM = 400000
+
+# Per-user directory for the shared bucket state files
+RATE_LIMIT_DIR = os.environ.get(
+    "R2E_RATE_LIMIT_DIR",
+    os.path.expanduser("~/buckets/r2e_bucket/ratelimit")
+)
+
+# Successful calls slower than this (seconds) count as congestion, by operation
+LATENCY_TARGETS = {
+    "search": 30.0,
+    "research": 60.0,
+    "prototype": 180.0,
+    "filter": 30.0,
+}
+DEFAULT_LATENCY_TARGET = 30.0
+
+class RateLimitError(Exception):
+    """Raised by a client when the provider answers 429 Too Many Requests."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception from any client signals HTTP 429."""
+    if isinstance(error, RateLimitError):
+        return True
+    return getattr(error, "status_code", None) == 429 or getattr(error, "status", None) == 429
+
+def estimate_request_tokens(request: Dict[str, Any], completion_tokens: int = 1000) -> int:
+    """
+    Estimate the tokens a chat request will consume (~4 characters per token).
+
+    Args:
+        request: Chat request with a ``messages`` list
+        completion_tokens: Expected completion size if ``max_tokens`` is not set
+
+    Returns:
+        Estimated prompt plus completion tokens
+    """
+    chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+    return chars // 4 + (request.get("max_tokens") or completion_tokens)
+
+def response_tokens(response) -> Optional[int]:
+    """Total tokens reported in a chat completion response, if any."""
+    if isinstance(response, dict):
+        return (response.get("usage") or {}).get("total_tokens")
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+class SharedTokenBucket:
+    """Requests/min and tokens/min buckets shared through a locked state file."""
+
+    def __init__(self, name: str, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 state_dir: Optional[str] = None):
+        """
+        Initialize the shared bucket.
+
+        Args:
+            name: Bucket name (one per provider)
+            rpm: Requests allowed per minute across all processes
+            tpm: Tokens allowed per minute across all processes
+            state_dir: Directory holding the state file (default: RATE_LIMIT_DIR)
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        state_dir = state_dir or RATE_LIMIT_DIR
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, f"llm_ratelimit_{name}.json")
+        self._local_lock = threading.Lock()
+
+    def _update(self, mutate: Callable[[Dict[str, float], float], Any]) -> Any:
+        """Read, refill, mutate and write the state under an exclusive lock."""
+        with self._local_lock:
+            with open(self.path, "a+") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "{}")
+                    except json.JSONDecodeError:
+                        state = {}
+
+                    now = time.time()
+                    elapsed = max(0.0, now - state.get("updated", now))
+                    state["requests"] = min(self.rpm, state.get("requests", self.rpm) + elapsed * self.rpm / 60.0)
+                    state["tokens"] = min(self.tpm, state.get("tokens", self.tpm) + elapsed * self.tpm / 60.0)
+                    state["updated"] = now
+                    state.setdefault("cooldown_until", 0.0)
+
+                    result = mutate(state, now)
+
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self, tokens: int) -> float:
+        """
+        Take one request and ``tokens`` tokens if available.
+
+        Returns:
+            0.0 on success, otherwise the number of seconds to wait before retrying
+        """
+        # A single request larger than the whole bucket can still go through once it is full
+        tokens = min(tokens, self.tpm)
+
+        def mutate(state, now):
+            if state["cooldown_until"] > now:
+                return state["cooldown_until"] - now
+            if state["requests"] >= 1 and state["tokens"] >= tokens:
+                state["requests"] -= 1
+                state["tokens"] -= tokens
+                return 0.0
+            wait_requests = (1 - state["requests"]) * 60.0 / self.rpm
+            wait_tokens = (tokens - state["tokens"]) * 60.0 / self.tpm
+            return max(wait_requests, wait_tokens, 0.01)
+
+        return self._update(mutate)
+
+    def acquire(self, tokens: int):
+        """Block until a request slot and ``tokens`` tokens are available."""
+        while True:
+            wait_for = self.try_acquire(tokens)
+            if wait_for <= 0:
+                return
+            time.sleep(wait_for + random.uniform(0, 0.05))
+
+    async def aacquire(self, tokens: int):
+        """Async counterpart of ``acquire``; the locked state file is read off the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            wait_for = await loop.run_in_executor(None, self.try_acquire, tokens)
+            if wait_for <= 0:
+                return
+            await asyncio.sleep(wait_for + random.uniform(0, 0.05))
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token balance once the actual usage is known."""
+        if actual is None or actual == estimated:
+            return
+
+        def mutate(state, now):
+            state["tokens"] = min(self.tpm, state["tokens"] + estimated - actual)
+
+        self._update(mutate)
+
+    def cool_down(self, seconds: float):
+        """Pause every process sharing this bucket for ``seconds``."""
+        def mutate(state, now):
+            state["cooldown_until"] = max(state["cooldown_until"], now + seconds)
+            state["requests"] = 0.0
+
+        self._update(mutate)
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests driven by 429s and latency."""
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 latency_target: float = DEFAULT_LATENCY_TARGET):
+        """
+        Initialize the concurrency controller.
+
+        Args:
+            initial: Starting limit
+            minimum: Lowest the limit may drop to
+            maximum: Highest the limit may grow to
+            latency_target: Successes slower than this count as congestion (unless overridden per release)
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False,
+                latency_target: Optional[float] = None):
+        """
+        Release a slot and adapt the limit from the outcome.
+
+        Args:
+            latency: Duration of a successful call; None for a failed or
+                cancelled one, which leaves the limit unchanged unless throttled
+            throttled: Whether the call was answered with 429
+            latency_target: Slow-success threshold for this call (default: self.latency_target)
+        """
+        target = self.latency_target if latency_target is None else latency_target
+        with self._cond:
+            self.in_flight -= 1
+            if throttled or (latency is not None and latency > target):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+class AsyncAdaptiveConcurrency(AdaptiveConcurrency):
+    """AdaptiveConcurrency for the coroutines of one event loop; waiters are woken, not polled."""
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 latency_target: float = DEFAULT_LATENCY_TARGET):
+        super().__init__(initial, minimum, maximum, latency_target)
+        self._waiters: deque = deque()
+
+    def _wake(self):
+        """Wake as many waiters as there are free slots."""
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def aacquire(self):
+        """Wait for a slot; must be called from the loop that releases the slots."""
+        while not self.try_acquire():
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # A wake-up this waiter can no longer use goes to the next one
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False,
+                latency_target: Optional[float] = None):
+        super().release(latency, throttled, latency_target)
+        self._wake()
+
+_shared_concurrency: Dict[str, AdaptiveConcurrency] = {}
+_shared_lock = threading.Lock()
+
+def shared_concurrency(name: str) -> AdaptiveConcurrency:
+    """The process-wide concurrency controller for a provider."""
+    with _shared_lock:
+        if name not in _shared_concurrency:
+            _shared_concurrency[name] = AdaptiveConcurrency()
+        return _shared_concurrency[name]
+
+class LLMRateLimiter:
+    """Shared token bucket plus adaptive concurrency around each LLM call."""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_retries: int = 5, state_dir: Optional[str] = None,
+                 async_concurrency: Optional[AsyncAdaptiveConcurrency] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Provider name; processes using the same name share limits
+            rpm: Requests/min (default: R2E_LLM_RPM or DEFAULT_RPM)
+            tpm: Tokens/min (default: R2E_LLM_TPM or DEFAULT_TPM)
+            max_retries: Retries after a 429 before the error is raised
+            state_dir: Directory holding the shared state file
+            async_concurrency: In-flight limit for ``acall`` (default: one with the
+                AdaptiveConcurrency defaults, created on first use)
+        """
+        rpm = rpm or float(os.environ.get("R2E_LLM_RPM", DEFAULT_RPM))
+        tpm = tpm or float(os.environ.get("R2E_LLM_TPM", DEFAULT_TPM))
+        self.bucket = SharedTokenBucket(name, rpm, tpm, state_dir)
+        # Every limiter for this provider in the process shares one in-flight limit
+        self.concurrency = shared_concurrency(name)
+        # Async calls wait on their event loop instead of the threads' condition
+        self.async_concurrency = async_concurrency
+        self.max_retries = max_retries
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return float(retry_after)
+        return min(60.0, 2.0 ** attempt) + random.uniform(0, 1)
+
+    def call(self, func: Callable[[], Any], request: Dict[str, Any],
+             stats: Optional[Dict[str, Any]] = None, operation: Optional[str] = None,
+             verbose: bool = True) -> Any:
+        """
+        Run ``func`` once the limits allow, retrying on 429.
+
+        Args:
+            func: Performs the LLM request and returns the response
+            request: The chat request, used to estimate token usage
+            stats: Optional dict; its "retries" key is set to the retry count
+            operation: Calling operation, selecting the latency target (see LATENCY_TARGETS)
+            verbose: Whether to print back-offs
+
+        Returns:
+            The response from ``func``
+        """
+        estimated = estimate_request_tokens(request)
+        attempt = 0
+        stats = stats if stats is not None else {}
+        while True:
+            stats["retries"] = attempt
+            self.bucket.acquire(estimated)
+            self.concurrency.acquire()
+            started = time.monotonic()
+            try:
+                response = func()
+            except Exception as e:
+                # Only a 429 says something about capacity; other failures leave the limit alone
+                throttled = is_rate_limit_error(e)
+                self.concurrency.release(throttled=throttled)
+                if not throttled or attempt >= self.max_retries:
+                    raise
+                wait_for = self._backoff(e, attempt)
+                if verbose:
+                    print(f"Rate limited (429), backing off {wait_for:.1f}s")
+                self.bucket.cool_down(wait_for)
+                attempt += 1
+                continue
+            self.concurrency.release(time.monotonic() - started,
+                                     latency_target=LATENCY_TARGETS.get(operation, DEFAULT_LATENCY_TARGET))
+            self.bucket.settle(estimated, response_tokens(response))
+            return response
+
+    async def acall(self, func: Callable[[], Awaitable[Any]], request: Dict[str, Any],
+                    stats: Optional[Dict[str, Any]] = None, operation: Optional[str] = None) -> Any:
+        """Async counterpart of ``call``; state file updates run in the default executor."""
+        loop = asyncio.get_running_loop()
+        if self.async_concurrency is None:
+            self.async_concurrency = AsyncAdaptiveConcurrency()
+        concurrency = self.async_concurrency
+        estimated = estimate_request_tokens(request)
+        attempt = 0
+        stats = stats if stats is not None else {}
+        while True:
+            stats["retries"] = attempt
+            await self.bucket.aacquire(estimated)
+            await concurrency.aacquire()
+            started = time.monotonic()
+            try:
+                response = await func()
+            except asyncio.CancelledError:
+                concurrency.release()
+                raise
+            except Exception as e:
+                # Only a 429 says something about capacity; other failures leave the limit alone
+                throttled = is_rate_limit_error(e)
+                concurrency.release(throttled=throttled)
+                if not throttled or attempt >= self.max_retries:
+                    raise
+                wait_for = self._backoff(e, attempt)
+                print(f"Rate limited (429), backing off {wait_for:.1f}s")
+                await loop.run_in_executor(None, self.bucket.cool_down, wait_for)
+                attempt += 1
+                continue
+            concurrency.release(time.monotonic() - started,
+                                latency_target=LATENCY_TARGETS.get(operation, DEFAULT_LATENCY_TARGET))
+            await loop.run_in_executor(None, self.bucket.settle, estimated, response_tokens(response))
+            return response
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Search All - Search every experiment from a single command
+
+Replaces the per-experiment `python r2e_query_engine.py` loop of
+search-all.sh: experiments are loaded and searched in parallel worker
+processes (loading is CPU-bound JSON parsing, so threads would serialize
+on the GIL), and each experiment's results are printed as soon as they
+are ready, so wall time is close to the slowest experiment rather than
+the sum of all of them. Workers send back only their printed results
+block.
+
+Keyword search is used by default (like search-all.sh); --llm uses the
+LLM semantic search instead.
+
+Usage:
+    python search_all.py "graph visualization" --show-code --visualize
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from r2e_query_engine import R2EQueryEngine, print_search_results
+from multi_repo_search import get_all_experiments
+
+def _search_experiment(exp_id: str, query: str, use_llm: bool, show_code: bool) -> str:
+    """Load and search one experiment (in a worker process), returning its printed results block."""
+    output = io.StringIO()
+    try:
+        # Engine status messages are dropped; only the results block is kept
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = R2EQueryEngine(exp_id)
+            if not engine.load_data():
+                return "Failed to load data.\n"
+            results = engine.semantic_search(query) if use_llm else engine.simple_keyword_search(query)
+        print_search_results(results, show_code, file=output)
+        return output.getvalue()
+    except Exception as e:
+        return f"Error searching {exp_id}: {e}\n"
+
+def search_all(query: str, experiments: Optional[List[str]] = None, show_code: bool = False,
+               visualize: bool = False, use_llm: bool = False, workers: int = 8, depth: int = 2):
+    """
+    Search all experiments in parallel and print each one's results as they arrive.
+
+    Args:
+        query: Search query
+        experiments: Experiments to search (default: all extracted experiments)
+        show_code: Show full code for every result
+        visualize: Also draw the relationship graph for each experiment
+        use_llm: Use LLM semantic search instead of keyword search
+        workers: Worker processes (experiments loaded and searched at once)
+        depth: Relationship depth for --visualize
+    """
+    experiments = experiments or sorted(get_all_experiments())
+    if not experiments:
+        print("No experiments found. Extract functions from repositories first.")
+        return
+
+    print(f"Searching for \"{query}\" across all experiments...")
+    print("======================================================")
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(experiments)))) as executor:
+        futures = {executor.submit(_search_experiment, exp_id, query, use_llm, show_code): exp_id
+                   for exp_id in experiments}
+        for future in as_completed(futures):
+            print(f"\n\033[1;34m** Experiment: {futures[future]} **\033[0m")
+            print(future.result(), end="")
+            print("------------------------------------------------------")
+            sys.stdout.flush()
+
+    print(f"\nSearched {len(experiments)} experiments in {time.monotonic() - started:.1f}s")
+
+    if visualize:
+        # Drawing is not thread-safe, so graphs are rendered one at a time
+        from test_prototype import visualize_query
+
+        print("\n\033[1;32mGenerating visualizations for each experiment...\033[0m")
+        graphs_dir = os.path.join(BASE_DIR, "docs", "graphs")
+        os.makedirs(graphs_dir, exist_ok=True)
+        for exp_id in experiments:
+            print(f"Visualizing {exp_id}...")
+            output_path = os.path.join(graphs_dir, f"{exp_id}_{query.replace(' ', '_')}.png")
+            visualize_query(exp_id, query, depth, output_path)
+        print(f"\033[1;32mVisualizations saved to {graphs_dir}\033[0m")
+
+def main():
+    parser = argparse.ArgumentParser(description="Search all R2E experiments in parallel worker processes")
+    parser.add_argument("query", type=str, help="Search query")
+    parser.add_argument("--experiments", type=str, nargs="*", help="Specific experiment IDs to search")
+    parser.add_argument("--show-code", action="store_true", help="Show full code for functions")
+    parser.add_argument("--visualize", action="store_true", help="Generate relationship graphs for each experiment")
+    parser.add_argument("--llm", action="store_true", help="Use LLM semantic search instead of keyword search")
+    parser.add_argument("--workers", type=int, default=8, help="Worker processes (experiments searched at once)")
+    parser.add_argument("--depth", type=int, default=2, help="Relationship depth for --visualize")
+
+    args = parser.parse_args()
+    search_all(args.query, args.experiments, args.show_code, args.visualize, args.llm, args.workers, args.depth)
+
+if __name__ == "__main__":
+    main()
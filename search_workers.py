@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Search Workers - Persistent worker processes that keep query engines warm
+
+Each worker process owns a fixed set of experiments, loads them once at
+start-up and then serves requests from its own queue until stopped.
+Searches are routed only to the workers owning the requested experiments,
+and workers answer with compact (function id, score, explanation) tuples
+instead of pickled DataFrames. Each worker publishes its experiments'
+catalogs in shared memory (shared_catalog.py); the pool attaches to them
+zero-copy and reads names, paths and code from there, decoding code only
+for the hits that are displayed. The workers' own engines drop their code
+column and read code from the same shared catalog, so code is held once.
+
+A worker that dies during start-up fails the pool's construction instead
+of hanging it. When a search is abandoned (timeout, deadline or the
+caller stopping early), searches still queued are skipped and running
+ones stop waiting for the LLM at the deadline or on cancellation.
+
+Example:
+    with SearchWorkerPool(["PAE_exp", "gate_exp"], num_workers=2) as pool:
+        hits = pool.search("graph traversal")
+        code = pool.fetch_code(hits[:5])
+"""
+
+import os
+import sys
+import time
+import heapq
+import queue
+import itertools
+import multiprocessing
+import pandas as pd
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+# Seconds between liveness checks while waiting for workers to start
+START_POLL_INTERVAL = 1.0
+
+# One search result as sent back by a worker
+Hit = namedtuple("Hit", ["experiment", "function_id", "function_name", "repo_name",
+                         "file_path", "score", "explanation"])
+
+class TopKHits:
+    """Bounded min-heap keeping the ``limit`` best hits seen so far."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._heap: List[Tuple[float, int, Hit]] = []
+        self._order = itertools.count()
+
+    def add(self, hits: List[Hit]):
+        """Merge hits in; earlier arrivals win ties."""
+        for hit in hits:
+            # A smaller negated sequence number ranks lower
+            entry = (hit.score, -next(self._order), hit)
+            if len(self._heap) < self.limit:
+                heapq.heappush(self._heap, entry)
+            elif entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def best(self) -> List[Hit]:
+        """The kept hits, best first."""
+        return [hit for _, _, hit in sorted(self._heap, reverse=True)]
+
+def _hits_from_results(exp_id: str, results, query: str) -> List[Hit]:
+    """Compact hits from an engine results DataFrame, scored on the common 0-10 scale."""
+    from global_index import calibrated_scores
+
+    hits = []
+    scores = calibrated_scores(results, query)
+    for label, row in results.iterrows():
+        explanation = row.get("explanation", "")
+        hits.append(Hit(exp_id, int(row["function_id"]), row["function_name"], row["repo_name"], row["file_path"],
+                        float(scores[label]), explanation if isinstance(explanation, str) else ""))
+    return hits
+
+def _compact_hits(results, query: str) -> List[Tuple[int, float, str]]:
+    """(function id, 0-10 score, explanation) for each row of an engine results DataFrame."""
+    from global_index import calibrated_scores
+
+    scores = calibrated_scores(results, query)
+    explanations = results["explanation"] if "explanation" in results.columns else [""] * len(results)
+    return [(int(fid), float(score), explanation if isinstance(explanation, str) else "")
+            for fid, score, explanation in zip(results["function_id"], scores, explanations)]
+
+def _use_shared_code(engine, catalog):
+    """Drop an engine's code column; its code is read from the shared catalog instead."""
+    if "code" in engine.functions_df.columns:
+        engine.functions_df = engine.functions_df.drop(columns="code")
+        engine.code_lookup = lambda function_ids: [catalog.value("code", i) for i in function_ids]
+
+def _worker_main(worker_index: int, exp_ids: List[str], api_key: Optional[str], use_openrouter: bool,
+                 requests_queue, responses_queue, threads: int, memory_budget_mb: Optional[float] = None):
+    """
+    Worker process loop.
+
+    Messages in: ("search", request_id, query, limit, exp_ids, deadline seconds or None),
+    ("cancel", request_id) and ("stop",).
+    Messages out: ("ready", worker_index, {exp_id: catalog handle}) and, exactly
+    once per searched experiment, ("hits", request_id, exp_id,
+    [(function_id, score, explanation)], error).
+    """
+    import threading
+    from engine_registry import EngineRegistry
+    from session_store import catalog_version
+    from shared_catalog import SharedCatalog
+
+    # Engines over the worker's budget are evicted and loaded again when searched;
+    # the shared catalogs stay published for the pool either way
+    registry = EngineRegistry(memory_budget_mb, api_key, use_openrouter)
+    catalogs = {}
+    versions = {}
+    for exp_id in exp_ids:
+        try:
+            engine = registry.get(exp_id)
+        except Exception as e:
+            print(f"Error: {e}")
+            continue
+        versions[exp_id] = catalog_version(engine.extracted_data_path)
+        catalogs[exp_id] = SharedCatalog.from_dataframe(engine.functions_df)
+        _use_shared_code(engine, catalogs[exp_id])
+    responses_queue.put(("ready", worker_index, {exp_id: catalog.handle for exp_id, catalog in catalogs.items()}))
+
+    # LLM searches are I/O bound, so the worker's experiments are searched concurrently
+    executor = ThreadPoolExecutor(max_workers=max(1, threads))
+    # Cancel event and searches still to answer, per request
+    lock = threading.Lock()
+    requests: Dict[int, list] = {}
+
+    def search(request_id, exp_id, query, limit, ends_at):
+        cancelled = requests[request_id][0]
+        try:
+            # Searches of an abandoned request that have not started yet are skipped
+            if cancelled.is_set() or (ends_at is not None and time.monotonic() >= ends_at):
+                raise Exception("cancelled")
+            if exp_id not in catalogs:
+                raise Exception(f"Experiment '{exp_id}' is not loaded")
+            engine = registry.get(exp_id)
+            # Function ids index the published catalog, so its rows must not have changed
+            if catalog_version(engine.extracted_data_path) != versions[exp_id]:
+                raise Exception(f"Extracted data for '{exp_id}' changed since the workers started")
+            _use_shared_code(engine, catalogs[exp_id])
+            # Running searches stop waiting for the LLM at the deadline or on cancellation
+            with engine.router.limits(ends_at, cancelled):
+                results = engine.semantic_search(query, limit=limit)
+            # The keyword fallback is not limited, so cap what is sent back
+            responses_queue.put(("hits", request_id, exp_id, _compact_hits(results.head(limit), query), None))
+        except Exception as e:
+            responses_queue.put(("hits", request_id, exp_id, [], str(e)))
+        finally:
+            with lock:
+                requests[request_id][1] -= 1
+                if requests[request_id][1] == 0:
+                    del requests[request_id]
+
+    while True:
+        message = requests_queue.get()
+        if message[0] == "stop":
+            break
+        if message[0] == "search":
+            _, request_id, query, limit, wanted, deadline = message
+            ends_at = time.monotonic() + deadline if deadline is not None else None
+            with lock:
+                requests[request_id] = [threading.Event(), len(wanted)]
+            for exp_id in wanted:
+                executor.submit(search, request_id, exp_id, query, limit, ends_at)
+        elif message[0] == "cancel":
+            with lock:
+                if message[1] in requests:
+                    requests[message[1]][0].set()
+
+    executor.shutdown(wait=False)
+    # The pool has detached by now; the segments are removed with the worker's catalogs
+    for catalog in catalogs.values():
+        catalog.close()
+
+class SearchWorkerPool:
+    """Long-lived worker processes, each owning a fixed set of experiments."""
+
+    def __init__(self, experiments: List[str], num_workers: Optional[int] = None,
+                 api_key: Optional[str] = None, use_openrouter: bool = False,
+                 threads_per_worker: int = 4, memory_budget_mb: Optional[float] = None,
+                 start_timeout: float = 600.0):
+        """
+        Start the workers and wait until every experiment is loaded.
+
+        Args:
+            experiments: Experiment IDs to serve
+            num_workers: Worker processes (default: min(cpu count, experiments))
+            api_key: Optional API key (falls back to env var in the workers)
+            use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            threads_per_worker: Concurrent searches inside one worker
+            memory_budget_mb: Memory (RSS) budget per worker process (default: R2E_MEMORY_BUDGET_MB)
+            start_timeout: Seconds to wait for every worker to load its experiments
+
+        Raises:
+            Exception: If a worker dies or does not report ready within ``start_timeout``
+        """
+        num_workers = max(1, min(num_workers or os.cpu_count() or 1, len(experiments)))
+        self.owner: Dict[str, int] = {}
+        assignments: List[List[str]] = [[] for _ in range(num_workers)]
+        for i, exp_id in enumerate(experiments):
+            assignments[i % num_workers].append(exp_id)
+            self.owner[exp_id] = i % num_workers
+
+        self._ids = itertools.count()
+        self._responses = multiprocessing.Queue()
+        self._queues = []
+        self._processes = []
+        for index, exp_ids in enumerate(assignments):
+            requests_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(index, exp_ids, api_key, use_openrouter, requests_queue, self._responses, threads_per_worker,
+                      memory_budget_mb),
+                daemon=True
+            )
+            process.start()
+            self._queues.append(requests_queue)
+            self._processes.append(process)
+
+        # Responses for other requests that arrived while waiting on one, and
+        # responses still to come (and to drop) for abandoned requests
+        self._pending: List[Tuple] = []
+        self._abandoned: Dict[int, int] = {}
+
+        # Catalogs stay in the workers' shared memory; only handles are sent over
+        from shared_catalog import SharedCatalog
+        self.catalogs: Dict[str, SharedCatalog] = {}
+        try:
+            self._wait_ready(start_timeout)
+        except Exception:
+            self.close()
+            raise
+        self.loaded: List[str] = [exp_id for exp_id in experiments if exp_id in self.catalogs]
+
+    def _wait_ready(self, start_timeout: float):
+        """Attach the catalogs of every worker, failing if a worker dies or is too slow."""
+        from shared_catalog import SharedCatalog
+
+        ends_at = time.monotonic() + start_timeout
+        ready = set()
+        while len(ready) < len(self._processes):
+            try:
+                _, worker_index, handles = self._responses.get(timeout=START_POLL_INTERVAL)
+            except queue.Empty:
+                dead = [i for i, process in enumerate(self._processes) if i not in ready and not process.is_alive()]
+                if dead:
+                    raise Exception(f"Search worker {dead[0]} exited with code "
+                                    f"{self._processes[dead[0]].exitcode} before loading its experiments")
+                if time.monotonic() >= ends_at:
+                    raise Exception(f"Search workers not ready after {start_timeout:.0f}s")
+                continue
+            ready.add(worker_index)
+            for exp_id, handle in handles.items():
+                self.catalogs[exp_id] = SharedCatalog.attach(handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _receive(self, request_id: int, timeout: Optional[float]) -> Tuple:
+        """Next response for ``request_id`` (raises queue.Empty on timeout)."""
+        for i, message in enumerate(self._pending):
+            if message[1] == request_id:
+                return self._pending.pop(i)
+        while True:
+            message = self._responses.get(timeout=timeout)
+            if message[1] == request_id:
+                return message
+            if message[1] in self._abandoned:
+                # Every search answers exactly once, so the entry ends with its last answer
+                self._abandoned[message[1]] -= 1
+                if self._abandoned[message[1]] <= 0:
+                    del self._abandoned[message[1]]
+            else:
+                self._pending.append(message)
+
+    def submit_search(self, query: str, limit: int = 10, experiments: Optional[List[str]] = None,
+                      deadline: Optional[float] = None) -> Tuple[int, List[str]]:
+        """
+        Route a search to the workers owning the experiments.
+
+        Args:
+            deadline: Seconds after which the workers give up on the search
+
+        Returns:
+            (request id, experiments searched)
+        """
+        wanted = [exp_id for exp_id in (experiments or self.loaded) if exp_id in self.owner]
+        request_id = next(self._ids)
+        by_worker: Dict[int, List[str]] = {}
+        for exp_id in wanted:
+            by_worker.setdefault(self.owner[exp_id], []).append(exp_id)
+        for worker, exp_ids in by_worker.items():
+            self._queues[worker].put(("search", request_id, query, limit, exp_ids, deadline))
+        return request_id, wanted
+
+    def iter_search(self, query: str, limit: int = 10, experiments: Optional[List[str]] = None,
+                    timeout: Optional[float] = None,
+                    deadline: Optional[float] = None) -> Iterator[Tuple[str, List[Hit], Optional[str]]]:
+        """
+        Search and yield (experiment, hits, error) as each experiment finishes.
+
+        Args:
+            query: Natural language query about code
+            limit: Maximum results per experiment
+            experiments: Experiments to search (default: all loaded)
+            timeout: Seconds to wait for each next experiment before giving up
+            deadline: Seconds allowed for the whole search before giving up
+        """
+        request_id, wanted = self.submit_search(query, limit, experiments, deadline)
+        ends_at = time.monotonic() + deadline if deadline is not None else None
+        received = 0
+        try:
+            while received < len(wanted):
+                wait = timeout
+                if ends_at is not None:
+                    remaining = ends_at - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    wait = remaining if wait is None else min(wait, remaining)
+                try:
+                    _, _, exp_id, rows, error = self._receive(request_id, wait)
+                except queue.Empty:
+                    return
+                received += 1
+                yield exp_id, [self._hit(exp_id, *row) for row in rows], error
+        finally:
+            # Stopped early (timeout, deadline or caller): the workers skip or stop
+            # the request's searches and their late answers are discarded
+            if received < len(wanted):
+                for worker in {self.owner[exp_id] for exp_id in wanted}:
+                    self._queues[worker].put(("cancel", request_id))
+                queued = sum(1 for m in self._pending if m[1] == request_id)
+                self._pending = [m for m in self._pending if m[1] != request_id]
+                if len(wanted) - received - queued > 0:
+                    self._abandoned[request_id] = len(wanted) - received - queued
+
+    def search(self, query: str, limit: int = 10, experiments: Optional[List[str]] = None,
+               deadline: Optional[float] = None) -> List[Hit]:
+        """
+        Search the experiments and return the best ``limit`` hits overall, best first.
+
+        Hits are merged into a bounded top-k heap as each experiment answers, so
+        memory stays at ``limit`` hits however many experiments are searched.
+
+        Args:
+            query: Natural language query about code
+            limit: Maximum results across all experiments
+            experiments: Experiments to search (default: all loaded)
+            deadline: Seconds to wait; when reached the best hits found so far are
+                returned and experiments still running are skipped
+        """
+        top = TopKHits(limit)
+        answered = 0
+        for exp_id, exp_hits, error in self.iter_search(query, limit, experiments, deadline=deadline):
+            answered += 1
+            if error:
+                print(f"Error searching {exp_id}: {error}")
+            top.add(exp_hits)
+
+        searched = len([exp_id for exp_id in (experiments or self.loaded) if exp_id in self.owner])
+        if answered < searched:
+            print(f"Deadline reached: returning best results from {answered} of {searched} experiments")
+        return top.best()
+
+    def _hit(self, exp_id: str, function_id: int, score: float, explanation: str) -> Hit:
+        """Hit with identifying fields read from the experiment's shared catalog."""
+        catalog = self.catalogs[exp_id]
+        return Hit(exp_id, function_id, catalog.value("function_name", function_id),
+                   catalog.value("repo_name", function_id), catalog.value("file_path", function_id),
+                   score, explanation)
+
+    def fetch_code(self, hits: List[Hit]) -> Dict[Tuple[str, int], str]:
+        """
+        Read function code for hits from the workers' shared catalogs.
+
+        Returns:
+            Mapping of (experiment, function id) to code
+        """
+        return {(hit.experiment, hit.function_id): self.catalogs[hit.experiment].value("code", hit.function_id)
+                for hit in hits}
+
+    def close(self):
+        """Detach from the catalogs and stop the workers."""
+        for catalog in self.catalogs.values():
+            catalog.close()
+        self.catalogs = {}
+        for requests_queue in self._queues:
+            requests_queue.put(("stop",))
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._queues = []
+        self._processes = []
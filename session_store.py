@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Session Store - Session-scoped cache of engine results
+
+Search results produced during a session are kept on the engine so that
+a repeated search, or research on a query that was just searched, reuses
+them instead of issuing the same retrieval again. Research trajectories
+and prototypes are not stored here.
+
+Entries are tied to the catalog version (mtime and size of the extracted
+data file); when the catalog changes on disk the whole store is dropped.
+The store keeps at most ``max_entries`` results, evicting the least
+recently used.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Hashable
+
+def catalog_version(path: str) -> Optional[str]:
+    """Version tag of an extracted data file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+# Results kept per store before the least recently used are evicted
+MAX_ENTRIES = 128
+
+class SessionResultStore:
+    """Results keyed by (kind, key), invalidated when the catalog version changes."""
+
+    def __init__(self, version: Callable[[], Optional[str]], max_entries: int = MAX_ENTRIES):
+        """
+        Initialize the store.
+
+        Args:
+            version: Returns the current catalog version
+            max_entries: Results kept before the least recently used are evicted
+        """
+        self._version_fn = version
+        self._version = None
+        self.max_entries = max_entries
+        self._entries: Dict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        """Drop every entry if the catalog changed (caller holds the lock)."""
+        version = self._version_fn()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        """Return the stored value, or None."""
+        with self._lock:
+            self._check_version()
+            value = self._entries.get((kind, key))
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end((kind, key))
+            return value
+
+    def put(self, kind: str, key: Hashable, value: Any):
+        """Store a value for the current catalog version."""
+        with self._lock:
+            self._check_version()
+            self._entries[(kind, key)] = value
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Shard Search - Sharded search across hosts over HTTP/JSON
+
+Each shard server owns a set of experiments, keeps an R2EQueryEngine
+loaded for each of them and answers search and code requests over plain
+HTTP with JSON bodies. The coordinator fans a query out to every shard,
+merges the returned hits into one global top-k and fetches code only for
+the hits that are displayed.
+
+Endpoints served by a shard:
+    GET  /health    {"experiments": [...], "threads": N, "route_timeout": seconds}
+    POST /search    {"query", "limit", "experiments"} -> {"hits": [...], "errors": {...}}
+    POST /code      {"functions": [[exp_id, function_id], ...]} -> {"codes": [[exp_id, function_id, code], ...]}
+
+Usage:
+    # On each host
+    python shard_search.py serve --port 8931 --experiments PAE_exp gate_exp
+
+    # Anywhere
+    python shard_search.py query "graph traversal" --shards http://host1:8931 http://host2:8931
+
+    # Everything on this machine: split the experiments over local shard processes
+    python shard_search.py local "graph traversal" --num-shards 3
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from search_workers import Hit, TopKHits, _hits_from_results
+
+# Seconds to wait for health and code requests
+REQUEST_TIMEOUT = 60.0
+
+# Assumed for shards whose /health does not report their limits
+DEFAULT_ROUTE_TIMEOUT = 120.0
+DEFAULT_SHARD_THREADS = 1
+
+# Added to a derived shard search timeout for the HTTP round trip and merging
+SHARD_TIMEOUT_MARGIN = 10.0
+
+def _post_json(url: str, body: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+    """POST a JSON body and return the decoded JSON answer."""
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+def _get_json(url: str, timeout: Optional[float]) -> Dict[str, Any]:
+    """GET a URL and return the decoded JSON answer."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+class ShardServer:
+    """HTTP server answering searches for the experiments of one shard."""
+
+    def __init__(self, experiments: List[str], host: str = "127.0.0.1", port: int = 0,
+                 api_key: Optional[str] = None, use_openrouter: bool = False, threads: int = 4):
+        """
+        Load the shard's experiments and bind the server.
+
+        Args:
+            experiments: Experiment IDs served by this shard
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            api_key: Optional API key (falls back to env var)
+            use_openrouter: Whether to use OpenRouter API instead of OpenAI
+            threads: Experiments of one request searched at once
+        """
+        from r2e_query_engine import R2EQueryEngine
+
+        self.engines = {}
+        for exp_id in experiments:
+            engine = R2EQueryEngine(exp_id, api_key, use_openrouter=use_openrouter)
+            if engine.load_data():
+                self.engines[exp_id] = engine
+
+        self.threads = max(1, threads)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of this shard."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def route_timeout(self) -> float:
+        """Longest time one experiment's search may take (its search route timeout)."""
+        return max((engine.router.routes["search"].get("timeout", DEFAULT_ROUTE_TIMEOUT)
+                    for engine in self.engines.values()), default=DEFAULT_ROUTE_TIMEOUT)
+
+    def _search_one(self, exp_id: str, query: str, limit: int) -> List[Hit]:
+        engine = self.engines[exp_id]
+        # The keyword fallback is not limited, so cap what is sent back
+        results = engine.semantic_search(query, limit=limit).head(limit)
+        return _hits_from_results(exp_id, results, query)
+
+    def search(self, query: str, limit: int, experiments: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Search this shard's experiments and return the shard's top-k hits."""
+        wanted = [exp_id for exp_id in (experiments or self.engines) if exp_id in self.engines]
+        top = TopKHits(limit)
+        errors = {}
+        futures = {self.executor.submit(self._search_one, exp_id, query, limit): exp_id for exp_id in wanted}
+        for future in as_completed(futures):
+            try:
+                top.add(future.result())
+            except Exception as e:
+                errors[futures[future]] = str(e)
+        return {"hits": [list(hit) for hit in top.best()], "errors": errors}
+
+    def code(self, functions: List[List[Any]]) -> Dict[str, Any]:
+        """Code for (experiment, function id) pairs served by this shard."""
+        codes = []
+        for exp_id, function_id in functions:
+            engine = self.engines.get(exp_id)
+            if engine is not None and 0 <= function_id < len(engine.functions_df):
+                # function_id is the row position assigned at load time
+                codes.append([exp_id, function_id, engine.functions_df["code"].iat[function_id]])
+        return {"codes": codes}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Keep query output clean
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/health":
+                    self._send_json(200, {"status": "ok", "experiments": list(server.engines),
+                                          "threads": server.threads, "route_timeout": server.route_timeout})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+
+                path = self.path.rstrip("/")
+                try:
+                    if path == "/search":
+                        self._send_json(200, server.search(request["query"], int(request.get("limit", 10)),
+                                                           request.get("experiments")))
+                    elif path == "/code":
+                        self._send_json(200, server.code(request.get("functions", [])))
+                    else:
+                        self._send_json(404, {"error": "not found"})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The coordinator gave up on this shard (timeout or deadline)
+                except Exception as e:
+                    self._send_json(500, {"error": str(e)})
+
+        return Handler
+
+    def start(self) -> "ShardServer":
+        """Serve in a daemon thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown(wait=False)
+
+class ShardCoordinator:
+    """Fans queries out to shard servers and merges their hits into one top-k."""
+
+    def __init__(self, shard_urls: List[str], timeout: Optional[float] = None):
+        """
+        Ask each shard which experiments it serves and how fast it searches them.
+
+        Args:
+            shard_urls: Base URLs of the shard servers
+            timeout: Seconds to wait for one shard's search; by default derived
+                from the shard's route timeout and how many waves of experiments
+                it needs
+        """
+        self.timeout = timeout
+        self.owner: Dict[str, str] = {}
+        # (route timeout, threads) reported by each shard
+        self.limits: Dict[str, Tuple[float, int]] = {}
+        for url in shard_urls:
+            url = url.rstrip("/")
+            try:
+                health = _get_json(f"{url}/health", REQUEST_TIMEOUT)
+            except Exception as e:
+                print(f"Shard {url} is unavailable: {e}")
+                continue
+            for exp_id in health["experiments"]:
+                self.owner.setdefault(exp_id, url)
+            self.limits[url] = (float(health.get("route_timeout", DEFAULT_ROUTE_TIMEOUT)),
+                                max(1, int(health.get("threads", DEFAULT_SHARD_THREADS))))
+        self.loaded = list(self.owner)
+
+    def search_timeout(self, url: str, num_experiments: int, deadline: Optional[float] = None) -> float:
+        """
+        Seconds to wait for one shard's search of ``num_experiments`` experiments.
+
+        The shard searches ``threads`` experiments at a time, each bounded by
+        its route timeout, so a full answer can take one route timeout per wave.
+        An explicit timeout wins; a deadline caps the result.
+        """
+        if self.timeout is not None:
+            timeout = self.timeout
+        else:
+            route_timeout, threads = self.limits.get(url, (DEFAULT_ROUTE_TIMEOUT, DEFAULT_SHARD_THREADS))
+            timeout = route_timeout * math.ceil(num_experiments / threads) + SHARD_TIMEOUT_MARGIN
+        return timeout if deadline is None else min(timeout, deadline)
+
+    def search(self, query: str, limit: int = 10, experiments: Optional[List[str]] = None,
+               deadline: Optional[float] = None) -> List[Hit]:
+        """
+        Search all shards and return the best ``limit`` hits overall, best first.
+
+        Args:
+            query: Natural language query about code
+            limit: Maximum results across all shards
+            experiments: Experiments to search (default: all served)
+            deadline: Seconds to wait; when reached the best hits found so far are returned
+        """
+        by_shard: Dict[str, List[str]] = {}
+        for exp_id in (experiments or self.loaded):
+            if exp_id in self.owner:
+                by_shard.setdefault(self.owner[exp_id], []).append(exp_id)
+            else:
+                print(f"Experiment '{exp_id}' is not served by any shard")
+
+        top = TopKHits(limit)
+        executor = ThreadPoolExecutor(max_workers=max(1, len(by_shard)))
+        timeouts = {url: self.search_timeout(url, len(exp_ids), deadline) for url, exp_ids in by_shard.items()}
+        futures = {executor.submit(_post_json, f"{url}/search",
+                                   {"query": query, "limit": limit, "experiments": exp_ids}, timeouts[url]): url
+                   for url, exp_ids in by_shard.items()}
+        answered = 0
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                answered += 1
+                try:
+                    answer = future.result()
+                except TimeoutError:
+                    url = futures[future]
+                    print(f"Shard {url} did not answer within {timeouts[url]:.0f}s; its results are missing "
+                          f"(raise --shard-timeout)")
+                    continue
+                except Exception as e:
+                    print(f"Error searching shard {futures[future]}: {e}")
+                    continue
+                for exp_id, error in answer.get("errors", {}).items():
+                    print(f"Error searching {exp_id}: {error}")
+                top.add([Hit(*row) for row in answer["hits"]])
+        except FuturesTimeout:
+            print(f"Deadline reached: returning best results from {answered} of {len(futures)} shards")
+        finally:
+            # Slow shards are not waited for; their answers are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+        return top.best()
+
+    def fetch_code(self, hits: List[Hit]) -> Dict[Tuple[str, int], str]:
+        """
+        Fetch function code for hits from the owning shards.
+
+        Returns:
+            Mapping of (experiment, function id) to code
+        """
+        by_shard: Dict[str, List[List[Any]]] = {}
+        for hit in hits:
+            by_shard.setdefault(self.owner[hit.experiment], []).append([hit.experiment, hit.function_id])
+
+        codes = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(by_shard))) as executor:
+            answers = executor.map(lambda item: _post_json(f"{item[0]}/code", {"functions": item[1]}, REQUEST_TIMEOUT),
+                                   by_shard.items())
+            for answer in answers:
+                for exp_id, function_id, code in answer["codes"]:
+                    codes[(exp_id, function_id)] = code
+        return codes
+
+def start_local_shards(experiments: List[str], num_shards: int, base_port: int = 8931,
+                       use_openrouter: bool = False, ready_timeout: float = 120.0) -> Tuple[List[str], List[subprocess.Popen]]:
+    """
+    Start shard servers as local processes, splitting experiments round-robin.
+
+    Args:
+        experiments: Experiment IDs to serve
+        num_shards: Number of shard processes
+        base_port: Port of the first shard; the others use the following ports
+        use_openrouter: Whether to use OpenRouter API instead of OpenAI
+        ready_timeout: Seconds to wait for every shard to answer /health
+
+    Returns:
+        (shard URLs, shard processes)
+    """
+    num_shards = max(1, min(num_shards, len(experiments)))
+    assignments = [experiments[i::num_shards] for i in range(num_shards)]
+    urls, processes = [], []
+    for i, exp_ids in enumerate(assignments):
+        port = base_port + i
+        command = [sys.executable, os.path.join(BASE_DIR, "shard_search.py"), "serve",
+                   "--port", str(port), "--experiments", *exp_ids]
+        if use_openrouter:
+            command.append("--use_openrouter")
+        processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL))
+        urls.append(f"http://127.0.0.1:{port}")
+
+    # Shards answer /health once their experiments are loaded
+    started = time.monotonic()
+    for url, process in zip(urls, processes):
+        while True:
+            try:
+                _get_json(f"{url}/health", 1.0)
+                break
+            except Exception:
+                if process.poll() is not None or time.monotonic() - started > ready_timeout:
+                    stop_local_shards(processes)
+                    raise Exception(f"Shard {url} failed to start")
+                time.sleep(0.2)
+    return urls, processes
+
+def stop_local_shards(processes: List[subprocess.Popen]):
+    """Terminate shard processes started by start_local_shards."""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    from multi_repo_search import get_all_experiments, run_query
+
+    parser = argparse.ArgumentParser(description="Sharded R2E search over HTTP/JSON")
+    subparsers = parser.add_subparsers(dest="command", help="Command to run")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve a shard of experiments")
+    serve_parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    serve_parser.add_argument("--port", type=int, default=8931, help="Port to bind")
+    serve_parser.add_argument("--experiments", type=str, nargs="+", required=True, help="Experiment IDs of this shard")
+    serve_parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API")
+    serve_parser.add_argument("--threads", type=int, default=4, help="Experiments searched at once")
+
+    for name, help_text in (("query", "Query running shard servers"),
+                            ("local", "Start local shard processes and query them")):
+        query_parser = subparsers.add_parser(name, help=help_text)
+        query_parser.add_argument("query", type=str, help="Search query")
+        query_parser.add_argument("--experiments", type=str, nargs="*", help="Specific experiment IDs to search")
+        query_parser.add_argument("--limit", type=int, default=10, help="Maximum results across all shards")
+        query_parser.add_argument("--deadline", type=float, help="Seconds to wait before returning the best results so far")
+        query_parser.add_argument("--shard-timeout", type=float,
+                                  help="Seconds to wait for each shard (default: its route timeout per wave of experiments)")
+        query_parser.add_argument("--show-code", action="store_true", help="Show full code for functions")
+        query_parser.add_argument("--interactive", action="store_true", help="Prompt for more queries")
+        if name == "query":
+            query_parser.add_argument("--shards", type=str, nargs="+", required=True, help="Shard base URLs")
+        else:
+            query_parser.add_argument("--num-shards", type=int, default=2, help="Local shard processes")
+            query_parser.add_argument("--base-port", type=int, default=8931, help="Port of the first local shard")
+            query_parser.add_argument("--use_openrouter", action="store_true", help="Use OpenRouter API")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = ShardServer(args.experiments, args.host, args.port,
+                             use_openrouter=args.use_openrouter, threads=args.threads)
+        print(f"Shard serving {', '.join(server.engines) or 'no experiments'} on {server.url}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+        return
+
+    if args.command not in ("query", "local"):
+        parser.print_help()
+        return
+
+    processes = []
+    if args.command == "local":
+        experiments = args.experiments or sorted(get_all_experiments())
+        if not experiments:
+            print("No experiments found. Extract functions from repositories first.")
+            sys.exit(1)
+        print(f"Starting {min(args.num_shards, len(experiments))} local shards for {len(experiments)} experiments...")
+        shard_urls, processes = start_local_shards(experiments, args.num_shards, args.base_port, args.use_openrouter)
+    else:
+        shard_urls = args.shards
+
+    try:
+        coordinator = ShardCoordinator(shard_urls, timeout=args.shard_timeout)
+        print(f"Searching across {len(coordinator.loaded)} experiments on {len(shard_urls)} shards")
+        print(f"Query: {args.query}")
+        run_query(coordinator, args.query, args.show_code, args.limit, args.experiments, args.deadline)
+        while args.interactive:
+            query = input("\nNext query (or press Enter to exit): ").strip()
+            if not query:
+                break
+            run_query(coordinator, query, args.show_code, args.limit, args.experiments, args.deadline)
+    finally:
+        stop_local_shards(processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Shared Catalog - Function catalogs and graph arrays in shared memory
+
+Large catalogs and graphs are packed once into a single
+multiprocessing.shared_memory segment. Other processes receive only a
+small picklable handle (segment name and array layout) plus the row
+ranges they should work on, and attach to the arrays zero-copy instead
+of unpickling DataFrames or node objects.
+
+Strings are stored as one UTF-8 byte buffer per column with an offsets
+array, so a single value is decoded only when it is read. Graphs are
+stored in CSR form (indptr/indices over node positions).
+
+Example:
+    catalog = SharedCatalog.from_dataframe(engine.functions_df)
+    # ... in another process
+    view = SharedCatalog.attach(catalog.handle)
+    names = view.rows("function_name", 0, 100)
+"""
+
+import sys
+import numpy as np
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+# Picklable description of a segment: name, {array: (offset, dtype, shape)} and the creator's resource tracker
+SharedHandle = namedtuple("SharedHandle", ["name", "layout", "tracker_pid"])
+
+# Catalog columns shared by default
+CATALOG_COLUMNS = ["function_name", "repo_name", "file_path", "code"]
+
+# Array offsets inside a segment are aligned to this many bytes
+_ALIGNMENT = 64
+
+def row_ranges(num_rows: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split rows into at most ``parts`` contiguous, non-empty (start, stop) ranges.
+
+    Args:
+        num_rows: Number of rows
+        parts: Number of ranges wanted
+
+    Returns:
+        List of (start, stop) ranges covering all rows
+    """
+    parts = max(1, min(parts, num_rows))
+    bounds = np.linspace(0, num_rows, parts + 1).astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+def _tracker_pid() -> Optional[int]:
+    return getattr(resource_tracker._resource_tracker, "_pid", None)
+
+def _attach_segment(handle: SharedHandle) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without taking ownership of it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=handle.name, track=False)
+    shm = shared_memory.SharedMemory(name=handle.name)
+    # Before 3.13 attaching registers the segment with this process's resource
+    # tracker, which would unlink it when this process exits. Forked children
+    # share the creator's tracker, where the registration is already owned.
+    if _tracker_pid() != handle.tracker_pid:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+class SharedArrays:
+    """Named numpy arrays packed into one shared memory segment."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: Dict[str, Tuple[int, str, Tuple[int, ...]]],
+                 tracker_pid: Optional[int], owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.handle = SharedHandle(shm.name, layout, tracker_pid)
+        self.arrays: Dict[str, np.ndarray] = {
+            key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for key, (offset, dtype, shape) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, arrays: Dict[str, np.ndarray]) -> "SharedArrays":
+        """Copy arrays into a new segment owned by this process."""
+        layout = {}
+        size = 0
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            size = -(-size // _ALIGNMENT) * _ALIGNMENT
+            layout[key] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(shm, layout, _tracker_pid(), owner=True)
+        for key, array in arrays.items():
+            shared.arrays[key][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, handle: SharedHandle) -> "SharedArrays":
+        """Attach zero-copy to a segment created by another process."""
+        return cls(_attach_segment(handle), handle.layout, handle.tracker_pid, owner=False)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    def close(self):
+        """Detach from the segment (and remove it if this process created it)."""
+        self.arrays = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Views handed out are still alive; the mapping goes with them
+        if self.owner:
+            self.owner = False
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _encode_strings(values: Iterable[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """UTF-8 byte buffer and int64 offsets (len + 1) for a column of strings."""
+    encoded = [(value if isinstance(value, str) else "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+class SharedCatalog:
+    """String columns of a functions catalog held in shared memory."""
+
+    def __init__(self, shared: SharedArrays):
+        self.shared = shared
+        self.columns = sorted({key.rsplit(".", 1)[0] for key in shared.arrays})
+
+    @classmethod
+    def from_dataframe(cls, df, columns: Optional[List[str]] = None) -> "SharedCatalog":
+        """
+        Pack catalog columns of a functions DataFrame into shared memory.
+
+        Rows keep their positions, so row ``i`` is the function with ``function_id`` ``i``.
+
+        Args:
+            df: Functions DataFrame
+            columns: Columns to share (default: CATALOG_COLUMNS present in df)
+        """
+        arrays = {}
+        for column in columns or [c for c in CATALOG_COLUMNS if c in df.columns]:
+            arrays[f"{column}.data"], arrays[f"{column}.offsets"] = _encode_strings(df[column])
+        return cls(SharedArrays.create(arrays))
+
+    @classmethod
+    def attach(cls, handle: SharedHandle) -> "SharedCatalog":
+        """Attach zero-copy to a catalog shared by another process."""
+        return cls(SharedArrays.attach(handle))
+
+    @property
+    def handle(self) -> SharedHandle:
+        return self.shared.handle
+
+    def __len__(self) -> int:
+        if not self.columns:
+            return 0
+        return len(self.shared[f"{self.columns[0]}.offsets"]) - 1
+
+    def value(self, column: str, row: int) -> str:
+        """Decode one value."""
+        offsets = self.shared[f"{column}.offsets"]
+        return bytes(self.shared[f"{column}.data"][offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def rows(self, column: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Decode the values of rows ``start`` to ``stop``."""
+        offsets = self.shared[f"{column}.offsets"]
+        stop = len(self) if stop is None else stop
+        data = bytes(self.shared[f"{column}.data"][offsets[start]:offsets[stop]])
+        base = offsets[start]
+        return [data[offsets[i] - base:offsets[i + 1] - base].decode("utf-8") for i in range(start, stop)]
+
+    def close(self):
+        """Detach (and remove the segment if this process created it)."""
+        self.shared.close()
+
+class SharedGraph:
+    """A graph's adjacency in CSR form held in shared memory."""
+
+    def __init__(self, shared: SharedArrays):
+        self.shared = shared
+        self.node_ids = shared["node_ids"]
+        self.indptr = shared["indptr"]
+        self.indices = shared["indices"]
+
+    @classmethod
+    def from_program_graph(cls, program_graph) -> "SharedGraph":
+        """
+        Pack a ProgramGraph's outgoing edges into shared memory.
+
+        Args:
+            program_graph: A ProgramGraph (node ids must be integers)
+        """
+        nodes = list(program_graph.all_nodes())
+        position = {node.id: i for i, node in enumerate(nodes)}
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        indices = []
+        for i, node in enumerate(nodes):
+            neighbors = [position[neighbor.id] for neighbor in program_graph.outgoing_neighbors(node)]
+            indices.extend(neighbors)
+            indptr[i + 1] = indptr[i] + len(neighbors)
+        return cls(SharedArrays.create({
+            "node_ids": np.array([node.id for node in nodes], dtype=np.int64),
+            "indptr": indptr,
+            "indices": np.array(indices, dtype=np.int64),
+        }))
+
+    @classmethod
+    def attach(cls, handle: SharedHandle) -> "SharedGraph":
+        """Attach zero-copy to a graph shared by another process."""
+        return cls(SharedArrays.attach(handle))
+
+    @property
+    def handle(self) -> SharedHandle:
+        return self.shared.handle
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def neighbors(self, node: int) -> np.ndarray:
+        """Positions of the outgoing neighbors of the node at position ``node``."""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def close(self):
+        """Detach (and remove the segment if this process created it)."""
+        self.node_ids = self.indptr = self.indices = None
+        self.shared.close()
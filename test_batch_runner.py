@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Batch runner tests against the mock LLM server
+
+Engines are built on a small in-memory catalog, so no experiment data is
+needed. Covers the checkpoint (failed queries are retried on resume),
+the result limit and the provider batch path.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import json
+
+import pandas as pd
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from mock_llm_server import MockLLMServer
+
+FUNCTIONS = pd.DataFrame({
+    "function_name": ["graph_traversal", "parse_config", "tokenize_source", "walk_graph", "retry_request"],
+    "repo_name": ["repo_a", "repo_a", "repo_b", "repo_b", "repo_b"],
+    "file_path": ["a/graph.py", "a/config.py", "b/lexer.py", "b/graph.py", "b/net.py"],
+    "signature": "", "docstring": "", "params": "", "return_type": "",
+    "function_type": "function", "source": "",
+    "code": ["def graph_traversal(g):\n    return list(g)\n", "def parse_config(path):\n    return {}\n",
+             "def tokenize_source(text):\n    return text.split()\n", "def walk_graph(g):\n    yield from g\n",
+             "def retry_request(call):\n    return call()\n"],
+})
+FUNCTIONS["function_id"] = range(len(FUNCTIONS))
+
+@pytest.fixture(scope="module")
+def mock_server():
+    server = MockLLMServer(port=0, latency="fixed:0").start()
+    yield server
+    server.stop()
+
+def make_runner(monkeypatch, server, api_key="mock-key"):
+    from batch_runner import BatchRunner
+    from r2e_query_engine import R2EQueryEngine
+    from rate_limiter import LLMRateLimiter
+
+    monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("R2E_NO_SERVER", "1")
+    engine = R2EQueryEngine("mock_exp", api_key=api_key)
+    engine.functions_df = FUNCTIONS.copy()
+    engine.telemetry.enabled = False
+    engine.limiter = LLMRateLimiter(f"test_batch_{os.getpid()}", rpm=1e9, tpm=1e12, max_retries=0)
+
+    runner = BatchRunner(api_key=api_key, concurrency=2)
+    runner.engines["mock_exp"] = engine
+    return runner
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+ITEMS = [
+    {"id": "s1", "exp_id": "mock_exp", "type": "search", "query": "graph traversal", "limit": 2},
+    {"id": "r1", "exp_id": "mock_exp", "type": "research", "query": "graph walking"},
+]
+
+def test_run_limits_results_and_checkpoints(monkeypatch, mock_server, tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    runner = make_runner(monkeypatch, mock_server)
+
+    assert runner.run(ITEMS, output) == 0
+    results = {r["id"]: r for r in read_results(output)}
+    assert "error" not in results["s1"] and "error" not in results["r1"]
+    assert 0 < len(results["s1"]["results"]) <= 2
+    assert results["r1"]["trajectories"]
+
+    # Everything is checkpointed: a rerun has nothing to do
+    assert runner.run(ITEMS, output) == 0
+    assert len(read_results(output)) == 2
+
+def test_failed_llm_is_an_error_and_retried(monkeypatch, mock_server, tmp_path):
+    output = str(tmp_path / "results.jsonl")
+
+    # Without an API key the engine could only fall back to keyword search
+    offline = make_runner(monkeypatch, mock_server, api_key="")
+    assert offline.run(ITEMS, output) == 2
+    assert all(r.get("error") for r in read_results(output))
+
+    # Failed queries are not checkpointed, so a resume runs them again
+    assert make_runner(monkeypatch, mock_server).run(ITEMS, output) == 0
+    assert sum(1 for r in read_results(output) if not r.get("error")) == 2
+
+def test_provider_batch(monkeypatch, mock_server, tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    runner = make_runner(monkeypatch, mock_server)
+
+    assert runner.run_provider_batch(ITEMS, output, poll_interval=0) == 0
+    results = {r["id"]: r for r in read_results(output)}
+    assert [r["function_name"] for r in results["s1"]["results"]][0] == "graph_traversal"
+    assert len(results["s1"]["results"]) <= 2
+    assert results["r1"]["trajectories"]
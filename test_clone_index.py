@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Clone index tests: shingles, MinHash signatures, LSH banding and find_clones
+
+Experiments are small extracted-data files in a temporary directory.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+import clone_index
+from clone_index import (shingles, minhash_signatures, lsh_bands, find_clones, CloneIndex,
+                         _CODE_TOKEN, _clusters, _EMPTY)
+
+def reference_shingles(code, shingle_size):
+    """Shingle hashes of one function, computed window by window."""
+    import zlib
+    tokens = [zlib.crc32(token.encode("utf-8")) for token in _CODE_TOKEN.findall(code)]
+    if not tokens:
+        return []
+    width = min(len(tokens), shingle_size)
+    hashes = []
+    for start in range(len(tokens) - width + 1):
+        combined = 0
+        for token in tokens[start:start + width]:
+            combined = (combined * 1000003 + token) % (1 << 64)
+        hashes.append((combined ^ (combined >> 32)) & 0xFFFFFFFF)
+    return hashes
+
+def function_code(name, body_lines):
+    return f"def {name}(x):\n" + "".join(f"    {line}\n" for line in body_lines)
+
+def long_body(seed, lines=12):
+    rng = np.random.default_rng(seed)
+    return [f"v{i} = x * {rng.integers(1000)} + helper_{rng.integers(50)}(v{max(0, i - 1)})" for i in range(lines)]
+
+def test_shingles_match_reference():
+    codes = ["a b c d e f", "a b", "", "x = y + 1", function_code("walk", long_body(0))]
+    hashes, counts = shingles(codes, shingle_size=4)
+    expected = [reference_shingles(code, 4) for code in codes]
+    assert counts.tolist() == [len(e) for e in expected]
+    assert hashes.tolist() == [h for e in expected for h in e]
+
+def test_identical_and_empty_signatures():
+    code = function_code("walk", long_body(1))
+    signatures = minhash_signatures([code, code, "", "   "], num_perm=64)
+    assert np.array_equal(signatures[0], signatures[1])
+    assert (signatures[2] == _EMPTY).all() and (signatures[3] == _EMPTY).all()
+    assert not (signatures[0] == _EMPTY).all()
+
+def test_signature_agreement_estimates_jaccard():
+    base = long_body(2, lines=40)
+    edited = base[:30] + long_body(3, lines=10)
+    codes = [function_code("f", base), function_code("f", edited), function_code("g", long_body(4, lines=40))]
+    signatures = minhash_signatures(codes, num_perm=512)
+    hashes, counts = shingles(codes)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    sets = [set(hashes[offsets[i]:offsets[i + 1]].tolist()) for i in range(3)]
+    for i, j in [(0, 1), (0, 2)]:
+        jaccard = len(sets[i] & sets[j]) / len(sets[i] | sets[j])
+        assert (signatures[i] == signatures[j]).mean() == pytest.approx(jaccard, abs=0.08)
+
+def test_signatures_do_not_depend_on_chunking(monkeypatch):
+    # Many functions and one longer than a chunk, so chunk boundaries fall everywhere
+    codes = [function_code(f"f{i}", long_body(i, lines=3 + i % 7)) for i in range(300)]
+    codes.insert(150, function_code("huge", long_body(999, lines=400)))
+    codes.insert(10, "")
+    # Shorter than a shingle: one shingle over all its tokens, whatever it is batched with
+    codes.insert(20, "a b")
+    codes.insert(200, "x")
+    batched = minhash_signatures(codes, num_perm=32)
+    one_by_one = np.concatenate([minhash_signatures([code], num_perm=32) for code in codes])
+    assert np.array_equal(batched, one_by_one)
+
+    monkeypatch.setattr(clone_index, "_CHUNK_SHINGLES", 7)
+    assert np.array_equal(minhash_signatures(codes, num_perm=32), batched)
+
+@pytest.mark.parametrize("threshold", [0.5, 0.7, 0.8, 0.9])
+def test_lsh_bands(threshold):
+    bands, rows = lsh_bands(128, threshold)
+    assert bands * rows == 128
+    assert (1.0 / bands) ** (1.0 / rows) <= threshold
+
+def test_clusters_follow_chains():
+    labels = _clusters(6, np.array([0, 2, 3]), np.array([1, 3, 4]))
+    assert labels.tolist() == [0, 0, 2, 2, 2, 5]
+
+class TempCloneIndex(CloneIndex):
+    """Clone index over extracted data written to a temporary directory."""
+
+    def __init__(self, root, **kwargs):
+        super().__init__(os.path.join(root, "minhash"), **kwargs)
+        self.root = root
+
+    def extracted_path(self, exp_id):
+        return os.path.join(self.root, f"{exp_id}_extracted.json")
+
+    def write(self, exp_id, functions):
+        """functions: (name, repo, code) tuples"""
+        with open(self.extracted_path(exp_id), "w") as f:
+            json.dump([{"function_name": name, "function_code": code,
+                        "file": {"file_module": {"repo": {"repo_name": repo},
+                                                 "module_id": {"identifier": f"{repo}/{name}.py"}}}}
+                       for name, repo, code in functions], f)
+
+@pytest.fixture
+def index(tmp_path):
+    index = TempCloneIndex(str(tmp_path))
+    walk = long_body(10, lines=30)
+    index.write("exp_a", [
+        ("walk_graph", "repo_a", function_code("walk_graph", walk)),
+        ("parse", "repo_a", function_code("parse", long_body(11))),
+        ("local_copy", "repo_a", function_code("local_copy", long_body(12))),
+        ("local_copy2", "repo_a", function_code("local_copy2", long_body(12))),
+        ("empty", "repo_a", ""),
+    ])
+    index.write("exp_b", [
+        # A fork that changed one line of walk_graph
+        ("walk_graph", "repo_b", function_code("walk_graph", walk[:-1] + ["return None"])),
+        ("tokenize", "repo_b", function_code("tokenize", long_body(13))),
+    ])
+    return index
+
+def test_find_clones(index):
+    clones = find_clones(["exp_a", "exp_b"], threshold=0.8, index=index)
+    clusters = {cluster: sorted(zip(group["experiment"], group["function_name"]))
+                for cluster, group in clones.groupby("cluster")}
+    assert sorted(clusters.values()) == [
+        [("exp_a", "local_copy"), ("exp_a", "local_copy2")],
+        [("exp_a", "walk_graph"), ("exp_b", "walk_graph")],
+    ]
+    assert (clones["size"] == 2).all()
+    assert clones["similarity"].min() >= 0.8
+
+def test_find_clones_cross_repo_and_min_size(index):
+    clones = find_clones(["exp_a", "exp_b"], threshold=0.8, cross_repo=True, index=index)
+    assert sorted(clones["function_name"]) == ["walk_graph", "walk_graph"]
+    assert clones["cluster"].tolist() == [1, 1]
+    assert find_clones(["exp_a", "exp_b"], threshold=0.8, min_size=3, index=index).empty
+
+def test_missing_experiment_is_skipped(index):
+    clones = find_clones(["exp_a", "missing"], threshold=0.8, index=index)
+    assert set(clones["function_name"]) == {"local_copy", "local_copy2"}
+    assert find_clones(["missing"], index=index).empty
+
+def test_signatures_are_stored_and_refreshed(index, monkeypatch):
+    meta, signatures = index.load("exp_a")
+    assert os.path.exists(index._path("exp_a"))
+
+    def fail(exp_id):
+        raise AssertionError("signatures should come from the stored file")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(index, "build", fail)
+        stored_meta, stored = index.load("exp_a")
+    assert np.array_equal(stored, signatures)
+    assert stored_meta["function_name"].tolist() == meta["function_name"].tolist()
+
+    # Changed extracted data is signed again
+    time.sleep(0.01)
+    index.write("exp_a", [("only", "repo_a", "def only():\n    return 1\n")])
+    meta, signatures = index.load("exp_a")
+    assert meta["function_name"].tolist() == ["only"] and len(signatures) == 1
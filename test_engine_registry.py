@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Engine registry tests: single loads, LRU eviction within the budget,
+reloads of changed experiments and credential variants
+
+Engines are stand-ins whose catalogs have a known size, and the process
+RSS is replaced by a fixed base plus the resident catalogs.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pandas as pd
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+import engine_registry
+from engine_registry import EngineRegistry, engine_memory
+
+MB = 1024 * 1024
+
+# Process memory outside the catalogs
+BASE_RSS = 10 * MB
+
+class FakeEngine:
+    """Engine whose catalog is a byte column of the size written in its extracted data file."""
+
+    def __init__(self, exp_id, api_key, use_openrouter, root, delay=0.0):
+        self.exp_id = exp_id
+        self.api_key = api_key
+        self.use_openrouter = use_openrouter
+        self.extracted_data_path = os.path.join(root, f"{exp_id}_extracted.json")
+        self.delay = delay
+        self.functions_df = None
+
+    def load_data(self):
+        time.sleep(self.delay)
+        try:
+            with open(self.extracted_data_path) as f:
+                size_mb = float(f.read())
+        except OSError:
+            return False
+        self.functions_df = pd.DataFrame({"code": [b"x" * MB] * int(size_mb)})
+        return True
+
+class FakeRegistry(EngineRegistry):
+    def __init__(self, root, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+        self.delay = delay
+        self.created = []
+
+    def _new_engine(self, exp_id, api_key, use_openrouter):
+        engine = FakeEngine(exp_id, api_key, use_openrouter, self.root, self.delay)
+        self.created.append(engine)
+        return engine
+
+def write_experiment(root, exp_id, size_mb):
+    path = os.path.join(root, f"{exp_id}_extracted.json")
+    with open(path, "w") as f:
+        f.write(str(size_mb))
+    # Make sure the catalog version (mtime, size) changes on rewrite
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+@pytest.fixture
+def root(tmp_path):
+    for exp_id in ["a", "b", "c"]:
+        write_experiment(str(tmp_path), exp_id, 4)
+    return str(tmp_path)
+
+def simulate_rss(monkeypatch, registry):
+    monkeypatch.setattr(engine_registry, "current_rss",
+                        lambda: BASE_RSS + sum(entry.size for entry in registry._entries.values()))
+
+def test_engine_memory(root):
+    engine = FakeEngine("a", None, False, root)
+    assert engine_memory(engine) == 0
+    engine.load_data()
+    assert engine_memory(engine) >= 4 * MB
+
+def test_loads_once(root):
+    registry = FakeRegistry(root)
+    engine = registry.get("a")
+    assert registry.get("a") is engine
+    assert registry.loads == 1
+
+def test_concurrent_gets_share_one_load(root):
+    registry = FakeRegistry(root, delay=0.2)
+    engines = []
+    threads = [threading.Thread(target=lambda: engines.append(registry.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.loads == 1
+    assert len(set(map(id, engines))) == 1
+
+def test_evicts_least_recently_used(root, monkeypatch):
+    # Room for the base and two 4 MB catalogs
+    registry = FakeRegistry(root, memory_budget_mb=(BASE_RSS + 9 * MB) / MB)
+    simulate_rss(monkeypatch, registry)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert registry.resident() == ["a", "c"]
+    assert "b" not in registry
+    assert registry.evictions == 1
+
+    # An evicted experiment is loaded again on demand
+    registry.get("b")
+    assert registry.loads == 4
+    assert registry.resident() == ["c", "b"]
+
+def test_experiment_just_loaded_stays(root, monkeypatch):
+    write_experiment(root, "c", 30)
+    registry = FakeRegistry(root, memory_budget_mb=(BASE_RSS + 9 * MB) / MB)
+    simulate_rss(monkeypatch, registry)
+    registry.get("a")
+    engine = registry.get("c")
+    assert registry.resident() == ["c"]
+    assert registry.holds(engine)
+
+def test_tracked_sizes_without_rss(root, monkeypatch):
+    monkeypatch.setattr(engine_registry, "current_rss", lambda: None)
+    registry = FakeRegistry(root, memory_budget_mb=9)
+    for exp_id in ["a", "b", "c"]:
+        registry.get(exp_id)
+    assert registry.resident() == ["b", "c"]
+
+def test_no_budget_never_evicts(root, monkeypatch):
+    monkeypatch.delenv("R2E_MEMORY_BUDGET_MB", raising=False)
+    monkeypatch.setattr(engine_registry, "current_rss", lambda: 1 << 40)
+    registry = FakeRegistry(root)
+    for exp_id in ["a", "b", "c"]:
+        registry.get(exp_id)
+    assert registry.resident() == ["a", "b", "c"]
+    assert registry.stats()["budget_mb"] is None
+
+def test_budget_from_environment(root, monkeypatch):
+    monkeypatch.setenv("R2E_MEMORY_BUDGET_MB", "64")
+    assert FakeRegistry(root).memory_budget == 64 * MB
+
+def test_reloads_changed_experiment(root):
+    registry = FakeRegistry(root)
+    engine = registry.get("a")
+    write_experiment(root, "a", 2)
+    reloaded = registry.get("a")
+    assert reloaded is not engine
+    assert len(reloaded.functions_df) == 2
+    assert registry.loads == 2
+
+def test_refresh_reloads_resident_experiments(root):
+    registry = FakeRegistry(root)
+    first_a, first_b = registry.get("a"), registry.get("b")
+    write_experiment(root, "b", 1)
+    registry.refresh()
+    assert registry.get("a") is first_a
+    assert registry.get("b") is not first_b
+    assert registry.loads == 3
+
+def test_variants_share_the_catalog(root):
+    registry = FakeRegistry(root, api_key="default")
+    engine = registry.get("a")
+    other = registry.get("a", api_key="other", use_openrouter=True)
+    assert other is not engine
+    assert other.functions_df is engine.functions_df
+    assert other.api_key == "other" and other.use_openrouter
+    assert registry.get("a", api_key="other", use_openrouter=True) is other
+    assert registry.get("a", api_key="default") is engine
+    assert registry.loads == 1
+
+    assert registry.holds(other)
+    registry.evict("a")
+    assert not registry.holds(other) and not registry.holds(engine)
+    assert registry.evictions == 1
+
+def test_failed_load_raises(root):
+    registry = FakeRegistry(root)
+    with pytest.raises(Exception, match="Failed to load data"):
+        registry.get("missing")
+    assert "missing" not in registry
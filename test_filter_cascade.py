@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Filter cascade tests: threshold calibration and the cascade with a fake LLM
+
+Run with pytest.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from filter_cascade import calibrate_thresholds, FilterCascade, MIN_REJECT_POSITIVES
+
+def test_separable_sample():
+    scores = np.linspace(0, 1, 40)
+    labels = scores > 0.5
+    low, high = calibrate_thresholds(scores, labels, np.ones(40), 0.9, 0.95)
+    assert low < high
+    # Accepted sample rows reach the precision target, rejected ones hold no match
+    assert labels[scores >= high].mean() >= 0.9
+    assert not labels[scores <= low].any()
+
+def test_no_positives_rejects_nothing():
+    low, high = calibrate_thresholds(np.linspace(0, 1, 40), np.zeros(40), np.ones(40), 0.9, 0.95)
+    assert low == -np.inf
+    assert high == np.inf
+
+def test_too_few_positives_rejects_nothing():
+    labels = np.zeros(40, dtype=bool)
+    labels[-(MIN_REJECT_POSITIVES - 1):] = True
+    low, _ = calibrate_thresholds(np.linspace(0, 1, 40), labels, np.ones(40), 0.9, 0.95)
+    assert low == -np.inf
+
+def test_all_positives_accepts_everything():
+    scores = np.linspace(0, 1, 40)
+    low, high = calibrate_thresholds(scores, np.ones(40), np.ones(40), 0.9, 0.95)
+    assert high == scores.min()
+    assert low == -np.inf
+
+def test_ties_are_not_split():
+    scores = np.array([0.1] * 10 + [0.9] * 10)
+    labels = np.array([False] * 9 + [True] + [True] * 10)
+    low, high = calibrate_thresholds(scores, labels, np.ones(20), 0.9, 0.95)
+    # The tied 0.1 block holds a match, so it can be neither rejected nor accepted as a whole
+    assert low == -np.inf
+    assert high == 0.9
+
+def test_weights_scale_the_recall_budget():
+    scores = np.linspace(0, 1, 40)
+    labels = scores > 0.3
+    labels[0] = True
+    # The low-score match stands for many rows: rejecting it would lose too much recall
+    weights = np.ones(40)
+    weights[0] = 100.0
+    low, _ = calibrate_thresholds(scores, labels, weights, 0.9, 0.95)
+    assert low < scores[0]
+
+class FakeEngine:
+    """Labels functions whose name contains ``marker`` and counts the rows it judged."""
+
+    def __init__(self, marker="graph"):
+        self.marker = marker
+        self.judged = 0
+
+    def verify_filter(self, condition, functions, batch_size=20):
+        self.judged += len(functions)
+        return [self.marker in name for name in functions["function_name"]]
+
+def make_functions(n_match, n_other, prefix="graph_walk"):
+    names = [f"{prefix}_{i}" for i in range(n_match)] + [f"parse_item_{i}" for i in range(n_other)]
+    return pd.DataFrame({
+        "function_name": names,
+        "repo_name": "repo",
+        "code": [f"def {name}(x):\n    return x\n" for name in names],
+    })
+
+def test_rare_matches_are_not_rejected_unseen():
+    # The proxy cannot see the matches, and a 40-row sample likely holds none of them
+    functions = make_functions(5, 995, prefix="zeta")
+    engine = FakeEngine(marker="zeta")
+    cascade = FilterCascade(engine, sample_size=40)
+    matches = cascade.run(functions, "graph walk")
+    assert cascade.stats["low_threshold"] is None
+    assert cascade.stats["rejected"] == 0
+    assert sorted(matches["function_name"]) == sorted(functions["function_name"][:5])
+
+def test_cascade_matches_full_verification():
+    functions = make_functions(200, 800)
+    engine = FakeEngine()
+    cascade = FilterCascade(engine, sample_size=40)
+    matches = cascade.run(functions, "graph walk")
+    assert sorted(matches["function_name"]) == sorted(functions["function_name"][:200])
+    assert engine.judged < len(functions)
+    assert set(matches["filter_stage"]) <= {"sampled", "accepted", "verified"}
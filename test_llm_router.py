@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Model router tests: circuit breaking, fallback, hedging and call limits
+
+Models are plain functions, so no LLM is needed.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from llm_router import CircuitBreaker, ModelRouter, default_routes, load_routes
+
+def make_router(models, hedge_after=None, timeout=5.0, **kwargs):
+    routes = default_routes(models)
+    for route in routes.values():
+        route["hedge_after"] = hedge_after
+        route["timeout"] = timeout
+    return ModelRouter(routes, **kwargs)
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    # A failed trial re-opens the circuit at once, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_breaker_half_open_admits_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    start = threading.Barrier(2)
+    allowed = []
+
+    def claim():
+        start.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=claim) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(allowed) == [False, True]
+    assert not breaker.available()
+
+    # A released trial (cancelled call) can be claimed again; an outcome ends it
+    breaker.release_trial()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_falls_back_and_skips_open_circuit():
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        if model == "primary":
+            raise Exception("boom")
+        return model
+
+    router = make_router(["primary", "backup"], failure_threshold=2)
+    assert router.complete("search", call, verbose=False) == "backup"
+    assert router.complete("search", call, verbose=False) == "backup"
+    assert router.breakers["primary"].state == "open"
+
+    # The primary's circuit is open: it is no longer tried
+    calls.clear()
+    assert router.complete("search", call, verbose=False) == "backup"
+    assert calls == ["backup"]
+    assert router.stats()["primary"]["failures"] == 2
+
+def test_all_models_failing():
+    def call(model):
+        raise Exception(f"{model} down")
+
+    router = make_router(["a", "b"], failure_threshold=1)
+    with pytest.raises(Exception, match="All models failed"):
+        router.complete("search", call, verbose=False)
+    with pytest.raises(Exception, match="circuits open"):
+        router.complete("search", call, verbose=False)
+
+def test_unknown_operation():
+    with pytest.raises(Exception, match="No route"):
+        make_router(["a"]).complete("translate", lambda model: model)
+
+def test_hedges_slow_primary():
+    release = threading.Event()
+
+    def call(model):
+        if model == "slow":
+            release.wait(5)
+        return model
+
+    router = make_router(["slow", "fast"], hedge_after=0.05)
+    started = time.monotonic()
+    try:
+        assert router.complete("search", call, verbose=False) == "fast"
+        assert time.monotonic() - started < 1.0
+    finally:
+        release.set()
+
+def test_no_hedge_when_primary_is_fast():
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        return model
+
+    router = make_router(["primary", "backup"], hedge_after=1.0)
+    assert router.complete("search", call) == "primary"
+    assert calls == ["primary"]
+
+def test_timeout():
+    release = threading.Event()
+    router = make_router(["slow"], timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            router.complete("search", lambda model: release.wait(5))
+    finally:
+        release.set()
+
+def test_limits_deadline_and_cancel():
+    release = threading.Event()
+    router = make_router(["slow"], timeout=5.0)
+    try:
+        started = time.monotonic()
+        with router.limits(time.monotonic() + 0.1):
+            with pytest.raises(TimeoutError):
+                router.complete("search", lambda model: release.wait(5))
+        assert time.monotonic() - started < 1.0
+
+        cancelled = threading.Event()
+        threading.Timer(0.1, cancelled.set).start()
+        started = time.monotonic()
+        with router.limits(cancelled=cancelled):
+            with pytest.raises(Exception, match="cancelled"):
+                router.complete("search", lambda model: release.wait(5))
+        assert time.monotonic() - started < 1.0
+    finally:
+        release.set()
+
+def test_async_hedge_cancels_loser():
+    cancelled = []
+
+    async def call(model):
+        if model == "slow":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(model)
+                raise
+        return model
+
+    async def run():
+        router = make_router(["slow", "fast"], hedge_after=0.05)
+        result = await router.acomplete("search", call)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "fast"
+    assert cancelled == ["slow"]
+
+def test_load_routes_merges_overrides(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"search": {"hedge_after": 2}, "summarize": {"models": ["m"]}}))
+    routes = load_routes(str(path), default_routes(["a", "b"]))
+    assert routes["search"]["hedge_after"] == 2
+    assert routes["search"]["models"] == ["a", "b"]
+    assert routes["summarize"] == {"models": ["m"]}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+LLM telemetry tests: call records, cost estimates and aggregation
+
+Run with pytest.
+"""
+
+import os
+import sys
+import json
+import datetime
+import threading
+
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from llm_telemetry import TelemetryLog, estimate_cost, load_records, aggregate
+
+REQUEST = {"messages": [{"role": "user", "content": "x" * 400}]}
+
+def response(prompt_tokens, completion_tokens):
+    return {"usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}}
+
+def test_estimate_cost():
+    assert estimate_cost("openai/gpt-4o", 1_000_000, 0) == pytest.approx(2.50)
+    assert estimate_cost("gpt-4o", 0, 1_000_000) == pytest.approx(10.00)
+    assert estimate_cost("unknown-model", 1000, 1000) is None
+
+def test_record_usage_and_estimates(tmp_path):
+    log = TelemetryLog(str(tmp_path / "calls.jsonl"))
+    log.record("exp", "search", "openai/gpt-4o", 1.5, REQUEST, response(1000, 200))
+    log.record("exp", "search", "openai/gpt-4o", 0.0, REQUEST, cache_hit=True)
+    log.record("exp", "research", "openai/gpt-4o", 2.0, REQUEST, retries=2, error="boom")
+    log.record("exp", "prototype", "openai/gpt-4o", 3.0, REQUEST, response={})
+    used, cached, failed, estimated = load_records(log.path)
+
+    assert used["prompt_tokens"] == 1000 and used["completion_tokens"] == 200
+    assert used["cost"] == pytest.approx(estimate_cost("gpt-4o", 1000, 200))
+    assert used["ok"] and "estimated" not in used
+
+    # Cache hits and failures cost nothing; a response without usage is estimated from the prompt
+    assert cached["cache_hit"] and cached["prompt_tokens"] == 0 and cached["cost"] is None
+    assert not failed["ok"] and failed["error"] == "boom" and failed["cost"] is None
+    assert estimated["estimated"] and estimated["prompt_tokens"] == 100
+
+def test_disabled_log_writes_nothing(tmp_path):
+    log = TelemetryLog(str(tmp_path / "calls.jsonl"), enabled=False)
+    log.record("exp", "search", "gpt-4o", 1.0, REQUEST, response(10, 10))
+    assert not os.path.exists(log.path)
+
+def test_concurrent_appends_stay_intact(tmp_path):
+    log = TelemetryLog(str(tmp_path / "calls.jsonl"))
+
+    def write():
+        for _ in range(50):
+            log.record("exp", "search", "gpt-4o", 0.1, REQUEST, response(10, 10))
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(load_records(log.path)) == 200
+
+def test_load_records_since_and_bad_lines(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    old = (datetime.datetime.now() - datetime.timedelta(days=10)).isoformat(timespec="seconds")
+    new = datetime.datetime.now().isoformat(timespec="seconds")
+    path.write_text(json.dumps({"timestamp": old, "latency": 1.0}) + "\n" + "not json\n"
+                    + json.dumps({"timestamp": new, "latency": 2.0}) + "\n")
+    assert len(load_records(str(path))) == 2
+    recent = load_records(str(path), since_days=1)
+    assert [r["latency"] for r in recent] == [2.0]
+    assert recent[0]["day"] == new[:10]
+
+def test_aggregate_groups_and_sorts_by_cost():
+    records = [
+        {"experiment": "a", "operation": "search", "latency": 1.0, "ok": True, "cost": 0.01,
+         "prompt_tokens": 100, "completion_tokens": 10, "retries": 1},
+        {"experiment": "a", "operation": "search", "latency": 3.0, "ok": True, "cost": 0.02,
+         "prompt_tokens": 200, "completion_tokens": 20},
+        {"experiment": "a", "operation": "search", "latency": 0.0, "ok": True, "cache_hit": True, "cost": None},
+        {"experiment": "a", "operation": "search", "latency": 9.0, "ok": False, "cost": None},
+        {"experiment": "b", "operation": "research", "latency": 5.0, "ok": True, "cost": 0.50,
+         "prompt_tokens": 1000, "completion_tokens": 100},
+    ]
+    rows = aggregate(records, ["experiment", "operation"])
+    assert [(r["experiment"], r["operation"]) for r in rows] == [("b", "research"), ("a", "search")]
+
+    search = rows[1]
+    assert search["calls"] == 4
+    assert search["failed"] == 1
+    assert search["cache_hits"] == 1
+    assert search["retries"] == 1
+    assert search["prompt_tokens"] == 300 and search["completion_tokens"] == 30
+    assert search["cost"] == pytest.approx(0.03)
+    # Percentiles cover answered calls only, not cache hits or failures
+    assert search["p50"] == 3.0 and search["p95"] == 3.0
+
+def test_aggregate_single_key():
+    records = [{"model": m, "latency": 1.0, "ok": True} for m in ("x", "y", "x")]
+    rows = {r["model"]: r for r in aggregate(records, ["model"])}
+    assert rows["x"]["calls"] == 2 and rows["y"]["calls"] == 1
+    assert rows["x"]["cost"] == 0.0
@@ -9,17 +9,21 @@ to visualize relationships between functions in the repositories.
 import os
 import json
 import sys
-import pandas as pd
-import numpy as np
 import re
 import argparse
 from pathlib import Path
-import matplotlib.pyplot as plt
-import networkx as nx
 from collections import defaultdict
 
+# Plotting and graph libraries are only imported when a graph is built or drawn
+from lazy_imports import lazy_module
+pd = lazy_module("pandas")
+np = lazy_module("numpy")
+plt = lazy_module("matplotlib.pyplot")
+nx = lazy_module("networkx")
+
 # Configuration
 R2E_BUCKET_PATH = os.path.expanduser("~/buckets/r2e_bucket")
+GRAPHS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs", "graphs")
 
 def load_extracted_functions(exp_id):
     """
@@ -343,6 +347,44 @@ def process_query_results(query_results_file):
         print(f"Error processing query results: {e}")
         return {}
 
+def visualize_query(exp_id, query=None, depth=1, output_path=None):
+    """Visualize the relationship graph of an experiment, focused on functions matching a query."""
+    # Load functions
+    functions_dict = load_extracted_functions(exp_id)
+    if not functions_dict:
+        return
+        
+    # Detect function calls
+    function_calls = detect_function_calls(functions_dict)
+    
+    # Build the graph
+    G = build_relationship_graph(functions_dict, function_calls)
+    
+    # Find relevant subgraph if query provided
+    query_functions = list(functions_dict.keys())
+    if query:
+        # Simple keyword matching to find relevant functions
+        query_terms = query.lower().split()
+        query_functions = []
+        
+        for func_name, func_info in functions_dict.items():
+            text = f"{func_name} {func_info['code']}".lower()
+            if all(term in text for term in query_terms):
+                query_functions.append(func_name)
+        
+        print(f"Found {len(query_functions)} functions matching query \"{query}\"")
+        
+        if query_functions:
+            G = find_related_functions(G, query_functions, depth=depth)
+    
+    # Visualize the graph
+    if not output_path:
+        query_str = query.replace(' ', '_') if query else "all"
+        output_path = os.path.join(GRAPHS_DIR, f"{exp_id}_{query_str}.png")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    visualize_graph(G, output_path, highlight_nodes=query_functions if query else None)
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description="R2E Function Graph Visualization")
@@ -402,7 +444,7 @@ def main():
                     base, ext = os.path.splitext(args.output)
                     output_path = f"{base}_{exp_id}_{query.replace(' ', '_')}{ext}"
                 else:
-                    output_path = f"/Users/imac/Desktop/r2e_env/docs/graphs/{exp_id}_{query.replace(' ', '_')}.png"
+                    output_path = os.path.join(GRAPHS_DIR, f"{exp_id}_{query.replace(' ', '_')}.png")
                     os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 
                 visualize_graph(subgraph, output_path, highlight_nodes=functions)
@@ -411,43 +453,8 @@ def main():
         if not args.exp_id:
             print("Error: Please provide an experiment ID with --exp_id")
             return
-            
-        # Load functions
-        functions_dict = load_extracted_functions(args.exp_id)
-        if not functions_dict:
-            return
-            
-        # Detect function calls
-        function_calls = detect_function_calls(functions_dict)
-        
-        # Build the graph
-        G = build_relationship_graph(functions_dict, function_calls)
-        
-        # Find relevant subgraph if query provided
-        query_functions = list(functions_dict.keys())
-        if args.query:
-            # Simple keyword matching to find relevant functions
-            query_terms = args.query.lower().split()
-            query_functions = []
-            
-            for func_name, func_info in functions_dict.items():
-                text = f"{func_name} {func_info['code']}".lower()
-                if all(term in text for term in query_terms):
-                    query_functions.append(func_name)
-            
-            print(f"Found {len(query_functions)} functions matching query \"{args.query}\"")
-            
-            if query_functions:
-                G = find_related_functions(G, query_functions, depth=args.depth)
-        
-        # Visualize the graph
-        output_path = args.output
-        if not output_path:
-            query_str = args.query.replace(' ', '_') if args.query else "all"
-            output_path = f"/Users/imac/Desktop/r2e_env/docs/graphs/{args.exp_id}_{query_str}.png"
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        visualize_graph(G, output_path, highlight_nodes=query_functions if args.query else None)
+        visualize_query(args.exp_id, args.query, args.depth, args.output)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
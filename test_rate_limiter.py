@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Rate limiter tests: shared token bucket, adaptive concurrency and retries
+
+Buckets live in a temporary state directory; each test uses its own
+provider name so the process-wide concurrency limits do not interact.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import threading
+import multiprocessing
+
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from rate_limiter import (SharedTokenBucket, AdaptiveConcurrency, AsyncAdaptiveConcurrency, LLMRateLimiter, RateLimitError,
+                          shared_concurrency, LATENCY_TARGETS)
+
+REQUEST = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}
+
+def unique(prefix="test"):
+    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+
+def test_bucket_limits_requests(tmp_path):
+    bucket = SharedTokenBucket(unique(), rpm=2, tpm=1e9, state_dir=str(tmp_path))
+    assert bucket.try_acquire(1) == 0.0
+    assert bucket.try_acquire(1) == 0.0
+    # The next request refills at 2/min, so about 30s away
+    assert 25 < bucket.try_acquire(1) <= 30
+
+def test_bucket_limits_tokens_and_settles(tmp_path):
+    bucket = SharedTokenBucket(unique(), rpm=1e6, tpm=100, state_dir=str(tmp_path))
+    assert bucket.try_acquire(80) == 0.0
+    assert bucket.try_acquire(80) > 0
+    # The call used 20 tokens instead of the 80 estimated: the difference is returned
+    bucket.settle(80, 20)
+    assert bucket.try_acquire(80) == 0.0
+
+def test_oversized_request_waits_for_full_bucket(tmp_path):
+    bucket = SharedTokenBucket(unique(), rpm=1e6, tpm=100, state_dir=str(tmp_path))
+    assert bucket.try_acquire(1000) == 0.0
+
+def test_cool_down_is_shared(tmp_path):
+    name = unique()
+    first = SharedTokenBucket(name, rpm=1e6, tpm=1e9, state_dir=str(tmp_path))
+    second = SharedTokenBucket(name, rpm=1e6, tpm=1e9, state_dir=str(tmp_path))
+    first.cool_down(5)
+    assert 4 < second.try_acquire(1) <= 5
+
+def _take(args):
+    name, state_dir = args
+    bucket = SharedTokenBucket(name, rpm=3, tpm=1e9, state_dir=state_dir)
+    return sum(1 for _ in range(3) if bucket.try_acquire(1) == 0.0)
+
+def test_bucket_is_shared_across_processes(tmp_path):
+    name = unique()
+    with multiprocessing.Pool(2) as pool:
+        taken = pool.map(_take, [(name, str(tmp_path))] * 2)
+    assert sum(taken) == 3
+
+def test_aacquire_keeps_event_loop_free(tmp_path, monkeypatch):
+    bucket = SharedTokenBucket(unique(), state_dir=str(tmp_path))
+    real_try_acquire = bucket.try_acquire
+
+    def slow_try_acquire(tokens):
+        # Stands in for a state file held locked by another process
+        time.sleep(0.3)
+        return real_try_acquire(tokens)
+
+    monkeypatch.setattr(bucket, "try_acquire", slow_try_acquire)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        await bucket.aacquire(1)
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+def test_concurrency_grows_on_fast_success():
+    concurrency = AdaptiveConcurrency(initial=4, maximum=5)
+    for _ in range(20):
+        assert concurrency.try_acquire()
+        concurrency.release(latency=0.1)
+    assert concurrency.limit == 5
+    assert concurrency.in_flight == 0
+
+def test_concurrency_halves_on_throttle_or_slow_success():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=2, latency_target=1.0)
+    concurrency.try_acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+    concurrency.try_acquire()
+    concurrency.release(latency=2.0)
+    assert concurrency.limit == 2
+    concurrency.try_acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 2
+
+def test_failures_leave_the_limit_alone():
+    concurrency = AdaptiveConcurrency(initial=4)
+    concurrency.try_acquire()
+    concurrency.release()
+    assert concurrency.limit == 4
+
+def test_latency_target_per_call():
+    concurrency = AdaptiveConcurrency(initial=4, latency_target=1.0)
+    concurrency.try_acquire()
+    concurrency.release(latency=50.0, latency_target=LATENCY_TARGETS["prototype"])
+    assert concurrency.limit > 4
+
+def test_acquire_blocks_at_limit():
+    concurrency = AdaptiveConcurrency(initial=1)
+    concurrency.acquire()
+    assert not concurrency.try_acquire()
+
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (concurrency.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+    concurrency.release(latency=0.1)
+    assert acquired.wait(1.0)
+    waiter.join()
+
+def test_concurrency_is_shared_per_process(tmp_path):
+    name = unique()
+    first = LLMRateLimiter(name, state_dir=str(tmp_path))
+    second = LLMRateLimiter(name, state_dir=str(tmp_path))
+    assert first.concurrency is second.concurrency is shared_concurrency(name)
+    assert LLMRateLimiter(unique(), state_dir=str(tmp_path)).concurrency is not first.concurrency
+
+def test_call_retries_on_429(tmp_path):
+    limiter = LLMRateLimiter(unique(), rpm=1e6, tpm=1e9, max_retries=2, state_dir=str(tmp_path))
+    attempts = []
+
+    def func():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimitError("429", retry_after=0.01)
+        return {"usage": {"total_tokens": 10}}
+
+    stats = {}
+    assert limiter.call(func, REQUEST, stats, "search", verbose=False) == {"usage": {"total_tokens": 10}}
+    assert stats["retries"] == 2
+    assert limiter.concurrency.in_flight == 0
+
+def test_call_gives_up_after_max_retries(tmp_path):
+    limiter = LLMRateLimiter(unique(), rpm=1e6, tpm=1e9, max_retries=1, state_dir=str(tmp_path))
+
+    def func():
+        raise RateLimitError("429", retry_after=0.01)
+
+    with pytest.raises(RateLimitError):
+        limiter.call(func, REQUEST, verbose=False)
+    assert limiter.concurrency.in_flight == 0
+
+def test_call_does_not_retry_other_errors(tmp_path):
+    limiter = LLMRateLimiter(unique(), rpm=1e6, tpm=1e9, state_dir=str(tmp_path))
+    limit = limiter.concurrency.limit
+    attempts = []
+
+    def func():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(func, REQUEST)
+    assert len(attempts) == 1
+    assert limiter.concurrency.limit == limit
+
+def test_acall(tmp_path):
+    limiter = LLMRateLimiter(unique(), rpm=1e6, tpm=1e9, state_dir=str(tmp_path))
+    attempts = []
+
+    async def func():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise RateLimitError("429", retry_after=0.01)
+        return "ok"
+
+    assert asyncio.run(limiter.acall(func, REQUEST, operation="search")) == "ok"
+    assert len(attempts) == 2
+    assert limiter.async_concurrency.in_flight == 0
+
+def test_async_concurrency_wakes_waiters():
+    concurrency = AsyncAdaptiveConcurrency(initial=2, maximum=2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        await concurrency.aacquire()
+        peak = max(peak, concurrency.in_flight)
+        await asyncio.sleep(0.01)
+        concurrency.release(latency=0.01)
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(work() for _ in range(20)))
+        return time.monotonic() - started
+
+    # 10 waves of 2: about 0.1s when woken directly
+    assert asyncio.run(run()) < 1.0
+    assert peak == 2
+    assert concurrency.in_flight == 0
+
+def test_cancelled_waiter_passes_its_slot_on():
+    concurrency = AsyncAdaptiveConcurrency(initial=1, maximum=1)
+
+    async def run():
+        await concurrency.aacquire()
+        first = asyncio.ensure_future(concurrency.aacquire())
+        second = asyncio.ensure_future(concurrency.aacquire())
+        await asyncio.sleep(0)
+        # The slot goes to the first waiter, which is cancelled before it runs
+        concurrency.release(latency=0.01)
+        first.cancel()
+        await asyncio.wait_for(second, 1.0)
+        return concurrency.in_flight
+
+    assert asyncio.run(run()) == 1
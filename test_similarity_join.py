@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Similarity join tests: jaccard_topk_join against a brute-force join
+
+Run with pytest.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add current directory to path
+sys.path.insert(0, BASE_DIR)
+
+from similarity_join import jaccard_topk_join, token_sets, DENSE_MIN_FREQUENCY
+
+def brute_force(left, right, k, threshold):
+    """Every left text's top-k right texts above the threshold, comparing all pairs."""
+    pairs = {}
+    right_sets = [set(text.lower().split()) for text in right]
+    for i, text in enumerate(left):
+        a = set(text.lower().split())
+        similarities = []
+        for j, b in enumerate(right_sets):
+            union = len(a | b)
+            similarity = len(a & b) / union if union else 0.0
+            if similarity > threshold:
+                similarities.append((similarity, j))
+        similarities.sort(key=lambda pair: -pair[0])
+        pairs[i] = similarities[:k]
+    return pairs
+
+def random_texts(rng, n, vocabulary, min_words=1, max_words=12):
+    # Skewed word choice, so some tokens are frequent enough for the dense product
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    return [" ".join(f"w{i}" for i in rng.choice(vocabulary, size=rng.integers(min_words, max_words), p=weights))
+            for _ in range(n)]
+
+def assert_matches_brute_force(left, right, k, threshold, memory_mb=256):
+    result = jaccard_topk_join(left, right, k=k, threshold=threshold, memory_mb=memory_mb)
+    expected = brute_force(left, right, k, threshold)
+
+    assert np.all(np.diff(result["left"]) >= 0)
+    for i in range(len(left)):
+        rows = result["left"] == i
+        similarities = result["similarity"][rows]
+        # Ties may pick different right rows, but the similarities kept must agree
+        assert similarities == pytest.approx([s for s, _ in expected[i]], abs=1e-6)
+        assert np.all(np.diff(similarities) <= 0)
+        for j, similarity in zip(result["right"][rows], similarities):
+            a, b = set(left[i].lower().split()), set(right[j].lower().split())
+            assert similarity == pytest.approx(len(a & b) / len(a | b), abs=1e-6)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    right = random_texts(rng, 120, 60)
+    left = right[:30] + random_texts(rng, 50, 60)
+    assert_matches_brute_force(left, right, k=5, threshold=0.2)
+
+def test_uses_dense_and_sparse_tokens():
+    rng = np.random.default_rng(3)
+    right = random_texts(rng, 200, 300, min_words=3, max_words=20)
+    vocabulary = {}
+    _, indices = token_sets(right, vocabulary)
+    frequency = np.bincount(indices)
+    assert (frequency > DENSE_MIN_FREQUENCY).any() and (frequency <= DENSE_MIN_FREQUENCY).any()
+    assert_matches_brute_force(random_texts(rng, 60, 300, min_words=3, max_words=20), right, k=8, threshold=0.1)
+
+def test_small_memory_budget_gives_same_pairs():
+    rng = np.random.default_rng(4)
+    right = random_texts(rng, 100, 40)
+    left = random_texts(rng, 40, 40)
+    # A tiny budget processes one left row per block
+    assert_matches_brute_force(left, right, k=3, threshold=0.25, memory_mb=1e-6)
+
+def test_k_larger_than_right_side():
+    left = ["a b c", "x y"]
+    right = ["a b c", "a b", "z"]
+    assert_matches_brute_force(left, right, k=10, threshold=0.0)
+
+def test_identical_texts_and_case():
+    result = jaccard_topk_join(["Graph Walk", "parse"], ["walk graph", "graph"], k=1, threshold=0.5)
+    assert result["left"].tolist() == [0]
+    assert result["right"].tolist() == [0]
+    assert result["similarity"].tolist() == [1.0]
+
+def test_empty_inputs():
+    for left, right, k in [([], ["a"], 1), (["a"], [], 1), (["a"], ["a"], 0)]:
+        result = jaccard_topk_join(left, right, k=k)
+        assert len(result["left"]) == len(result["right"]) == len(result["similarity"]) == 0
+
+def test_empty_and_non_string_texts():
+    result = jaccard_topk_join(["", None, "a"], ["", "a"], k=2, threshold=0.0)
+    assert list(zip(result["left"].tolist(), result["right"].tolist())) == [(2, 1)]
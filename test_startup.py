@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Startup import-time test for the R2E command-line entry points
+
+Runs trivial commands under `python -X importtime` and checks that the
+modules they import on top of a bare interpreter stay within the budget,
+and that none of the heavy dependencies is imported.
+
+Run directly (`python test_startup.py`) or with pytest.
+"""
+
+import os
+import sys
+import subprocess
+from typing import List, Dict, Tuple
+
+# Base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Import time allowed for a trivial command, in milliseconds
+IMPORT_BUDGET_MS = 100
+
+# Modules that trivial commands must not import
+HEAVY_MODULES = ["pandas", "numpy", "openai", "requests", "matplotlib", "networkx"]
+
+# Commands that should start without loading any experiment or heavy dependency
+TRIVIAL_COMMANDS = [
+    ["main.py", "--help"],
+    ["main.py", "list"],
+    ["r2e_query_engine.py", "--help"],
+    ["test_prototype.py", "--help"],
+]
+
+def import_times(args: List[str]) -> Dict[str, int]:
+    """
+    Self import time in microseconds of every module a Python command imports.
+
+    Args:
+        args: Arguments to the interpreter after -X importtime
+    """
+    # No query server round trips while measuring
+    env = dict(os.environ, R2E_NO_SERVER="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=BASE_DIR,
+                            capture_output=True, text=True, env=env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = times.get(name.strip(), 0) + int(self_us)
+    return times
+
+def startup_cost(command: List[str]) -> Tuple[float, Dict[str, int]]:
+    """
+    Import time a command adds on top of the bare interpreter.
+
+    Returns:
+        (milliseconds, {module: self microseconds}) for modules the bare interpreter does not import
+    """
+    baseline = import_times(["-c", "pass"])
+    # The first run may compile bytecode; measure the second
+    import_times(command)
+    extra = {name: us for name, us in import_times(command).items() if name not in baseline}
+    return sum(extra.values()) / 1000, extra
+
+def test_trivial_commands_import_budget():
+    for command in TRIVIAL_COMMANDS:
+        cost, modules = startup_cost(command)
+        heavy = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+        assert not heavy, f"{' '.join(command)} imports {', '.join(heavy)}"
+        assert cost < IMPORT_BUDGET_MS, f"{' '.join(command)} spends {cost:.1f}ms importing modules"
+
+def main():
+    """Report the import time of each trivial command."""
+    print("\n== R2E Startup Import Time ==\n")
+    failed = False
+    for command in TRIVIAL_COMMANDS:
+        cost, modules = startup_cost(command)
+        heavy = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:3]
+        ok = cost < IMPORT_BUDGET_MS and not heavy
+        failed = failed or not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {' '.join(command):32} {cost:6.1f}ms"
+              f"  slowest: {', '.join(f'{name} {us / 1000:.1f}ms' for name, us in slowest)}")
+        if heavy:
+            print(f"     imports heavy modules: {', '.join(heavy)}")
+    print(f"\nBudget: {IMPORT_BUDGET_MS}ms per command")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()